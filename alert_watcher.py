@@ -0,0 +1,139 @@
+# alert_watcher.py
+# Vigila los templates de alerta (boton_retos, inventario_lleno, ...) en su
+# propio hilo y solo dentro de regiones pequeñas y fijas de la pantalla, en
+# lugar de añadirlos a cada escaneo completo del bucle principal.
+
+import threading
+import time
+from detector import detect
+from screencap import get_frame_source
+from utils import log
+
+
+class AlertWatcher:
+    """
+    Cada 'interval' segundos busca cada alerta de 'regions' dentro de su
+    región (coordenadas relativas al ROI, igual que las detecciones:
+    {"x", "y", "w", "h"}). Al encontrar una guarda la detección (en
+    coordenadas del ROI) y activa 'event', que el bucle principal y las
+    esperas de movimiento/recolección consultan para cortar en seco.
+
+    Si se le pasa el hilo de captura (CaptureThread) recorta del último frame
+    en vez de capturar; si no, captura solo las regiones pequeñas.
+    """
+
+    def __init__(self, regions, conf=0.83, interval=0.5, source=None, capture=None, event=None):
+        self.regions = self._parse(regions)
+        self.conf = conf
+        self.interval = max(0.05, float(interval))
+        self.source = source or get_frame_source()
+        self.capture = capture
+        self.event = event or threading.Event()
+        self._pending = {}  # label -> detección
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _parse(regions):
+        parsed = {}
+        for label, r in (regions or {}).items():
+            try:
+                parsed[label] = (int(r["x"]), int(r["y"]), int(r["w"]), int(r["h"]))
+            except (KeyError, TypeError, ValueError):
+                print(f"Advertencia: región de alerta inválida para '{label}': {r!r}. Se ignora.")
+        return parsed
+
+    @property
+    def labels(self):
+        return list(self.regions)
+
+    def set_regions(self, regions):
+        """
+        Cambia en caliente las alertas vigiladas (p.ej. auto_pause_on_arena).
+        Las pendientes que ya no se vigilan se descartan y, si no queda
+        ninguna, se limpia 'event' para que no corte más esperas.
+        """
+        parsed = self._parse(regions)
+        with self._lock:
+            self.regions = parsed # Una sola asignación: check() sigue con el dict que ya tenía
+            self._pending = {k: v for k, v in self._pending.items() if k in parsed}
+            if not self._pending:
+                self.event.clear()
+
+    # --- Control del hilo ---
+    def start(self):
+        if not self.regions:
+            return
+        self._active.set()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="AlertWatcher", daemon=True)
+        self._thread.start()
+
+    def pause(self):
+        self._active.clear()
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        self._active.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self._active.is_set():
+                self._active.wait()
+                continue
+            started = time.monotonic()
+            try:
+                self.check()
+            except Exception as e:
+                log(f"Error en el vigilante de alertas: {e}")
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    # --- Comprobación ---
+    def _crop(self, x, y, w, h):
+        """Región (relativa al ROI) en gris, del último frame o capturada aparte."""
+        if self.capture is not None and self.capture.running:
+            _, _, frame = self.capture.latest(copy=False)
+            if frame is not None:
+                crop = frame[y:y + h, x:x + w]
+                return crop.copy() # El productor puede sobrescribir el slot
+        roi = self.source.resolve_region()
+        region = {"left": roi["left"] + x, "top": roi["top"] + y, "width": w, "height": h}
+        return self.source.grab(region, gray=True)
+
+    def check(self):
+        """Busca todas las alertas una vez. Devuelve las etiquetas encontradas."""
+        found = []
+        regions = self.regions
+        for label, (x, y, w, h) in regions.items():
+            img = self._crop(x, y, w, h)
+            if img is None or img.size == 0:
+                continue
+            dets = detect(None, img, conf=self.conf, classes=[label])
+            if not dets:
+                continue
+            best = max(dets, key=lambda d: d["conf"])
+            # Pasar a coordenadas del ROI
+            x1, y1, x2, y2 = best["bbox"]
+            best = dict(best, cx=best["cx"] + x, cy=best["cy"] + y, bbox=[x1 + x, y1 + y, x2 + x, y2 + y])
+            with self._lock:
+                if label not in self.regions: # Dejó de vigilarse mientras se buscaba
+                    continue
+                self._pending[label] = best
+            found.append(label)
+        if found:
+            self.event.set()
+        return found
+
+    def pop_pending(self):
+        """Devuelve y limpia las alertas pendientes ({label: detección})."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self.event.clear()
+        return pending
@@ -0,0 +1,153 @@
+# arrival.py
+# Detección de llegada a la sala siguiente: en vez de esperar siempre el
+# tiempo fijo de post_move_wait / post_move_overrides, se observa la pantalla
+# tras el click en la salida y se termina la espera en cuanto la escena ha
+# cambiado (cambio de mapa) y se ha quedado quieta.
+
+import cv2
+import timing
+from screencap import get_frame_source
+
+
+class ArrivalDetector:
+    """
+    begin() guarda una miniatura de la sala actual justo antes del click.
+    wait(max_wait) muestrea la pantalla cada 'interval' s y devuelve True en
+    cuanto:
+      1. la escena difiere de la referencia en más de 'change_threshold'
+         (diferencia media absoluta, niveles de gris) -> hubo cambio de mapa, y
+      2. después, frames consecutivos difieren menos de 'stable_threshold'
+         durante 'stable_time' s -> la sala nueva ya está cargada, y
+      3. la escena quieta tiene contenido (desviación típica de la miniatura
+         mayor que 'min_content'): una pantalla negra o de carga uniforme
+         también está quieta, pero la sala aún no se ha dibujado.
+    Si se agota max_wait devuelve False (los delays configurados quedan como
+    cota superior). El estado se conserva entre llamadas: una segunda wait()
+    tras una llegada ya detectada vuelve al instante. reset() lo borra cuando
+    no llega a empezar ninguna transición (p.ej. pausa antes del click).
+    """
+
+    def __init__(self, source=None, capture=None, scale=8, change_threshold=12.0,
+                 stable_threshold=2.0, stable_time=0.25, min_content=8.0, interval=0.05, waker=None):
+        self.source = source or get_frame_source()
+        self.capture = capture
+        self.waker = waker # timing.Waker: la pausa corta la espera entre muestras al instante
+        self.scale = max(1, int(scale))
+        self.change_threshold = float(change_threshold)
+        self.stable_threshold = float(stable_threshold)
+        self.stable_time = float(stable_time)
+        self.min_content = float(min_content)
+        self.interval = max(0.01, float(interval))
+        self._ref = None
+        self._prev = None
+        self._stable_since = None
+        self._t0 = None
+        self.changed = False
+        self.arrived = False
+        self.elapsed = None # Segundos desde begin() hasta la llegada (None si no se detectó)
+
+    def _thumb(self):
+        """Miniatura gris del frame actual (del hilo de captura si está activo)."""
+        frame = None
+        if self.capture is not None and self.capture.running:
+            _, _, frame = self.capture.latest(copy=False)
+        if frame is None:
+            frame = self.source.grab(gray=True)
+        if frame is None:
+            return None
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        h, w = frame.shape[:2]
+        return cv2.resize(frame, (max(1, w // self.scale), max(1, h // self.scale)),
+                          interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def _diff(a, b):
+        if a is None or b is None or a.shape != b.shape:
+            return None
+        return float(cv2.absdiff(a, b).mean())
+
+    def _has_content(self, thumb):
+        """False para pantallas casi uniformes (negro, transición, carga)."""
+        return float(cv2.meanStdDev(thumb)[1][0][0]) > self.min_content
+
+    def reset(self):
+        """Sin transición en curso: 'started' pasa a False hasta el próximo begin()."""
+        self._ref = None
+        self._prev = None
+        self._stable_since = None
+        self._t0 = None
+        self.changed = False
+        self.arrived = False
+        self.elapsed = None
+
+    @property
+    def started(self):
+        """True si hay una transición empezada con begin() (y no se ha hecho reset())."""
+        return self._t0 is not None
+
+    def begin(self, ref=None):
+        """Empieza una transición. 'ref': frame de la sala actual (si no, se captura)."""
+        if ref is not None:
+            if ref.ndim == 3:
+                ref = cv2.cvtColor(ref, cv2.COLOR_BGR2GRAY)
+            h, w = ref.shape[:2]
+            ref = cv2.resize(ref, (max(1, w // self.scale), max(1, h // self.scale)),
+                             interpolation=cv2.INTER_AREA)
+        else:
+            ref = self._thumb()
+        self._ref = ref
+        self._prev = None
+        self._stable_since = None
+        self._t0 = timing.now()
+        self.changed = False
+        self.arrived = False
+        self.elapsed = None
+
+    def waited(self):
+        """Segundos desde begin()."""
+        return 0.0 if self._t0 is None else timing.now() - self._t0
+
+    def poll(self):
+        """Toma una muestra y actualiza el estado. Devuelve True si ya se llegó."""
+        if self.arrived or self._ref is None:
+            return self.arrived
+        thumb = self._thumb()
+        if thumb is None:
+            return False
+        now = timing.now()
+        if not self.changed:
+            diff = self._diff(thumb, self._ref)
+            # Cambio de tamaño del ROI = la escena tampoco es la de antes
+            if diff is None or diff > self.change_threshold:
+                self.changed = True
+        elif self._prev is not None:
+            diff = self._diff(thumb, self._prev)
+            if diff is not None and diff < self.stable_threshold and self._has_content(thumb):
+                if self._stable_since is None:
+                    self._stable_since = now
+                elif now - self._stable_since >= self.stable_time:
+                    self.arrived = True
+                    self.elapsed = now - self._t0
+            else:
+                self._stable_since = None
+        self._prev = thumb
+        return self.arrived
+
+    def wait(self, max_wait, interrupted=None):
+        """
+        Espera la llegada como mucho 'max_wait' s. Devuelve True si se detectó,
+        False si se agotó el tiempo o 'interrupted()' se hizo True.
+        """
+        deadline = timing.now() + max(0.0, float(max_wait))
+        while not self.poll():
+            if interrupted is not None and interrupted():
+                return False
+            remaining = deadline - timing.now()
+            if remaining <= 0:
+                return False
+            if self.waker is not None:
+                self.waker.sleep(min(self.interval, remaining), interrupted)
+            else:
+                timing.sleep(min(self.interval, remaining))
+        return True
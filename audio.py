@@ -0,0 +1,189 @@
+# audio.py
+# Sonidos de alerta en un hilo propio: play_alert() solo encola y el bucle
+# del bot sigue sin esperar a que termine el mp3.
+
+import os
+import sys
+import time
+import queue
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# --- Backends ---
+class NullBackend:
+    """Sin audio (Linux sin escritorio, tests): no hace nada."""
+    name = "null"
+
+    def preload(self, path):
+        return path
+
+    def play(self, sound):
+        pass
+
+    def beep(self, freq, ms):
+        pass
+
+
+class PlaysoundBackend(NullBackend):
+    """playsound: reproduce el fichero tal cual (no permite precargar)."""
+    name = "playsound"
+
+    def __init__(self):
+        from playsound import playsound
+        self._playsound = playsound
+
+    def play(self, sound):
+        self._playsound(sound)
+
+
+class WinsoundBackend(PlaysoundBackend):
+    """
+    Windows. Los .wav (o un .wav con el mismo nombre que el .mp3) se leen a
+    memoria una vez y se reproducen con winsound sin tocar el disco; los mp3
+    sin .wav se reproducen con playsound (si está instalado).
+    """
+    name = "winsound"
+
+    def __init__(self):
+        import winsound
+        self._winsound = winsound
+        try: super().__init__()
+        except ImportError: self._playsound = None
+
+    def preload(self, path):
+        wav = os.path.splitext(path)[0] + ".wav"
+        if os.path.exists(wav):
+            with open(wav, "rb") as f:
+                return f.read()
+        return path
+
+    def play(self, sound):
+        if isinstance(sound, bytes):
+            self._winsound.PlaySound(sound, self._winsound.SND_MEMORY)
+        elif self._playsound is not None:
+            self._playsound(sound)
+
+    def beep(self, freq, ms):
+        self._winsound.Beep(freq, ms)
+
+
+BACKENDS = {"null": NullBackend, "playsound": PlaysoundBackend, "winsound": WinsoundBackend}
+
+def default_backend():
+    """winsound en Windows, playsound si está disponible, y si no, sin audio."""
+    for backend in ((WinsoundBackend,) if sys.platform == "win32" else ()) + (PlaysoundBackend,):
+        try:
+            return backend()
+        except Exception:
+            continue
+    return NullBackend()
+
+def make_backend(name="auto"):
+    """Backend por nombre ('auto', 'null', 'playsound', 'winsound'); 'null' si no se puede crear."""
+    if name in (None, "", "auto"):
+        return default_backend()
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        print(f"Advertencia: backend de audio '{name}' desconocido. Sin audio.")
+    except Exception as e:
+        print(f"Advertencia: backend de audio '{name}' no disponible ({e}). Sin audio.")
+    return NullBackend()
+
+
+# --- Reproductor ---
+class AudioPlayer:
+    """
+    Cola + hilo de reproducción. Los sonidos se precargan al arrancar
+    (start). play(nombre) descarta la misma alerta si ya sonó o está en cola
+    en los últimos 'dedupe_window' s; beep() descarta pitidos si ya hay uno
+    pendiente. Si la cola está llena, el sonido nuevo se pierde: nunca bloquea.
+    """
+
+    def __init__(self, sounds, backend=None, dedupe_window=5.0, max_queue=8):
+        self.sounds = dict(sounds)
+        self.backend = backend
+        self.dedupe_window = float(dedupe_window)
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._loaded = {}
+        self._last_played = {} # nombre -> time.monotonic() al encolar
+        self._beep_pending = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _resolve(self, path):
+        """Ruta relativa al directorio actual (como antes) o, si no, a la carpeta del código."""
+        if os.path.isabs(path) or os.path.exists(path):
+            return path
+        return os.path.join(BASE_DIR, path)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self
+            if self.backend is None:
+                self.backend = default_backend()
+            from utils import log # utils importa este módulo
+            for name, path in self.sounds.items():
+                path = self._resolve(path)
+                if not os.path.exists(path):
+                    log(f"Alerta de sonido: archivo no encontrado -> {path}")
+                    continue
+                try:
+                    self._loaded[name] = self.backend.preload(path)
+                except Exception as e:
+                    log(f"Error cargando sonido {path}: {e}")
+            self._thread = threading.Thread(target=self._run, name="AudioPlayer", daemon=True)
+            self._thread.start()
+        return self
+
+    def play(self, name):
+        self.start()
+        if name not in self.sounds:
+            from utils import log
+            log(f"No hay sonido definido para '{name}'")
+            return False
+        if name not in self._loaded:
+            return False # Fichero no encontrado (ya avisado al precargar)
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_played.get(name)
+            if last is not None and now - last < self.dedupe_window:
+                return False
+            self._last_played[name] = now
+        return self._put(("play", name))
+
+    def beep(self, freq=1000, ms=100):
+        self.start()
+        with self._lock:
+            if self._beep_pending:
+                return False
+            self._beep_pending = True
+        if not self._put(("beep", (freq, ms))):
+            with self._lock: self._beep_pending = False
+            return False
+        return True
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        while True:
+            kind, arg = self._queue.get()
+            try:
+                if kind == "play":
+                    self.backend.play(self._loaded[arg])
+                else:
+                    with self._lock: self._beep_pending = False
+                    self.backend.beep(*arg)
+            except Exception as e:
+                from utils import log
+                log(f"Error reproduciendo sonido {arg}: {e}")
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,230 @@
+# batch_eval.py
+# Evaluación de todos los templates sobre una carpeta de capturas, compartida
+# por batch_templates_debug.py y el botón TEST de la UI. Las capturas se
+# reparten en un pool de procesos (cada uno con su copia de los templates),
+# los resultados llegan según terminan y las imágenes de debug anotadas se
+# codifican en el proceso hijo y se escriben en disco desde un hilo aparte.
+# Este módulo no importa detector.py: en Windows cada proceso del pool arranca
+# de cero y re-importa lo que haya aquí arriba (solo peaks, sin efectos).
+
+import os
+import json
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import Counter
+import cv2
+import numpy as np
+from peaks import extract_detections
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg")
+IMAGE_FORMATS = ("png", "jpg", "webp")
+WRITE_MODES = ("hits", "all", "none") # Qué capturas guardan imagen de debug
+
+
+def list_images(folder):
+    """Rutas de las imágenes de 'folder' (orden alfabético)."""
+    if not folder or not os.path.isdir(folder):
+        return []
+    return [os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.lower().endswith(IMAGE_EXTS)]
+
+def encode_params(image_format, quality=None):
+    """Parámetros de cv2.imencode: compresión PNG 0-9 (def. 3) o calidad JPG/WebP 0-100 (def. 90)."""
+    if image_format == "png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(3 if quality is None else min(9, max(0, quality)))]
+    flag = cv2.IMWRITE_JPEG_QUALITY if image_format == "jpg" else cv2.IMWRITE_WEBP_QUALITY
+    return [flag, int(90 if quality is None else min(100, max(0, quality)))]
+
+
+# --- Trabajo de cada proceso ---
+_worker = {}
+
+def _init_worker(templates, conf, color, image_format, params, scale, write):
+    """Inicializador del pool: los templates viajan una vez por proceso, no por captura."""
+    cv2.setNumThreads(1) # El paralelismo lo pone el pool; evita sobresuscribir la CPU
+    _worker.update(templates=templates, conf=conf, color=color, image_format=image_format,
+                   params=params, scale=scale, write=write)
+
+def _draw(img, detections):
+    for d in detections:
+        x1, y1, x2, y2 = d["bbox"]
+        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(img, f"{d['label']} ({d['conf']:.2f})", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (36, 255, 12), 1)
+
+def evaluate_image(path):
+    """Todos los templates sobre una captura. Devuelve el resultado (con la imagen anotada ya codificada)."""
+    w = _worker
+    result = {"image": os.path.basename(path), "detections": [], "ms": 0.0, "template_ms": {}, "error": None}
+    start = time.perf_counter()
+    img = cv2.imread(path)
+    if img is None:
+        result["error"] = "no se pudo cargar la imagen"
+        return result, None
+    search = img if w["color"] else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    for label, tpl in w["templates"]:
+        t = time.perf_counter()
+        try:
+            res = cv2.matchTemplate(search, tpl, cv2.TM_CCOEFF_NORMED)
+            result["detections"] += extract_detections(res, w["conf"], tpl.shape[1], tpl.shape[0], label)
+        except cv2.error as e:
+            result["error"] = f"matchTemplate {label}: {e}"
+        result["template_ms"][label] = result["template_ms"].get(label, 0.0) + (time.perf_counter() - t) * 1000
+    result["ms"] = (time.perf_counter() - start) * 1000
+
+    encoded = None
+    if w["write"] == "all" or (w["write"] == "hits" and result["detections"]):
+        _draw(img, result["detections"])
+        if w["scale"] != 1.0:
+            img = cv2.resize(img, None, fx=w["scale"], fy=w["scale"], interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode("." + w["image_format"], img, w["params"])
+        encoded = buf.tobytes() if ok else None
+    return result, encoded
+
+
+# --- Escritura asíncrona ---
+class AsyncImageWriter:
+    """Hilo que escribe en disco los bytes ya codificados; put() solo bloquea si la cola se llena."""
+
+    def __init__(self, max_queue=64):
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="DebugImageWriter", daemon=True)
+        self._thread.start()
+
+    def put(self, path, data):
+        self._queue.put((path, data))
+
+    def close(self):
+        """Espera a que se escriba todo lo encolado."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            path, data = item
+            try:
+                with open(path, "wb") as f:
+                    f.write(data)
+            except OSError as e:
+                self.errors += 1
+                print(f"  Error guardando debug {path}: {e}")
+
+
+# --- Evaluador ---
+class BatchEvaluator:
+    """
+    run(rutas, on_result) evalúa todas las capturas y devuelve el resumen.
+    on_result(resultado, hechas, total) se llama (en el hilo que llama a run)
+    según va terminando cada captura, en orden de llegada.
+
+    workers: procesos (0 = nº de CPUs, 1 = en este mismo proceso).
+    color: comparar en BGR (como el antiguo batch) en vez de en gris (como el bot).
+    write: "hits" (solo capturas con detecciones), "all" o "none".
+    """
+
+    def __init__(self, conf=0.8, workers=0, color=False, out_dir=None, image_format="png",
+                 quality=None, scale=1.0, write="hits"):
+        self.conf = float(conf)
+        self.workers = int(workers)
+        self.color = bool(color)
+        self.out_dir = out_dir
+        self.image_format = str(image_format).lower().lstrip(".")
+        if self.image_format == "jpeg":
+            self.image_format = "jpg"
+        if self.image_format not in IMAGE_FORMATS:
+            print(f"Advertencia: formato de debug '{image_format}' no válido. Usando png.")
+            self.image_format = "png"
+        self.quality = quality
+        self.scale = float(scale) if scale and scale > 0 else 1.0
+        self.write = write if write in WRITE_MODES else "hits"
+        if self.out_dir is None:
+            self.write = "none"
+
+    def templates(self):
+        """[(clase, template)] del registro compartido, en gris o en color."""
+        from template_registry import get_registry # Solo en el proceso principal
+        registry = get_registry()
+        grouped = registry.color_templates() if self.color else registry.templates
+        return [(label, tpl) for label, tpls in grouped.items() for tpl in tpls if tpl is not None]
+
+    def _debug_path(self, image_name):
+        return os.path.join(self.out_dir, f"debug_{os.path.splitext(image_name)[0]}.{self.image_format}")
+
+    def run(self, paths, on_result=None):
+        start = time.perf_counter()
+        templates = self.templates()
+        total = len(paths)
+        workers = self.workers if self.workers > 0 else (os.cpu_count() or 1)
+        workers = max(1, min(workers, total))
+        initargs = (templates, self.conf, self.color, self.image_format,
+                    encode_params(self.image_format, self.quality), self.scale, self.write)
+        if self.write != "none":
+            os.makedirs(self.out_dir, exist_ok=True)
+        writer = AsyncImageWriter() if self.write != "none" else None
+
+        results = []
+        def collect(result, encoded):
+            result["debug"] = None
+            if encoded is not None:
+                result["debug"] = self._debug_path(result["image"])
+                writer.put(result["debug"], encoded)
+            results.append(result)
+            if on_result is not None:
+                on_result(result, len(results), total)
+
+        try:
+            if workers == 1 or total == 0:
+                _init_worker(*initargs)
+                for path in paths:
+                    collect(*evaluate_image(path))
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+                    futures = {pool.submit(evaluate_image, path): path for path in paths}
+                    for future in as_completed(futures):
+                        try:
+                            collect(*future.result())
+                        except Exception as e:
+                            collect({"image": os.path.basename(futures[future]), "detections": [], "ms": 0.0,
+                                     "template_ms": {}, "error": str(e)}, None)
+        finally:
+            if writer is not None:
+                writer.close()
+        return self.summary(results, templates, workers, time.perf_counter() - start)
+
+    def summary(self, results, templates, workers, seconds):
+        """Resumen serializable a JSON (sin las imágenes)."""
+        results = sorted(results, key=lambda r: r["image"])
+        per_class, images_per_class, template_ms = Counter(), Counter(), Counter()
+        for r in results:
+            labels = [d["label"] for d in r["detections"]]
+            per_class.update(labels)
+            images_per_class.update(set(labels))
+            template_ms.update(r["template_ms"])
+        evaluated = [r for r in results if r["error"] is None or r["detections"]]
+        frame_ms = [r["ms"] for r in evaluated]
+        return {
+            "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "umbral": self.conf,
+            "modo": "color" if self.color else "gris",
+            "procesos": workers,
+            "templates": len(templates),
+            "imagenes": len(results),
+            "con_detecciones": sum(1 for r in results if r["detections"]),
+            "errores": sum(1 for r in results if r["error"]),
+            "segundos": round(seconds, 3),
+            "ms_por_imagen": {"media": round(float(np.mean(frame_ms)), 2) if frame_ms else None,
+                              "max": round(float(np.max(frame_ms)), 2) if frame_ms else None},
+            "detecciones_por_clase": dict(per_class.most_common()),
+            "imagenes_por_clase": dict(images_per_class.most_common()),
+            "template_ms_medio": {k: round(v / max(1, len(evaluated)), 3) for k, v in template_ms.most_common()},
+            "resultados": results,
+        }
+
+
+def write_summary(summary, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
@@ -1,85 +1,63 @@
 # src/batch_templates_debug.py
+# Evalúa todos los templates sobre las capturas de capturas-debug en paralelo
+# (batch_eval.BatchEvaluator) y deja las imágenes anotadas en debugs/ y un
+# resumen JSON con las detecciones de cada captura.
+#
+#   python batch_templates_debug.py
+#   python batch_templates_debug.py --conf 0.85 --format jpg --quality 80 --scale 0.5
+#   python batch_templates_debug.py --gray --write all --summary resumen.json
 import os
-import cv2
-import numpy as np
-
-# --- Carpeta de templates ---
-TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "..", "templates")
+import sys
+import argparse
+from batch_eval import BatchEvaluator, list_images, write_summary, IMAGE_FORMATS, WRITE_MODES
 
 # --- Carpeta de capturas a procesar ---
 CAPTURAS_DIR = os.path.join(os.path.dirname(__file__), "capturas-debug")
 
 # --- Carpeta de salida de debugs ---
 DEBUGS_DIR = os.path.join(os.path.dirname(__file__), "debugs")
-os.makedirs(DEBUGS_DIR, exist_ok=True)
-
-# --- Cargar todos los templates de recursos automáticamente ---
-RESOURCE_TEMPLATES = {}
-for fname in os.listdir(TEMPLATE_DIR):
-    name, ext = os.path.splitext(fname)
-    if ext.lower() not in [".png", ".jpg", ".jpeg"]:
-        continue
-    template = cv2.imread(os.path.join(TEMPLATE_DIR, fname), cv2.IMREAD_UNCHANGED)
-    if template is None:
-        continue
-    if template.shape[2] == 4:
-        template = cv2.cvtColor(template, cv2.COLOR_BGRA2BGR)
-    RESOURCE_TEMPLATES.setdefault(name, []).append(template)
-
-print(f"Templates cargados: {list(RESOURCE_TEMPLATES.keys())}")
-
-# --- Función de template matching ---
-def detect_template(img, template, label, conf_thresh=0.8):
-    h, w = template.shape[:2]
-    res = cv2.matchTemplate(img, template, cv2.TM_CCOEFF_NORMED)
-    loc = np.where(res >= conf_thresh)
-    detections = []
-    seen = set()
-    for pt in zip(*loc[::-1]):  # x,y
-        if any(abs(pt[0]-sx)<5 and abs(pt[1]-sy)<5 for sx,sy in seen):
-            continue
-        seen.add(pt)
-        cx = pt[0] + w//2
-        cy = pt[1] + h//2
-        detections.append({
-            "label": label, 
-            "cx": cx, 
-            "cy": cy, 
-            "bbox":[pt[0], pt[1], pt[0]+w, pt[1]+h]
-        })
-        # dibujar rectángulo
-        cv2.rectangle(img, (pt[0], pt[1]), (pt[0]+w, pt[1]+h), (0,255,0), 2)
-        cv2.putText(img, label, (pt[0], pt[1]-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 1)
-    return detections
 
 # --- Procesar todas las imágenes ---
 def main():
-    if not os.path.exists(CAPTURAS_DIR):
-        print(f"[ERROR] No existe la carpeta de capturas: {CAPTURAS_DIR}")
-        return
-
-    img_files = [f for f in os.listdir(CAPTURAS_DIR) if f.lower().endswith((".png", ".jpg", ".jpeg"))]
-    if not img_files:
-        print(f"[INFO] No hay imágenes en {CAPTURAS_DIR} para procesar.")
-        return
-
-    for img_name in img_files:
-        img_path = os.path.join(CAPTURAS_DIR, img_name)
-        img = cv2.imread(img_path)
-        if img is None:
-            print(f"[ERROR] No se pudo cargar la imagen {img_path}")
-            continue
-
-        detections = []
-        for res_name, templates in RESOURCE_TEMPLATES.items():
-            for t in templates:
-                detections += detect_template(img, t, res_name)
-
-        print(f"[{img_name}] Detectados: {[d['label'] for d in detections]}")
-
-        debug_output_path = os.path.join(DEBUGS_DIR, f"debug_{img_name}")
-        cv2.imwrite(debug_output_path, img)
-        print(f"[INFO] Imagen de debug guardada en {debug_output_path}")
+    parser = argparse.ArgumentParser(description="Evalúa todos los templates sobre una carpeta de capturas.")
+    parser.add_argument("--captures", default=CAPTURAS_DIR, help="Carpeta de capturas.")
+    parser.add_argument("--out", default=DEBUGS_DIR, help="Carpeta de las imágenes de debug.")
+    parser.add_argument("--conf", type=float, default=0.8)
+    parser.add_argument("--workers", type=int, default=0, help="Procesos (0 = nº de CPUs, 1 = sin pool).")
+    parser.add_argument("--gray", action="store_true", help="Comparar en gris, como el bot (por defecto en color).")
+    parser.add_argument("--format", default="png", choices=IMAGE_FORMATS, help="Formato de las imágenes de debug.")
+    parser.add_argument("--quality", type=int, default=None, help="Compresión PNG (0-9) o calidad JPG/WebP (0-100).")
+    parser.add_argument("--scale", type=float, default=1.0, help="Escala de las imágenes de debug.")
+    parser.add_argument("--write", default="all", choices=WRITE_MODES, help="Qué capturas guardan imagen de debug.")
+    parser.add_argument("--summary", default=None, help="Ruta del resumen JSON (por defecto <out>/resumen.json).")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.captures):
+        print(f"[ERROR] No existe la carpeta de capturas: {args.captures}")
+        return 1
+    paths = list_images(args.captures)
+    if not paths:
+        print(f"[INFO] No hay imágenes en {args.captures} para procesar.")
+        return 0
+
+    evaluator = BatchEvaluator(conf=args.conf, workers=args.workers, color=not args.gray, out_dir=args.out,
+                               image_format=args.format, quality=args.quality, scale=args.scale, write=args.write)
+    print(f"Templates cargados: {sorted({label for label, _ in evaluator.templates()})}")
+
+    def on_result(result, done, total):
+        labels = [d["label"] for d in result["detections"]]
+        line = f"[{done}/{total}] [{result['image']}] Detectados: {labels} ({result['ms']:.0f} ms)"
+        if result["error"]:
+            line += f" [ERROR] {result['error']}"
+        print(line)
+
+    summary = evaluator.run(paths, on_result)
+    summary_path = args.summary or os.path.join(args.out, "resumen.json")
+    os.makedirs(os.path.dirname(os.path.abspath(summary_path)), exist_ok=True)
+    write_summary(summary, summary_path)
+    print(f"[INFO] {summary['imagenes']} imágenes en {summary['segundos']:.2f} s con {summary['procesos']} procesos. "
+          f"Con detecciones: {summary['con_detecciones']}. Resumen en {summary_path}")
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,254 @@
+# bench_detect.py
+# Benchmark de detector.detect: latencia (p50/p95/p99), memoria reservada y
+# precisión/recall de cada modo del detector sobre las capturas de
+# capturas-debug y/o frames sintéticos, con comparación contra un baseline.
+#
+#   python bench_detect.py                          # capturas-debug, todos los modos
+#   python bench_detect.py --synthetic 20           # + 20 frames sintéticos
+#   python bench_detect.py --truth anotaciones.json --save-baseline base.json
+#   python bench_detect.py --baseline base.json     # sale con código 1 si hay regresión
+#
+# Formato de --truth (JSON): {"captura.png": [{"label": "hierro", "bbox": [x1, y1, x2, y2]}, ...]}
+# Los frames sin entrada en el fichero no cuentan para precisión/recall.
+
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import cv2
+import numpy as np
+import detector
+from detector import detect, configure_detector, REGISTRY, DETECT_OPTIONS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CAPTURAS_DIRS = [os.path.join(BASE_DIR, "..", "capturas-debug"), os.path.join(BASE_DIR, "capturas-debug")]
+
+# Modos a comparar: cambios sobre DETECT_OPTIONS
+MODES = {
+    "base": {"pyramid_levels": 0, "match_method": "opencv", "detect_workers": 1},
+    "paralelo": {"pyramid_levels": 0, "match_method": "opencv", "detect_workers": 0},
+    "piramide2": {"pyramid_levels": 2, "match_method": "opencv", "detect_workers": 1},
+    "fft": {"pyramid_levels": 0, "match_method": "fft", "detect_workers": 1},
+}
+
+
+# --- Frames ---
+def load_frames(folder):
+    """[(nombre, imagen BGR)] de las imágenes de 'folder'."""
+    frames = []
+    if not folder or not os.path.isdir(folder):
+        return frames
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith((".png", ".jpg", ".jpeg")):
+            img = cv2.imread(os.path.join(folder, name))
+            if img is not None:
+                frames.append((name, img))
+    return frames
+
+def synthetic_frames(n, size=(666, 912), per_frame=4, seed=0):
+    """
+    Frames de ruido suavizado con templates pegados en sitios conocidos.
+    Devuelve (frames, truth). Si no hay templates cargados se generan unos
+    sintéticos y se publican en el registro mientras dure el benchmark.
+    """
+    rng = np.random.default_rng(seed)
+    if not REGISTRY.templates:
+        REGISTRY.templates = {
+            f"sintetico_{i}": [cv2.GaussianBlur(rng.integers(0, 255, (40, 36), dtype=np.uint8), (0, 0), 1.5)]
+            for i in range(3)}
+    pool = [(label, tpl) for label, tpls in REGISTRY.templates.items() for tpl in tpls]
+    h, w = size
+    frames, truth = [], {}
+    for i in range(n):
+        gray = cv2.GaussianBlur(rng.integers(0, 255, (h, w), dtype=np.uint8), (0, 0), 3)
+        boxes = []
+        for _ in range(per_frame * 4): # Intentos para no solapar
+            if len(boxes) >= per_frame:
+                break
+            label, tpl = pool[int(rng.integers(len(pool)))]
+            th, tw = tpl.shape[:2]
+            if th >= h or tw >= w:
+                continue
+            y, x = int(rng.integers(0, h - th)), int(rng.integers(0, w - tw))
+            box = [x, y, x + tw, y + th]
+            if any(_iou(box, b["bbox"]) > 0 for b in boxes):
+                continue
+            gray[y:y + th, x:x + tw] = tpl
+            boxes.append({"label": label, "bbox": box})
+        name = f"sintetico_{i:03d}.png"
+        frames.append((name, cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)))
+        truth[name] = boxes
+    return frames, truth
+
+
+# --- Métricas ---
+def _iou(a, b):
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def match_truth(dets, truth, iou_thresh=0.5):
+    """(verdaderos positivos, falsos positivos, falsos negativos) de un frame."""
+    used = set()
+    tp = 0
+    for d in sorted(dets, key=lambda d: -d["conf"]):
+        best, best_iou = None, iou_thresh
+        for i, t in enumerate(truth):
+            if i in used or t["label"] != d["label"]:
+                continue
+            iou = _iou(d["bbox"], t["bbox"])
+            if iou >= best_iou:
+                best, best_iou = i, iou
+        if best is not None:
+            used.add(best)
+            tp += 1
+    return tp, len(dets) - tp, len(truth) - tp
+
+def percentiles(samples_ms):
+    if not samples_ms:
+        return {"p50": None, "p95": None, "p99": None, "media": None}
+    arr = np.asarray(samples_ms)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3),
+            "media": round(float(arr.mean()), 3)}
+
+
+# --- Benchmark ---
+def run_mode(name, options, frames, truth, conf, repeat, per_template):
+    saved = dict(DETECT_OPTIONS)
+    configure_detector(options)
+    try:
+        classes = list(REGISTRY.templates)
+        grays = [(fname, detector.to_gray(img)) for fname, img in frames]
+        detect(None, grays[0][1], conf=conf, classes=classes) # Calentamiento (pool, cachés)
+
+        frame_ms, tp, fp, fn = [], 0, 0, 0
+        for fname, gray in grays:
+            for r in range(repeat):
+                t = time.perf_counter()
+                dets = detect(None, gray, conf=conf, classes=classes)
+                frame_ms.append((time.perf_counter() - t) * 1000)
+            if fname in truth:
+                a, b, c = match_truth(dets, truth[fname])
+                tp, fp, fn = tp + a, fp + b, fn + c
+
+        template_ms = {}
+        if per_template:
+            for label in classes:
+                samples = []
+                for _, gray in grays:
+                    t = time.perf_counter()
+                    detect(None, gray, conf=conf, classes=[label])
+                    samples.append((time.perf_counter() - t) * 1000)
+                template_ms[label] = percentiles(samples)
+
+        # Memoria: pico de reservas de Python/numpy por llamada (aparte: tracemalloc ralentiza)
+        peaks = []
+        tracemalloc.start()
+        for _, gray in grays:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            detect(None, gray, conf=conf, classes=classes)
+            peaks.append((tracemalloc.get_traced_memory()[1] - base) / 1024.0)
+        tracemalloc.stop()
+
+        result = {"opciones": options, "frame_ms": percentiles(frame_ms), "template_ms": template_ms,
+                  "memoria_pico_kb": {"media": round(float(np.mean(peaks)), 1), "max": round(float(np.max(peaks)), 1)}}
+        if truth:
+            result["precision"] = round(tp / (tp + fp), 4) if tp + fp else None
+            result["recall"] = round(tp / (tp + fn), 4) if tp + fn else None
+            result["tp_fp_fn"] = [tp, fp, fn]
+        return result
+    finally:
+        DETECT_OPTIONS.clear()
+        DETECT_OPTIONS.update(saved)
+
+
+def compare(report, baseline, tolerance):
+    """Lista de regresiones (texto) frente a un baseline."""
+    problems = []
+    for mode, cur in report["modos"].items():
+        old = baseline.get("modos", {}).get(mode)
+        if old is None:
+            continue
+        for p in ("p50", "p95"):
+            a, b = old["frame_ms"].get(p), cur["frame_ms"].get(p)
+            if a and b and b > a * (1 + tolerance):
+                problems.append(f"{mode}: latencia {p} {a:.2f} -> {b:.2f} ms (+{(b / a - 1) * 100:.0f}%)")
+        for key in ("precision", "recall"):
+            a, b = old.get(key), cur.get(key)
+            if a is not None and b is not None and b < a - 0.01:
+                problems.append(f"{mode}: {key} {a:.3f} -> {b:.3f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de detector.detect.")
+    parser.add_argument("--frames", default=None, help="Carpeta de capturas (por defecto capturas-debug).")
+    parser.add_argument("--synthetic", type=int, default=0, help="Nº de frames sintéticos a añadir.")
+    parser.add_argument("--truth", default=None, help="JSON con las cajas reales de cada captura.")
+    parser.add_argument("--modes", default=",".join(MODES), help="Modos separados por comas.")
+    parser.add_argument("--conf", type=float, default=0.83)
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por frame.")
+    parser.add_argument("--per-template", action="store_true", help="Medir también cada template por separado.")
+    parser.add_argument("--out", default=None, help="Guardar el informe JSON aquí.")
+    parser.add_argument("--baseline", default=None, help="Informe anterior con el que comparar.")
+    parser.add_argument("--save-baseline", default=None, help="Guardar este informe como baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Subida de latencia tolerada (0.15 = 15%%).")
+    args = parser.parse_args()
+
+    folder = args.frames or next((d for d in CAPTURAS_DIRS if os.path.isdir(d)), None)
+    frames = load_frames(folder)
+    truth = {}
+    if args.truth:
+        with open(args.truth, "r", encoding="utf-8") as f:
+            truth = json.load(f)
+    if args.synthetic > 0:
+        synth, synth_truth = synthetic_frames(args.synthetic)
+        frames += synth
+        truth.update(synth_truth)
+    if not frames:
+        print("[ERROR] No hay frames: usa --frames o --synthetic.")
+        return 2
+    templates = REGISTRY.templates
+    if not templates:
+        print("[ERROR] No hay templates cargados.")
+        return 2
+
+    print(f"Frames: {len(frames)} | Templates: {sum(len(t) for t in templates.values())} | CPUs: {os.cpu_count()}")
+    report = {"frames": len(frames), "templates": list(templates), "modos": {}}
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        if mode not in MODES:
+            print(f"Advertencia: modo desconocido '{mode}'. Se ignora.")
+            continue
+        result = run_mode(mode, MODES[mode], frames, truth, args.conf, max(1, args.repeat), args.per_template)
+        report["modos"][mode] = result
+        ms = result["frame_ms"]
+        line = f"{mode:10s} p50 {ms['p50']:8.2f} ms  p95 {ms['p95']:8.2f} ms  p99 {ms['p99']:8.2f} ms  mem {result['memoria_pico_kb']['media']:8.1f} KB"
+        if "recall" in result:
+            line += f"  precisión {result['precision']}  recall {result['recall']}"
+        print(line)
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        if problems:
+            print("REGRESIONES:")
+            for p in problems:
+                print("  - " + p)
+            return 1
+        print("Sin regresiones frente al baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
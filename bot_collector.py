@@ -1,5 +1,62 @@
-import time
+import math
 from utils import click_at, log
+import timing
+from timing import interruptible_sleep
+
+def _path_length(start, points):
+    """Distancia (px) de recorrer 'points' en orden empezando en 'start'."""
+    total, prev = 0.0, start
+    for p in points:
+        total += math.dist(prev, p)
+        prev = p
+    return total
+
+def order_route(start, points):
+    """
+    Orden de visita corto (ruta abierta desde 'start'): vecino más cercano
+    y luego 2-opt hasta que ninguna inversión de tramo acorte la ruta.
+    Devuelve la lista de índices de 'points'.
+    """
+    remaining = list(range(len(points)))
+    order, pos = [], start
+    while remaining:
+        nearest = min(remaining, key=lambda i: math.dist(pos, points[i]))
+        remaining.remove(nearest)
+        order.append(nearest)
+        pos = points[nearest]
+
+    # 2-opt: invertir order[i..j] si mejora (el tramo final no tiene vuelta)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            a = start if i == 0 else points[order[i - 1]]
+            b = points[order[i]]
+            for j in range(i + 1, len(order)):
+                c = points[order[j]]
+                d = points[order[j + 1]] if j + 1 < len(order) else None
+                before = math.dist(a, b) + (math.dist(c, d) if d else 0.0)
+                after = math.dist(a, c) + (math.dist(b, d) if d else 0.0)
+                if after < before - 1e-9:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    improved = True
+                    b = points[order[i]]
+    return order
+
+def character_position(bot, config):
+    """
+    Posición estimada del personaje (coordenadas de las detecciones): donde
+    terminó la última recolección en esta sala, 'character_pos' del config
+    o el centro del ROI.
+    """
+    pos = getattr(bot, "character_pos", None) if bot else None
+    if pos is None:
+        pos = config.get("character_pos")
+    if pos is None:
+        roi = config.get("ROI") or {}
+        try: pos = (int(roi["w"]) / 2, int(roi["h"]) / 2)
+        except (KeyError, TypeError, ValueError): pos = (0, 0)
+    return tuple(pos)
 
 def collect_one_by_one(bot, detected_list, config):
     """
@@ -15,29 +72,41 @@ def collect_one_by_one(bot, detected_list, config):
 
     # Extraer solo coordenadas, evitando duplicados cercanos
     detected_points = []
+    targets = [] # Detección de cada punto (para vigilar su recolección)
     for d in detected_list:
         cx, cy = d["cx"], d["cy"]
         if any(abs(cx - dx) < 45 and abs(cy - dy) < 45 for dx, dy in detected_points):
             continue
         detected_points.append((cx, cy))
+        targets.append(d)
+
+    # Ordenar para caminar lo menos posible desde donde está el personaje
+    if len(detected_points) > 1:
+        start = character_position(bot, config)
+        order = order_route(start, detected_points)
+        original = _path_length(start, detected_points)
+        detected_points = [detected_points[i] for i in order]
+        targets = [targets[i] for i in order]
+        log(f"Ruta de recolección: {len(detected_points)} recursos, ~{_path_length(start, detected_points):.0f}px "
+            f"(orden de detección ~{original:.0f}px)")
+    if bot is not None:
+        bot.character_pos = detected_points[-1] # Acabará junto al último recurso
 
     # log(f"Recursos filtrados: {len(detected_points)}. Haciendo clic en todos con delay humano.")
 
     # Clic en todos los recursos con delay humano y chequeo de pausa
     for i, (cx, cy) in enumerate(detected_points, start=1):
-        if bot and not bot.running:
-            log("Bot pausado. Abortando colecta.")
+        if bot and bot.interrupted():
+            log("Bot pausado (o alerta pendiente). Abortando colecta.")
             return
         click_at(cx, cy)
         # log(f"Clic en recurso {i}/{len(detected_points)}.")
 
         # Delay entre clics respetando pausa
         if i < len(detected_points):
-            for _ in range(int(click_delay*10)):
-                if bot and not bot.running:
-                    log("Bot pausado durante delay entre clics. Abortando colecta.")
-                    return
-                time.sleep(0.1)
+            if not interruptible_sleep(bot, click_delay):
+                log("Bot pausado (o alerta pendiente) durante delay entre clics. Abortando colecta.")
+                return
 
     # Calcular estancia total en la sala
     total_wait = 5.8
@@ -47,13 +116,24 @@ def collect_one_by_one(bot, detected_list, config):
         total_wait += 1.5
         # log("4 o más recursos detectados, sumando 1.5s extra a la estancia.")
 
+    # Con el monitor de recolección la estancia calculada pasa a ser el máximo:
+    # se sale en cuanto ya no se ve ninguno de los recursos clicados
+    monitor = getattr(bot, "harvest", None) if bot else None
+    if monitor is not None:
+        monitor.watch(targets)
+
     # log(f"Esperando {total_wait}s en la sala por {len(detected_points)} recursos")
     # Espera total respetando pausa
-    waited = 0.0
-    interval = 0.2
-    while waited < total_wait:
-        if bot and not bot.running:
-            log("Bot pausado durante espera final. Abortando espera.")
+    # Sin monitor es una sola espera; con él se duerme hasta la siguiente comprobación
+    deadline = timing.now() + total_wait
+    while True:
+        remaining = deadline - timing.now()
+        if remaining <= 0:
+            return
+        if monitor is not None and monitor.poll():
+            # log(f"Recursos recolectados en {total_wait - remaining:.2f}s de {total_wait}s")
+            return
+        step = min(monitor.interval, remaining) if monitor is not None else remaining
+        if not interruptible_sleep(bot, step):
+            log("Bot pausado (o alerta pendiente) durante espera final. Abortando espera.")
             return
-        time.sleep(interval)
-        waited += interval
@@ -1,13 +1,19 @@
 # bot_ui.py
+# Se lanza con run_bot_ui.py: este módulo importa el bot y los templates al
+# cargarse, y los procesos del pool de batch_eval re-importan el script principal.
 import os
 import cv2
-import yaml
+import base64
+import copy
 import re
 import tkinter as tk
 from tkinter import ttk, messagebox # Importar ttk
 import threading
 import time
 import keyboard
+from batch_eval import BatchEvaluator, list_images, write_summary
+from template_registry import get_registry
+from config_store import get_config_store
 # --- Importación robusta de controller.Bot ---
 try:
     from controller import Bot
@@ -23,6 +29,7 @@ except ImportError:
             def __init__(self, config_path): self.running = False; self.config = {}
             def toggle_running(self): messagebox.showwarning("Bot", "Bot no inicializado (Falta controller.py).")
             def stop(self): messagebox.showwarning("Bot", "Bot no inicializado.")
+            def request_profile(self): pass
             def run_loop(self): print("Bucle Bot (dummy).")
 # --- Fin Importación ---
 
@@ -37,64 +44,13 @@ os.makedirs(CAPTURAS_DIR, exist_ok=True)
 os.makedirs(TEMPLATE_DIR, exist_ok=True)
 os.makedirs(SOUNDS_DIR, exist_ok=True)
 
-# --- Cargar templates ---
-RESOURCE_TEMPLATES = {}
-# (El código de carga de templates permanece igual)
-if os.path.isdir(TEMPLATE_DIR):
-    for fname in os.listdir(TEMPLATE_DIR):
-        name, ext = os.path.splitext(fname)
-        if ext.lower() not in [".png", ".jpg", ".jpeg"]: continue
-        try:
-            # --- USANDO DETECTOR.PY MODIFICADO ---
-            # Cargar en escala de grises
-            template = cv2.imread(os.path.join(TEMPLATE_DIR, fname), cv2.IMREAD_GRAYSCALE) 
-            if template is None: continue
-            # Ya no se convierte BGR/BGRA
-            RESOURCE_TEMPLATES.setdefault(name, []).append(template)
-        except Exception as e: print(f"Error cargando template {fname}: {e}")
-else: print(f"Advertencia: Directorio de templates '{TEMPLATE_DIR}' no existe.")
-print(f"Templates cargados: {list(RESOURCE_TEMPLATES.keys())}")
-
-
-# --- detect_template (usará el de detector.py, esta función es solo para TEST) ---
-def detect_template(img, template, label, conf_thresh=0.8):
-    # Esta función es solo para el botón TEST de la UI
-    # Debe simular lo que hace el detector.py (usar escala de grises)
-    if img is None or template is None: return []
-    
-    # Convertir imagen de captura a gris
-    if len(img.shape) == 3:
-        img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    else:
-        img_gray = img
-        
-    # Template ya debería estar en gris si viene de RESOURCE_TEMPLATES
-    tpl_gray = template
-    if len(template.shape) == 3: # Fallback por si acaso
-        tpl_gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-
-    import numpy as np
-    try: h, w = tpl_gray.shape[:2]; res = cv2.matchTemplate(img_gray, tpl_gray, cv2.TM_CCOEFF_NORMED)
-    except cv2.error: return []
-    
-    loc = np.where(res >= conf_thresh); detections, seen_bboxes = [], []
-    for pt in zip(*loc[::-1]):
-        x1, y1 = pt; x2, y2 = x1 + w, y1 + h; cx, cy = x1 + w // 2, y1 + h // 2
-        confidence, is_duplicate, current_area = float(res[y1, x1]), False, w * h
-        if current_area == 0: continue
-        for (sx1, sy1, sx2, sy2) in seen_bboxes:
-            inter_x1, inter_y1 = max(x1, sx1), max(y1, sy1); inter_x2, inter_y2 = min(x2, sx2), min(y2, sy2)
-            inter_w, inter_h = max(0, inter_x2 - inter_x1), max(0, inter_y2 - inter_y1); inter_area = inter_w * inter_h
-            box1_area, box2_area = current_area, (sx2 - sx1) * (sy2 - sy1); union_area = box1_area + box2_area - inter_area
-            if union_area == 0: continue
-            iou = inter_area / union_area
-            if iou > 0.5: is_duplicate = True; break
-        if not is_duplicate:
-            seen_bboxes.append((x1, y1, x2, y2)); detections.append({"label": label, "cx": cx, "cy": cy})
-            # Dibujar en la imagen original a color (img) no en la gris (img_gray)
-            cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.putText(img, f"{label} ({confidence:.2f})", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (36,255,12), 1)
-    return detections
+# --- Claves que edita cada panel (al guardar solo se escriben estas) ---
+MAIN_PANEL_KEYS = ("bot_token", "chat_id", "collect_time", "post_move_wait", "ROI", "enable_scan_beep", "preview")
+MAP_PANEL_KEYS = ("map_path", "map_specific_templates", "post_move_overrides")
+
+# --- Templates (registro compartido con el detector, decodificados una sola vez) ---
+print(f"Templates cargados: {list(get_registry().templates)}")
+
 
 # --- Clase BotUI ---
 class BotUI:
@@ -127,28 +83,13 @@ class BotUI:
                 def __init__(self, config_path): self.running = False; self.config = {}
                 def toggle_running(self): messagebox.showwarning("Bot", "Bot no inicializado.")
                 def stop(self): pass
+                def request_profile(self): pass
                 def run_loop(self): print("Bucle Bot (dummy).")
             self.bot = DummyBot(CONFIG_PATH)
 
         self.load_config()
-        map_path_data = self.config.get("map_path", [])
-        fixed_map = []
-        if isinstance(map_path_data, str):
-            coords = re.findall(r'\[\s*(\d+)\s*,\s*(\d+)\s*\]', map_path_data)
-            for x_str, y_str in coords:
-                try: fixed_map.append([int(x_str), int(y_str)])
-                except ValueError: continue
-        elif isinstance(map_path_data, list):
-            for item in map_path_data:
-                if isinstance(item, list) and len(item) == 2:
-                    try: fixed_map.append([int(item[0]), int(item[1])])
-                    except (ValueError, TypeError): continue
-                elif isinstance(item, str):
-                    parts = item.replace("[", "").replace("]", "").split(",");
-                    if len(parts) == 2:
-                        try: fixed_map.append([int(parts[0].strip()), int(parts[1].strip())])
-                        except ValueError: continue
-        self.config["map_path"] = fixed_map
+        # El bot (tune_overrides) y las ediciones a mano de config.yaml también cambian la config
+        get_config_store(CONFIG_PATH).subscribe(self._on_config_change)
 
         self.main_frame = ttk.Frame(master, padding="10 10 10 10")
         self.overrides_frame = ttk.Frame(master, padding="10 10 10 10")
@@ -162,52 +103,33 @@ class BotUI:
         try:
             self.load_config()
             toggle_key, exit_key = self.config.get("toggle_key", "f8"), self.config.get("exit_key", "esc")
-            print(f"Listener teclado OK. Toggle: '{toggle_key}', Exit: '{exit_key}'")
+            profile_key = self.config.get("profile_key", "f9")
+            print(f"Listener teclado OK. Toggle: '{toggle_key}', Exit: '{exit_key}', Perfilar: '{profile_key}'")
             while True:
                 if keyboard.is_pressed(toggle_key):
                     self.master.after(0, self.toggle_play)
                     while keyboard.is_pressed(toggle_key): time.sleep(0.05)
+                if keyboard.is_pressed(profile_key):
+                    self.bot.request_profile()
+                    while keyboard.is_pressed(profile_key): time.sleep(0.05)
                 if keyboard.is_pressed(exit_key):
                     self.bot.stop(); self.master.after(0, self.master.quit); break
                 time.sleep(0.1)
         except Exception as e: print(f"Error listener teclado: {e}")
 
     def load_config(self):
+        """Copia editable de la config compartida (ya validada, con defaults)."""
+        self.config = copy.deepcopy(get_config_store(CONFIG_PATH).config)
+
+    def _on_config_change(self, config, changed):
+        """Lo llama el vigilante de config (otro hilo): refrescar la copia en el hilo de Tk."""
+        self.master.after(0, self.load_config)
+
+    def save_config(self, keys, show_success_message=True):
+        """Escribe solo 'keys' (las que edita el panel): no pisa lo que hayan cambiado el bot o el fichero."""
         try:
-            if os.path.exists(CONFIG_PATH):
-                with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-                    loaded_config = yaml.safe_load(f)
-                    self.config = loaded_config if isinstance(loaded_config, dict) else {}
-            else: self.config = {}
-        except Exception as e: print(f"Error cargando config: {e}"); self.config = {}
-
-        defaults = {
-            "bot_token": "", "chat_id": "", "collect_time": 3.5, "post_move_wait": 2.2,
-            "ROI": {"x": 0, "y": 0, "w": 1277, "h": 1076}, "post_move_overrides": {},
-            "map_path": [], "toggle_key": "f8", "exit_key": "esc", "conf_thresh": 0.83,
-            "scan_delay": 0.85, "randomize_delays": True, "auto_pause_on_arena": True,
-            "model_path": None, "classes": [], "enable_scan_beep": False,
-            "map_specific_templates": {} # *** AÑADIR DEFAULT ***
-        }
-        for key, value in defaults.items(): self.config.setdefault(key, value)
-        if not isinstance(self.config.get("ROI"), dict): self.config["ROI"] = defaults["ROI"].copy()
-        if not isinstance(self.config.get("post_move_overrides"), dict): self.config["post_move_overrides"] = defaults["post_move_overrides"].copy()
-        if not isinstance(self.config.get("map_specific_templates"), dict): self.config["map_specific_templates"] = defaults["map_specific_templates"].copy() # *** ASEGURAR DICT ***
-        if isinstance(self.config.get("map_path"), str): pass
-        elif not isinstance(self.config.get("map_path"), list): self.config["map_path"] = defaults["map_path"][:]
-        if isinstance(self.config.get("map_path"), str):
-             map_str = self.config["map_path"]; coords_list = []
-             coords = re.findall(r'\[\s*(\d+)\s*,\s*(\d+)\s*\]', map_str)
-             for x_str, y_str in coords:
-                 try: coords_list.append([int(x_str), int(y_str)])
-                 except ValueError: pass
-             self.config["map_path"] = coords_list
-
-    def save_config(self, show_success_message=True):
-        try:
-            yaml.SafeDumper.ignore_aliases = lambda *args: True
-            with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-                yaml.safe_dump(self.config, f, sort_keys=False, allow_unicode=True)
+            get_config_store(CONFIG_PATH).update({k: self.config[k] for k in keys}) # El bot en marcha recibe los cambios
+            self.load_config()
             if show_success_message: messagebox.showinfo("Configuración", "Guardado correctamente.")
         except Exception as e: messagebox.showerror("Error", f"No se pudo guardar: {e}"); raise
 
@@ -219,17 +141,24 @@ class BotUI:
             self.config["post_move_wait"] = float(self.post_move_wait_var.get())
             self.config["ROI"] = {"x": int(self.roi_x_var.get()), "y": int(self.roi_y_var.get()), "w": int(self.roi_w_var.get()), "h": int(self.roi_h_var.get())}
             self.config["enable_scan_beep"] = self.enable_scan_beep_var.get()
+            self.config["preview"] = self.preview_var.get()
             return True
         except ValueError as e: messagebox.showerror("Error de Validación", f"Valor numérico inválido: {e}"); return False
 
     # --- MODIFICADO ---
     def update_map_config(self):
         """Actualiza map_path, overrides Y map_specific_templates."""
+        # Partir de los overrides actuales (el bot puede haberlos ajustado con el panel abierto)
+        # y aplicar solo las casillas que el usuario ha cambiado
+        current = get_config_store(CONFIG_PATH).config.get("post_move_overrides", {}) or {}
+        opened = getattr(self, 'opened_overrides', {})
         new_overrides = {}
         if hasattr(self, 'override_vars'):
             for idx, override_var in self.override_vars.items():
                 val = override_var.get().strip()
-                if val:
+                if val == opened.get(str(idx), ""):
+                    if str(idx) in current: new_overrides[str(idx)] = current[str(idx)]
+                elif val:
                     try: new_overrides[str(idx)] = float(val)
                     except ValueError: messagebox.showerror("Error", f"Override para {idx} debe ser número."); return False
         self.config["post_move_overrides"] = new_overrides
@@ -261,12 +190,12 @@ class BotUI:
 
     def save_main_config_action(self):
         if self.update_main_config():
-            try: self.save_config()
+            try: self.save_config(MAIN_PANEL_KEYS)
             except: pass
 
     def save_map_config_action(self):
         if self.update_map_config():
-            try: self.save_config()
+            try: self.save_config(MAP_PANEL_KEYS)
             except: pass
 
     def create_main_panel(self):
@@ -286,6 +215,8 @@ class BotUI:
         debug_frame = ttk.LabelFrame(frame, text="Opciones de Depuración", padding="10"); debug_frame.grid(row=2, column=0, sticky="ew", padx=10, pady=(0, 10))
         self.enable_scan_beep_var = tk.BooleanVar(value=self.config.get("enable_scan_beep", False))
         ttk.Checkbutton(debug_frame, text="Activar pitido de escaneo", variable=self.enable_scan_beep_var).pack(side="left", padx=5)
+        self.preview_var = tk.BooleanVar(value=self.config.get("preview", False))
+        ttk.Checkbutton(debug_frame, text="Vista previa en vivo", variable=self.preview_var, command=self.toggle_preview).pack(side="left", padx=5)
 
         roi_frame = ttk.LabelFrame(frame, text="Región de Interés (ROI)", padding="10 5"); roi_frame.grid(row=3, column=0, sticky="ew", padx=10, pady=(0, 20))
         roi_defaults = {"x": 0, "y": 0, "w": 1277, "h": 1076}; roi_config = self.config.get("ROI", roi_defaults);
@@ -299,10 +230,20 @@ class BotUI:
         button_frame.columnconfigure((0,1,2), weight=1)
         initial_style, initial_text = ('Pause.TButton', 'Pause (F8)') if self.bot.running else ('Play.TButton', 'Play (F8)')
         self.play_btn = ttk.Button(button_frame, text=initial_text, command=self.toggle_play, style=initial_style, width=15); self.play_btn.grid(row=0, column=0, columnspan=3, pady=(0, 15), ipady=5)
-        ttk.Button(button_frame, text="TEST Templates", command=self.run_test, style='Special.TButton', width=18).grid(row=1, column=0, padx=5, pady=5)
+        self.test_btn = ttk.Button(button_frame, text="TEST Templates", command=self.run_test, style='Special.TButton', width=18); self.test_btn.grid(row=1, column=0, padx=5, pady=5)
         ttk.Button(button_frame, text="Editar MAP PATH", command=self.show_overrides_panel, style='Accent.TButton', width=18).grid(row=1, column=1, padx=5, pady=5, columnspan=2)
         ttk.Button(button_frame, text="Guardar Config", command=self.save_main_config_action, style='Save.TButton', width=18).grid(row=2, column=0, padx=5, pady=5)
         ttk.Button(button_frame, text="Cerrar App", command=self.stop_and_quit, style='Stop.TButton', width=18).grid(row=2, column=1, padx=5, pady=5, columnspan=2)
+        self.test_status_var = tk.StringVar(value="")
+        ttk.Label(button_frame, textvariable=self.test_status_var, anchor='center').grid(row=3, column=0, columnspan=3, pady=(5, 0))
+
+        # Vista previa: último frame del bot con las detecciones que ya calculó (sin detectar otra vez)
+        self.preview_frame = ttk.LabelFrame(frame, text="Vista previa", padding="5"); self.preview_frame.grid(row=5, column=0, sticky="ew", padx=10, pady=(10, 0))
+        self.preview_label = ttk.Label(self.preview_frame, anchor='center'); self.preview_label.pack(fill="both", expand=True)
+        self.preview_info_var = tk.StringVar(value="Esperando frames del bot...")
+        ttk.Label(self.preview_frame, textvariable=self.preview_info_var, anchor='center').pack(fill="x")
+        self._preview_job, self._preview_seq, self._preview_photo = None, None, None
+        self.toggle_preview()
 
     # --- MODIFICADO ---
     def create_overrides_panel(self):
@@ -323,6 +264,7 @@ class BotUI:
         
         self.map_path_vars, self.override_vars = {}, {}
         self.map_templates_vars = {} # *** Nuevo diccionario ***
+        self.opened_overrides = {} # Texto de cada casilla al abrir, para saber cuáles editó el usuario
 
         # Cabeceras
         ttk.Label(frame, text="#", anchor='e').grid(row=1, column=0, padx=(5,2), pady=(0,5), sticky='ew')
@@ -347,6 +289,7 @@ class BotUI:
 
             self.map_path_vars[idx], self.override_vars[idx] = (x_var, y_var), ov_var
             self.map_templates_vars[idx] = templates_var # *** Guardar la variable ***
+            self.opened_overrides[str(idx)] = str(ov_val)
 
             base_row = idx + 2; last_row = base_row
             ttk.Label(frame, text=f"{idx}").grid(row=base_row, column=0, padx=(5,2), pady=2, sticky="e")
@@ -418,33 +361,81 @@ class BotUI:
         if hasattr(self.bot, 'stop'): self.bot.stop()
         self.master.after(100, self.master.quit)
 
+    # --- Vista previa ---
+    def toggle_preview(self):
+        """Muestra/oculta el panel; el temporizador solo corre con la vista previa activa."""
+        if hasattr(self.bot, 'set_preview'):
+            width = max(64, int(self.config.get("preview_width", 360))) if self.preview_var.get() else 0
+            self.bot.set_preview(width, max(0.1, float(self.config.get("preview_interval", 0.5))))
+        if self.preview_var.get():
+            self.preview_frame.grid()
+            if self._preview_job is None: self._update_preview()
+        else:
+            self.preview_frame.grid_remove()
+            if self._preview_job is not None: self.master.after_cancel(self._preview_job); self._preview_job = None
+
+    def _update_preview(self):
+        self._preview_job = None
+        if not self.preview_var.get(): return
+        view = getattr(self.bot, "last_view", None)
+        if view is not None and view[0] != self._preview_seq:
+            try: self._show_preview(*view)
+            except Exception as e: self.preview_info_var.set(f"Error en la vista previa: {e}")
+        interval = max(0.1, float(self.config.get("preview_interval", 0.5)))
+        self._preview_job = self.master.after(int(interval * 1000), self._update_preview)
+
+    def _show_preview(self, seq, thumb, dets, scale):
+        """'thumb' ya es una copia reducida (Bot.publish_view); 'scale' pasa las cajas del frame a la miniatura."""
+        small = cv2.cvtColor(thumb, cv2.COLOR_GRAY2BGR) if thumb.ndim == 2 else thumb.copy()
+        for d in dets:
+            x1, y1, x2, y2 = (int(v * scale) for v in d["bbox"])
+            cv2.rectangle(small, (x1, y1), (x2, y2), (0, 255, 0), 1)
+            cv2.putText(small, d["label"], (x1, max(8, y1 - 3)), cv2.FONT_HERSHEY_SIMPLEX, 0.3, (36, 255, 12), 1)
+        ok, buf = cv2.imencode(".png", small, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok: return
+        self._preview_photo = tk.PhotoImage(data=base64.b64encode(buf.tobytes()).decode("ascii")) # Referencia: si no, Tk la libera
+        self.preview_label.config(image=self._preview_photo)
+        self._preview_seq = seq
+        labels = [d["label"] for d in dets]
+        self.preview_info_var.set(f"Escaneo {seq} | {len(labels)} detecciones" + (f": {', '.join(sorted(set(labels)))}" if labels else ""))
+
+    # --- TEST de templates (en un hilo: la ventana sigue respondiendo) ---
     def run_test(self):
         print("Ejecutando Test de Templates...")
         if not os.path.exists(CAPTURAS_DIR): messagebox.showerror("Error", f"No existe '{CAPTURAS_DIR}'."); return
-        img_files = [f for f in os.listdir(CAPTURAS_DIR) if f.lower().endswith((".png", ".jpg", ".jpeg"))]
-        if not img_files: messagebox.showinfo("Info", f"No hay imágenes en '{CAPTURAS_DIR}'."); return
+        paths = list_images(CAPTURAS_DIR)
+        if not paths: messagebox.showinfo("Info", f"No hay imágenes en '{CAPTURAS_DIR}'."); return
         conf_thresh_test = self.config.get('conf_thresh', 0.8)
-        print(f"Usando umbral: {conf_thresh_test}"); detections_found = False
-        for img_name in img_files:
-            img_path = os.path.join(CAPTURAS_DIR, img_name); img_orig = cv2.imread(img_path)
-            if img_orig is None: continue
-            img_to_detect = img_orig.copy(); print(f"--- Procesando {img_name} ---"); found_in_img = False
-            for res_name, templates in RESOURCE_TEMPLATES.items():
-                for i, t in enumerate(templates):
-                    if t is None: continue
-                    # Usar la función de detección de la UI para el test
-                    dets = detect_template(img_to_detect, t, res_name, conf_thresh=conf_thresh_test) 
-                    if dets: found_in_img = True; detections_found = True
-            if found_in_img:
-                debug_filename = f"debug_{os.path.splitext(img_name)[0]}.png"; debug_path = os.path.join(DEBUGS_DIR, debug_filename)
-                try: cv2.imwrite(debug_path, img_to_detect); print(f"  Resultado: {debug_path}")
-                except Exception as e: print(f"  Error guardando debug: {e}")
+        print(f"Usando umbral: {conf_thresh_test}")
+        evaluator = BatchEvaluator(conf=conf_thresh_test, workers=self.config.get("test_workers", 0), out_dir=DEBUGS_DIR,
+                                   image_format=self.config.get("debug_image_format", "png"),
+                                   scale=self.config.get("debug_image_scale", 1.0))
+        self.test_btn.config(state="disabled")
+        self.test_status_var.set(f"Test: 0/{len(paths)}...")
+        threading.Thread(target=self._run_test_worker, args=(evaluator, paths, conf_thresh_test), name="TemplateTest", daemon=True).start()
+
+    def _run_test_worker(self, evaluator, paths, conf_thresh_test):
+        def on_result(result, done, total):
+            print(f"--- [{done}/{total}] {result['image']} ---")
+            if result["error"]: print(f"  Error: {result['error']}")
+            elif result["debug"]: print(f"  Resultado: {result['debug']} {[d['label'] for d in result['detections']]}")
             else: print(f"  Sin coincidencias.")
-        if detections_found: messagebox.showinfo("TEST", f"Test finalizado. Revisa '{DEBUGS_DIR}'.")
+            self.master.after(0, self.test_status_var.set, f"Test: {done}/{total} ({result['image']})")
+        try:
+            get_registry().refresh() # Templates añadidos/cambiados desde el último test
+            summary = evaluator.run(paths, on_result)
+            try: write_summary(summary, os.path.join(DEBUGS_DIR, "resumen.json"))
+            except Exception as e: print(f"  Error guardando resumen: {e}")
+            print(f"Test: {summary['imagenes']} imágenes en {summary['segundos']:.2f}s ({summary['procesos']} procesos).")
+        except Exception as e:
+            print(f"Error en el test de templates: {e}")
+            summary = None
+        self.master.after(0, self._test_done, summary, conf_thresh_test)
+
+    def _test_done(self, summary, conf_thresh_test):
+        self.test_btn.config(state="normal")
+        if summary is None:
+            self.test_status_var.set("Test fallido (ver consola)."); messagebox.showerror("TEST", "Error ejecutando el test. Revisa la consola."); return
+        self.test_status_var.set(f"Test: {summary['imagenes']} imágenes en {summary['segundos']:.1f}s, {summary['con_detecciones']} con detecciones.")
+        if summary["con_detecciones"]: messagebox.showinfo("TEST", f"Test finalizado. Revisa '{DEBUGS_DIR}'.")
         else: messagebox.showwarning("TEST", f"No se encontró nada con umbral {conf_thresh_test}.")
-
-if __name__ == "__main__":
-    root = tk.Tk()
-    app = BotUI(root)
-    root.protocol("WM_DELETE_WINDOW", app.stop_and_quit)
-    root.mainloop()
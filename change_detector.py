@@ -0,0 +1,137 @@
+# change_detector.py
+# Detección de cambios por baldosas entre frames consecutivos, para no volver
+# a hacer matching en las zonas de la pantalla que no han cambiado.
+
+import cv2
+import numpy as np
+from detector import detect, to_gray, merge_detections, REGISTRY
+
+
+class ChangeDetector:
+    """
+    Compara cada frame con el anterior sobre una versión reducida ('scale',
+    que además promedia el ruido de captura) y marca como sucia cada baldosa
+    de 'tile' px cuya diferencia absoluta máxima supere 'threshold' (niveles
+    de gris). Se usa el máximo y no la media para que un recurso pequeño que
+    desaparece en el borde de una baldosa no quede diluido.
+    """
+
+    def __init__(self, tile=64, scale=4, threshold=8.0):
+        self.scale = max(1, int(scale))
+        # Múltiplo de 'scale' para que cada baldosa sean celdas enteras del frame reducido
+        self.tile = max(1, int(tile) // self.scale) * self.scale
+        self.threshold = float(threshold)
+        self._prev = None
+        self._shape = None
+
+    def reset(self):
+        self._prev = None
+        self._shape = None
+
+    def update(self, img_gray):
+        """
+        Registra un frame gris y devuelve la máscara de baldosas sucias
+        (ndarray bool filas x columnas), o None si no hay frame anterior
+        comparable (primer frame o cambió el tamaño): todo cuenta como cambiado.
+        """
+        h, w = img_gray.shape[:2]
+        small = cv2.resize(img_gray, (max(1, w // self.scale), max(1, h // self.scale)),
+                           interpolation=cv2.INTER_AREA)
+        prev, self._prev = self._prev, small
+        if prev is None or self._shape != (h, w):
+            self._shape = (h, w)
+            return None
+        diff = cv2.absdiff(small, prev)
+        grid_h = (h + self.tile - 1) // self.tile
+        grid_w = (w + self.tile - 1) // self.tile
+        # Máximo por baldosa: se rellena hasta múltiplo de la baldosa reducida y se pliega
+        t = self.tile // self.scale
+        padded = np.zeros((grid_h * t, grid_w * t), dtype=np.uint8)
+        sh, sw = min(diff.shape[0], grid_h * t), min(diff.shape[1], grid_w * t)
+        padded[:sh, :sw] = diff[:sh, :sw]
+        tile_max = padded.reshape(grid_h, t, grid_w, t).max(axis=(1, 3))
+        return tile_max > self.threshold
+
+    def tile_rects(self, dirty):
+        """Baldosas sucias agrupadas en rectángulos (x1, y1, x2, y2) del frame."""
+        n, _, stats, _ = cv2.connectedComponentsWithStats(dirty.astype(np.uint8), connectivity=8)
+        t = self.tile
+        return [(int(x) * t, int(y) * t, int(x + w) * t, int(y + h) * t) for x, y, w, h, _ in stats[1:]]
+
+
+def _intersects(box, rects):
+    x1, y1, x2, y2 = box
+    return any(x1 < rx2 and rx1 < x2 and y1 < ry2 and ry1 < y2 for rx1, ry1, rx2, ry2 in rects)
+
+def _intersect_rects(a, b):
+    """Intersección de dos listas de rectángulos (por parejas)."""
+    out = []
+    for ax1, ay1, ax2, ay2 in a:
+        for bx1, by1, bx2, by2 in b:
+            x1, y1, x2, y2 = max(ax1, bx1), max(ay1, by1), min(ax2, bx2), min(ay2, by2)
+            if x2 > x1 and y2 > y1:
+                out.append((x1, y1, x2, y2))
+    return out
+
+
+class IncrementalDetector:
+    """
+    Envuelve detect() para escaneos repetidos de una misma sala.
+
+    new_frame() calcula una vez por frame qué baldosas cambiaron. detect()
+    reutiliza las detecciones anteriores que no tocan zonas cambiadas y solo
+    repite el matching en las zonas sucias, agrandadas con el tamaño del
+    template más grande (así se cubren todas las posiciones cuya huella
+    solapa un cambio). Cada 'key' (p.ej. recursos / alertas) guarda su propio
+    resultado anterior. reset() al cambiar de sala.
+    """
+
+    def __init__(self, tile=64, scale=4, threshold=8.0):
+        self.changes = ChangeDetector(tile, scale, threshold)
+        self._prev = {}     # key -> (parámetros, detecciones)
+        self._dirty = None  # Máscara del frame actual (None = todo cambiado)
+        self._gray = None
+
+    def reset(self):
+        self.changes.reset()
+        self._prev = {}
+        self._dirty = None
+
+    def new_frame(self, img):
+        """Registra el frame actual. Devuelve su versión en gris (o None si falla)."""
+        self._gray = to_gray(img)
+        self._dirty = self.changes.update(self._gray) if self._gray is not None else None
+        return self._gray
+
+    def dirty_fraction(self):
+        """Fracción de baldosas cambiadas en el último frame (1.0 = todo)."""
+        return 1.0 if self._dirty is None else float(self._dirty.mean())
+
+    def detect(self, key, model, conf, classes, search_regions=None):
+        gray = self._gray
+        if gray is None:
+            return []
+        classes = list(classes)
+        params = (tuple(classes), conf, None if search_regions is None else tuple(search_regions))
+        prev = self._prev.get(key)
+
+        if self._dirty is None or prev is None or prev[0] != params:
+            dets = detect(model, gray, conf=conf, classes=classes, search_regions=search_regions)
+        elif not self._dirty.any():
+            dets = [dict(d) for d in prev[1]] # Nada cambió
+        else:
+            dirty_rects = self.changes.tile_rects(self._dirty)
+            # Posiciones afectadas: cualquier template cuya huella toque una baldosa sucia
+            templates = REGISTRY.templates
+            tpls = [t for c in classes for t in templates.get(c) or []]
+            pad_h = max((t.shape[0] for t in tpls), default=0)
+            pad_w = max((t.shape[1] for t in tpls), default=0)
+            rematch = [(x1 - pad_w, y1 - pad_h, x2 + pad_w, y2 + pad_h) for x1, y1, x2, y2 in dirty_rects]
+            if search_regions is not None:
+                rematch = _intersect_rects(rematch, search_regions)
+            kept = [dict(d) for d in prev[1] if not _intersects(d["bbox"], dirty_rects)]
+            new = detect(model, gray, conf=conf, classes=classes, search_regions=rematch) if rematch else []
+            dets = merge_detections(kept + new, classes)
+
+        self._prev[key] = (params, [dict(d) for d in dets])
+        return dets
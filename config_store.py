@@ -0,0 +1,227 @@
+# config_store.py
+# Config única para todo el programa: config.yaml se lee y valida una vez,
+# todos los módulos comparten el mismo diccionario y un hilo vigila el
+# fichero para publicar los cambios (p.ej. ediciones de la UI) al bot en marcha.
+
+import os
+import re
+import copy
+import threading
+import yaml
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.yaml")
+
+# Esquema: clave -> (tipo, valor por defecto). Los valores se convierten al
+# tipo indicado al cargar; si no se puede se avisa y se usa el defecto.
+# Las claves que no están aquí se conservan tal cual.
+SCHEMA = {
+    "model_path": (str, None), "map_path": (list, []), "conf_thresh": (float, 0.83),
+    "scan_delay": (float, 0.85), "post_move_wait": (float, 1.8), "randomize_delays": (bool, True),
+    "auto_pause_on_arena": (bool, True), "post_move_overrides": (dict, {}), "resource_classes": (list, []),
+    "classes": (list, []), "toggle_key": (str, "f8"), "exit_key": (str, "esc"),
+    "bot_token": (str, ""), "chat_id": (str, ""),
+    "ROI": (dict, {"x": 0, "y": 0, "w": 1277, "h": 1076}),
+    "collect_time": (float, 3.5), "enable_scan_beep": (bool, False),
+    "capture_thread": (bool, False), "capture_fps": (float, 30), "capture_mode": (str, "gray"),
+    "pyramid_levels": (int, 0), "detect_workers": (int, 0), "match_method": (str, "opencv"),
+    "template_refresh_interval": (float, 5.0),
+    "spatial_priors": (bool, False), "priors_min_observations": (int, 5), "priors_full_scan_every": (int, 10),
+    "alert_watcher": (bool, False), "alert_interval": (float, 0.5), "alert_regions": (dict, {}),
+    "incremental_detect": (bool, False), "change_tile": (int, 64), "change_threshold": (float, 8.0),
+    "arrival_detect": (bool, False), "arrival_change_threshold": (float, 12.0),
+    "arrival_stable_threshold": (float, 2.0), "arrival_stable_time": (float, 0.25),
+    "arrival_min_content": (float, 8.0),
+    "auto_overrides": (str, "off"), "auto_overrides_window": (int, 20), "auto_overrides_min_samples": (int, 5),
+    "auto_overrides_percentile": (float, 90.0), "auto_overrides_margin": (float, 0.3),
+    "harvest_detect": (bool, False), "harvest_interval": (float, 0.25), "harvest_misses": (int, 2),
+    "harvest_min_absent": (float, 0.75),
+    "character_pos": (list, None), "audio_backend": (str, "auto"),
+    "metrics": (bool, False), "metrics_dir": (str, "metrics"), "metrics_interval": (float, 10.0),
+    "metrics_port": (int, 0),
+    "profile_key": (str, "f9"), "profile_mode": (str, "sample"), "profile_iterations": (int, 50),
+    "profile_interval": (float, 0.005), "profile_dir": (str, "profiles"), "profile_max_seconds": (float, 120.0),
+    "test_workers": (int, 0), "debug_image_format": (str, "png"), "debug_image_scale": (float, 1.0),
+    "preview": (bool, False), "preview_interval": (float, 0.5), "preview_width": (int, 360),
+    "map_specific_templates": (dict, {}),
+}
+
+
+def parse_map_path(value):
+    """map_path como lista de [x, y] (admite el formato string antiguo)."""
+    if isinstance(value, str):
+        return [[int(x), int(y)] for x, y in re.findall(r'\[\s*(\d+)\s*,\s*(\d+)\s*\]', value)]
+    fixed = []
+    for item in value or []:
+        if isinstance(item, str):
+            parts = item.replace("[", "").replace("]", "").split(",")
+            item = parts if len(parts) == 2 else None
+        try:
+            x, y = item
+            fixed.append([int(x), int(y)])
+        except (TypeError, ValueError):
+            continue
+    return fixed
+
+
+def _coerce(key, value, typ, default):
+    if value is None:
+        return copy.deepcopy(default)
+    try:
+        if typ is bool:
+            if isinstance(value, str): # "false"/"no" escritos a mano
+                return value.strip().lower() in ("1", "true", "yes", "si", "sí", "on")
+            return bool(value)
+        if typ is str:
+            # YAML lee off/no sin comillas como False
+            return "off" if value is False and key == "auto_overrides" else str(value)
+        if typ in (dict, list):
+            if not isinstance(value, typ):
+                raise TypeError(f"se esperaba {typ.__name__}")
+            return value
+        return typ(value)
+    except (TypeError, ValueError) as e:
+        print(f"Advertencia: valor inválido para '{key}' en config ({value!r}: {e}). Usando {default!r}.")
+        return copy.deepcopy(default)
+
+
+def validate(raw):
+    """Devuelve una config nueva con defaults y tipos aplicados."""
+    config = dict(raw) if isinstance(raw, dict) else {}
+    if isinstance(config.get("map_path"), str):
+        config["map_path"] = parse_map_path(config["map_path"]) # Formato antiguo
+    for key, (typ, default) in SCHEMA.items():
+        config[key] = _coerce(key, config.get(key), typ, default)
+    config["map_path"] = parse_map_path(config["map_path"])
+    roi = config["ROI"]
+    if not all(k in roi for k in ("x", "y", "w", "h")):
+        print("Advertencia: ROI incompleto en config. Usando el ROI por defecto.")
+        config["ROI"] = copy.deepcopy(SCHEMA["ROI"][1])
+    return config
+
+
+class ConfigStore:
+    """
+    Dueña de la config. 'config' es un dict validado que NO se modifica:
+    cada recarga crea uno nuevo y lo cambia de golpe, así quien lo lea a
+    mitad de una iteración ve siempre una versión completa.
+
+    subscribe(callback) -> callback(config, claves_cambiadas) se llama desde
+    el hilo vigilante (o desde save/update) tras cada cambio. El fichero se
+    comprueba (un os.stat) cada 'poll_interval' segundos en ese hilo.
+    """
+
+    def __init__(self, path=CONFIG_PATH, poll_interval=1.0):
+        self.path = path
+        self.poll_interval = float(poll_interval)
+        self.config = validate({})
+        self.version = 0
+        self._mtime = None
+        self._subscribers = []
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = yaml.safe_load(f)
+            if not isinstance(raw, dict):
+                print(f"Error: {self.path} no es un diccionario válido. Usando config vacía.")
+                return {}
+            return raw
+        except FileNotFoundError:
+            print(f"Error: No se encontró {self.path}. Usando config vacía.")
+        except Exception as e:
+            print(f"Error CRÍTICO al cargar {self.path}: {e}. Usando config vacía.")
+        return {}
+
+    def _mtime_now(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self):
+        self.reload(force=True)
+        return self
+
+    def reload(self, force=False):
+        """Relee el fichero si cambió. Devuelve las claves que cambiaron."""
+        with self._lock:
+            mtime = self._mtime_now()
+            if not force and mtime == self._mtime:
+                return set()
+            self._mtime = mtime
+            new = validate(self._read())
+            old = self.config
+            changed = {k for k in set(old) | set(new) if old.get(k) != new.get(k)}
+            if not changed and self.version > 0:
+                return set()
+            self.config = new
+            self.version += 1
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(new, changed)
+            except Exception as e:
+                print(f"Error aplicando cambios de config: {e}")
+        return changed
+
+    def save(self, config):
+        """Escribe 'config' completo (como la UI) y publica los cambios."""
+        with self._lock:
+            try:
+                yaml.SafeDumper.ignore_aliases = lambda *args: True
+                with open(self.path, "w", encoding="utf-8") as f:
+                    yaml.safe_dump(config, f, sort_keys=False, allow_unicode=True)
+            finally:
+                self.reload(force=True)
+
+    def update(self, changes):
+        """Cambia solo las claves de 'changes' sobre lo que haya en disco."""
+        with self._lock:
+            raw = self._read()
+            raw.update(changes)
+            self.save(raw)
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    # --- Hilo vigilante ---
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ConfigWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            self.reload()
+
+
+# --- Config compartida ---
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_config_store(path=CONFIG_PATH):
+    """ConfigStore compartida para 'path' (se carga y empieza a vigilar la primera vez)."""
+    key = os.path.abspath(path)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = ConfigStore(path).load()
+                store.start()
+                _stores[key] = store
+    return store
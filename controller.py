@@ -1,55 +1,78 @@
 # controller.py
-import yaml
 import time
 import threading
 import random
-import pyautogui
-import winsound
 import os # Importar os
 import re # Importar re para el fallback de map_path
-from detector import detect, load_model, RESOURCE_TEMPLATES
-from screencap import get_screenshot
+import cv2
+from detector import detect, load_model, configure_detector, REGISTRY
+from screencap import get_frame_source, CaptureThread
 from bot_collector import collect_one_by_one
 from navigator import move_to_next
-from utils import log, play_alert
-from telegram_notifier import send_telegram
+from spatial_priors import SpatialPriors
+from alert_watcher import AlertWatcher
+from change_detector import IncrementalDetector
+from arrival import ArrivalDetector
+from harvest_monitor import HarvestMonitor
+from transition_stats import TransitionStats, TUNE_MODES
+from config_store import get_config_store
+from metrics import configure_metrics
+from profiler import profiler_from_config
+import timing
+from timing import Waker, WakingEvent
+from utils import log, play_alert, play_beep, press_key, set_audio_backend
+from telegram_notifier import send_telegram, set_telegram_store
+
+# Claves de config que el bot aplica en caliente entre iteraciones; el resto
+# (hilos, modelo, vigilantes...) se crean en __init__ y necesitan reiniciar.
+# Las teclas (toggle_key, exit_key, profile_key) tampoco son en caliente: la UI
+# y run_bot.py las leen una vez al arrancar.
+HOT_CONFIG_KEYS = {
+    "map_path", "conf_thresh", "scan_delay", "post_move_wait", "randomize_delays",
+    "auto_pause_on_arena", "enable_scan_beep", "map_specific_templates", "resource_classes",
+    "template_refresh_interval", "post_move_overrides", "collect_time", "ROI",
+    "pyramid_levels", "pyramid_margin", "detect_workers", "match_method", "character_pos",
+    "profile_mode", "profile_iterations", "profile_interval", "profile_dir", "profile_max_seconds",
+    "bot_token", "chat_id", # Los lee telegram_notifier de la config compartida en cada envío
+    "test_workers", "debug_image_format", "debug_image_scale", "preview", "preview_interval", "preview_width",
+}
+# Alertas que pausan el bot (handle_alerts); boton_retos solo con auto_pause_on_arena
+PAUSE_ALERTS = {"inventario_lleno", "boton_retos"}
+PROFILE_KEYS = {"profile_mode", "profile_iterations", "profile_interval", "profile_dir", "profile_max_seconds"}
 
 class Bot:
     def __init__(self, config_path):
-        try:
-            with open(config_path, "r", encoding="utf-8") as f:
-                self.config = yaml.safe_load(f)
-            if not isinstance(self.config, dict):
-                 print(f"Error: {config_path} no es un diccionario válido. Usando config vacía.")
-                 self.config = {}
-        except FileNotFoundError:
-            print(f"Error: No se encontró {config_path}. Usando config vacía.")
-            self.config = {}
-        except Exception as e:
-            print(f"Error CRÍTICO al cargar {config_path}: {e}. Usando config vacía.")
-            self.config = {}
-
-        # Cargar configuración con valores por defecto robustos
-        defaults = {
-            "model_path": None, "map_path": [], "conf_thresh": 0.83, "scan_delay": 0.85,
-            "post_move_wait": 1.8, "randomize_delays": True, "auto_pause_on_arena": True,
-            "post_move_overrides": {}, "resource_classes": [],
-            "toggle_key": "f8", "exit_key": "esc", "bot_token": "", "chat_id": "",
-            "ROI": {"x": 0, "y": 0, "w": 1277, "h": 1076},
-            "collect_time": 3.5,
-            "enable_scan_beep": False,
-            "map_specific_templates": {} # *** AÑADIR DEFAULT ***
-        }
-        for key, value in defaults.items():
-            self.config.setdefault(key, value)
-        
-        if not isinstance(self.config.get("ROI"), dict): self.config["ROI"] = defaults["ROI"].copy()
-        if not isinstance(self.config.get("post_move_overrides"), dict): self.config["post_move_overrides"] = defaults["post_move_overrides"].copy()
-        if not isinstance(self.config.get("map_specific_templates"), dict): self.config["map_specific_templates"] = defaults["map_specific_templates"].copy() # *** ASEGURAR DICT ***
-        if not isinstance(self.config.get("map_path"), (list, str)): self.config["map_path"] = defaults["map_path"][:]
-
+        self.config_path = config_path
+        # Config compartida y validada (defaults y tipos en config_store.SCHEMA)
+        self.store = get_config_store(config_path)
+        self.config = self.store.config
+        self._pending_config = None # (config, claves) publicados por el vigilante, se aplican entre iteraciones
+        self._config_lock = threading.Lock()
+        self.store.subscribe(self._on_config_change)
+        set_telegram_store(self.store) # Credenciales de esta config (replay.py las deja vacías)
 
+        set_audio_backend(self.config.get("audio_backend"))
+        self.metrics = configure_metrics(self.config) # Spans por fase (no-op si metrics: false)
+        self.profiler = profiler_from_config(self.config) # Se activa con profile_key
         self.model = load_model(self.config.get("model_path"))
+        configure_detector(self.config)
+        self.frame_source = get_frame_source() # Sesión de captura persistente
+        # Hilo de captura opcional: solapa la captura con detección y esperas
+        # El detector trabaja en gris: capturar directamente en gris salvo que se pida color
+        self.capture_gray = str(self.config.get("capture_mode")).lower() != "color"
+        self.capture = None
+        if bool(self.config.get("capture_thread")):
+            self.capture = CaptureThread(self.frame_source, fps=float(self.config.get("capture_fps")),
+                                         gray=self.capture_gray)
+        self.last_frame_id = 0
+        # (nº, miniatura, detecciones, escala) del último escaneo para la vista previa de la UI.
+        # Solo se publica con la vista previa activa (set_preview); si no, no cuesta nada.
+        self.last_view = None
+        self._view_seq = 0
+        self.preview_width = 0 # 0 = vista previa desactivada
+        self.preview_interval = 0.5
+        self._last_view_time = 0.0
+        self.character_pos = None # Estimada por bot_collector; None = al entrar en la sala
         self.map_path = self.config.get("map_path") # bot_ui asegura que sea lista al final
         self.conf_thresh = float(self.config.get("conf_thresh"))
         self.scan_delay = float(self.config.get("scan_delay"))
@@ -69,23 +92,264 @@ class Bot:
         self.idx = 0
         self.running = False
         self.stopped = False
+        # Despierta al instante cualquier espera al pausar, detener o recibir una alerta
+        self.waker = Waker()
         self.lock = threading.Lock()
 
+        # Vigilante de alertas: busca las alertas con región fija en su propio hilo.
+        # Solo las que tienen acción (pausar) y región configurada; el resto sigue en el escaneo.
+        self.alert_event = WakingEvent(self.waker)
+        # Se crea si hay región para alguna; cuáles vigila depende de auto_pause_on_arena (en caliente).
+        self.alert_watcher = None
+        if bool(self.config.get("alert_watcher")) and PAUSE_ALERTS & set(self.config.get("alert_regions", {})):
+            self.alert_watcher = AlertWatcher(
+                self.alert_regions(self.config), conf=self.conf_thresh, interval=float(self.config.get("alert_interval")),
+                source=self.frame_source, capture=self.capture, event=self.alert_event)
+        self.watched_alerts = set(self.alert_watcher.labels) if self.alert_watcher else set()
+
         # Usar config para clases o fallback a keys de templates
         self.resource_classes = self.config.get("resource_classes")
-        if not self.resource_classes: # Fallback si no está en config
-            self.resource_classes = [
-                c for c in RESOURCE_TEMPLATES.keys()
-                if c not in self.special_templates # Usar la lista de especiales aquí
-            ]
+        self.auto_resource_classes = not self.resource_classes
+        if self.auto_resource_classes: # Fallback si no está en config
+            self.update_resource_classes()
+        # Recarga en caliente de templates (templates/ se revisa cada N segundos, no en cada frame)
+        self.template_refresh_interval = float(self.config.get("template_refresh_interval"))
+        self.last_template_refresh = timing.now()
+
+        # Priors espaciales: buscar recursos solo donde suelen aparecer en cada sala
+        self.priors = None
+        if bool(self.config.get("spatial_priors")):
+            self.priors = SpatialPriors(
+                min_observations=int(self.config.get("priors_min_observations")),
+                full_scan_every=int(self.config.get("priors_full_scan_every"))).load()
+
+        # Re-escaneos de la misma sala: solo re-matching en las baldosas que cambiaron
+        self.incremental = None
+        if bool(self.config.get("incremental_detect")):
+            self.incremental = IncrementalDetector(tile=int(self.config.get("change_tile")),
+                                                   threshold=float(self.config.get("change_threshold")))
+
+        # Llegada a la sala siguiente por estabilización de la escena (los delays pasan a ser máximos)
+        self.arrival = None
+        if bool(self.config.get("arrival_detect")):
+            self.arrival = ArrivalDetector(
+                self.frame_source, capture=self.capture, waker=self.waker,
+                change_threshold=float(self.config.get("arrival_change_threshold")),
+                stable_threshold=float(self.config.get("arrival_stable_threshold")),
+                stable_time=float(self.config.get("arrival_stable_time")),
+                min_content=float(self.config.get("arrival_min_content")))
+
+        # Fin de recolección por imagen: la estancia calculada en bot_collector pasa a ser el máximo
+        self.harvest = None
+        if bool(self.config.get("harvest_detect")):
+            self.harvest = HarvestMonitor(self.frame_source, capture=self.capture, conf=self.conf_thresh,
+                                          interval=float(self.config.get("harvest_interval")),
+                                          misses=int(self.config.get("harvest_misses")),
+                                          min_absent=float(self.config.get("harvest_min_absent")))
+
+        # Ajuste automático de post_move_overrides con los tiempos medidos (off / propose / apply)
+        self.auto_overrides = self.config.get("auto_overrides").lower()
+        if self.auto_overrides not in TUNE_MODES:
+            print(f"Advertencia: auto_overrides '{self.auto_overrides}' no válido. Usando 'off'.")
+            self.auto_overrides = "off"
+        if self.auto_overrides != "off" and self.arrival is None:
+            print("Advertencia: auto_overrides necesita arrival_detect para medir las transiciones. Desactivado.")
+            self.auto_overrides = "off"
+        self.transitions = None
+        if self.auto_overrides != "off":
+            self.transitions = TransitionStats(
+                window=int(self.config.get("auto_overrides_window")),
+                min_samples=int(self.config.get("auto_overrides_min_samples")),
+                percentile=float(self.config.get("auto_overrides_percentile")),
+                margin=float(self.config.get("auto_overrides_margin")))
         # log(f"Recursos a buscar: {self.resource_classes}") # Comentado
 
+    def alert_regions(self, config):
+        """Regiones de las alertas que ahora mismo pausan el bot."""
+        actionable = PAUSE_ALERTS if self.auto_pause_on_arena else PAUSE_ALERTS - {"boton_retos"}
+        return {k: v for k, v in config.get("alert_regions", {}).items() if k in actionable}
+
+    def _on_config_change(self, config, changed):
+        """Lo llama el vigilante de config (otro hilo): se aplica en apply_config_changes()."""
+        with self._config_lock:
+            if self._pending_config is not None:
+                changed = changed | self._pending_config[1]
+            self._pending_config = (config, changed)
+
+    def apply_config_changes(self):
+        """Aplica de golpe la última config publicada (al principio de cada iteración)."""
+        with self._config_lock:
+            pending, self._pending_config = self._pending_config, None
+        if pending is None:
+            return
+        config, changed = pending
+        self.config = config
+        self.map_path = config.get("map_path")
+        if self.map_path and self.idx >= len(self.map_path):
+            self.idx = 0
+        self.conf_thresh = float(config.get("conf_thresh"))
+        self.scan_delay = float(config.get("scan_delay"))
+        self.post_move_wait = float(config.get("post_move_wait"))
+        self.randomize = bool(config.get("randomize_delays"))
+        self.auto_pause_on_arena = bool(config.get("auto_pause_on_arena"))
+        self.enable_scan_beep = bool(config.get("enable_scan_beep"))
+        self.map_specific_templates = config.get("map_specific_templates")
+        self.template_refresh_interval = float(config.get("template_refresh_interval"))
+        self.resource_classes = config.get("resource_classes")
+        self.auto_resource_classes = not self.resource_classes
+        if self.auto_resource_classes:
+            self.update_resource_classes()
+        configure_detector(config)
+        if "auto_pause_on_arena" in changed and self.alert_watcher is not None:
+            # Sin esto boton_retos seguiría activando alertas (y cortando esperas) con la opción apagada
+            self.alert_watcher.set_regions(self.alert_regions(config))
+            self.watched_alerts = set(self.alert_watcher.labels)
+        if changed & PROFILE_KEYS:
+            if self.profiler.active or self.profiler.pending:
+                log("Advertencia: hay un perfilado en curso; la nueva config de perfilado se aplicará al reiniciar.")
+            else:
+                self.profiler = profiler_from_config(config)
+        if "ROI" in changed and self.incremental is not None:
+            self.incremental.reset() # Otro recorte de pantalla: los frames no son comparables
+
+        log(f"Config recargada. Cambios: {sorted(changed)}")
+        restart = sorted(changed - HOT_CONFIG_KEYS)
+        if restart:
+            log(f"Advertencia: estos cambios se aplicarán al reiniciar el bot: {restart}")
+
+    def update_resource_classes(self):
+        """Recursos = todos los templates menos los especiales (si no vienen en config)."""
+        self.resource_classes = [
+            c for c in REGISTRY.templates
+            if c not in self.special_templates # Usar la lista de especiales aquí
+        ]
+
+    def refresh_templates(self):
+        """Sincroniza el registro de templates con la carpeta (altas/bajas en caliente)."""
+        self.last_template_refresh = timing.now()
+        added, removed = REGISTRY.refresh()
+        if added or removed:
+            log(f"Templates actualizados. Nuevos: {added} Eliminados: {removed}")
+            if self.auto_resource_classes:
+                self.update_resource_classes()
+
+    def detect_in(self, key, img, classes, search_regions=None):
+        """detect() normal o incremental (si está activo) para este frame."""
+        if self.incremental is not None:
+            return self.incremental.detect(key, self.model, self.conf_thresh, classes, search_regions)
+        return detect(self.model, img, conf=self.conf_thresh, classes=classes, search_regions=search_regions)
+
+    def tune_overrides(self):
+        """Propone o aplica (según auto_overrides) los overrides calculados en la última vuelta."""
+        overrides = self.config.get("post_move_overrides", {})
+        proposed = self.transitions.proposals(self.post_move_wait, overrides)
+        if not proposed:
+            return
+        changes = ", ".join(f"{k}: {overrides.get(k, '-')} -> {v}" for k, v in sorted(proposed.items(), key=lambda kv: int(kv[0])))
+        if self.auto_overrides == "propose":
+            log(f"Overrides propuestos (auto_overrides: propose): {changes}")
+            return
+        new_overrides = dict(overrides)
+        new_overrides.update(proposed)
+        try:
+            # Se publica como cualquier otro cambio: el bot lo aplica en la siguiente iteración
+            self.store.update({"post_move_overrides": {str(k): float(v) for k, v in new_overrides.items()}})
+            log(f"Overrides ajustados y guardados: {changes}")
+        except Exception as e:
+            log(f"Error guardando post_move_overrides: {e}")
+
+    def wait_arrival(self, exit_index, walk_delay):
+        """
+        Espera post-move con detección de llegada y, con auto_overrides, guarda
+        el tiempo de la transición de 'exit_index'. Solo si move_to_next llegó
+        a hacer click (arrival.started): si se abortó antes, el detector no
+        tiene nada de esta salida que esperar ni medir.
+        """
+        if not self.arrival.started:
+            return
+        # Misma transición que en move_to_next: si ya se llegó vuelve al instante
+        if not self.arrival.wait(walk_delay, self.interrupted) and self.interrupted():
+            return
+        if self.transitions is not None:
+            # Llegada detectada o espera agotada (cota total alcanzada)
+            elapsed = self.arrival.elapsed if self.arrival.arrived else self.arrival.waited()
+            self.transitions.record(exit_index, elapsed, timed_out=not self.arrival.arrived)
+
+    def set_preview(self, width, interval=0.5):
+        """La UI activa (width > 0) o desactiva (0) la publicación de last_view."""
+        self.preview_interval = max(0.0, float(interval))
+        self.preview_width = max(0, int(width))
+        if not self.preview_width:
+            self.last_view = None
+
+    def publish_view(self, img, dets):
+        """
+        Publica una miniatura PROPIA del frame (el frame gris es el buffer del hilo
+        de captura, que la siguiente captura sobrescribe) junto con las detecciones
+        de ese mismo escaneo. Como mucho una vez cada preview_interval s.
+        """
+        now = time.perf_counter()
+        if now - self._last_view_time < self.preview_interval:
+            return
+        self._last_view_time = now
+        scale = min(1.0, self.preview_width / img.shape[1])
+        if scale < 1.0:
+            thumb = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            thumb = img.copy()
+        self._view_seq += 1
+        self.last_view = (self._view_seq, thumb, list(dets), scale) # Una sola asignación: la UI nunca ve mezclas
+
+    def interrupted(self):
+        """True si hay que cortar cualquier espera: bot pausado/detenido o alerta pendiente."""
+        return not self.running or self.alert_event.is_set()
+
+    def sleep(self, seconds):
+        """Espera 'seconds' o hasta que interrupted(). Devuelve True si no se interrumpió."""
+        return self.waker.sleep(seconds, self.interrupted)
+
+    def log_metrics(self):
+        """Resumen de las métricas acumuladas: nº de spans y media por fase."""
+        summary = self.metrics.summary()
+        if not summary:
+            return
+        parts = [f"{name} {n}x{avg * 1000:.0f}ms" for name, (n, avg) in sorted(summary.items(), key=lambda kv: -kv[1][0] * kv[1][1])]
+        log("Métricas (media por span): " + " | ".join(parts))
+
+    def handle_alerts(self, labels, log_prefix=""):
+        """
+        Ejecuta la acción de las alertas detectadas (por el escaneo o por el
+        vigilante). Devuelve True si el bot se ha pausado.
+        """
+        if "boton_retos" in labels and self.auto_pause_on_arena:
+            log(f"{log_prefix}Detectado boton_retos (arena). Pausando...")
+            play_alert("boton_retos")
+            send_telegram("⚠️ Bot ha detectado <b>BOTÓN RETOS (Arena)</b> y se ha pausado.")
+            with self.lock: self.running = False
+            return True
+
+        if "inventario_lleno" in labels:
+            log(f"{log_prefix}Inventario lleno detectado. Pausando...")
+            play_alert("inventario_lleno")
+            press_key('h')
+            send_telegram("📦 Inventario lleno detectado. Bot pausado automáticamente.")
+            with self.lock: self.running = False
+            return True
+
+        # (Puedes añadir aquí la detección de "subida_oficio" si necesitas que haga algo)
+        return False
+
     def toggle_running(self):
         with self.lock:
             self.running = not self.running
             state = "EJECUTANDO" if self.running else "PAUSADO"
             log(f"===== ESTADO CAMBIADO A: {state} =====")
             send_telegram(f"🤖 Bot ahora está en estado: {state}")
+        self.waker.notify()
+
+    def request_profile(self):
+        """Hotkey profile_key: perfila las próximas profile_iterations iteraciones del bucle."""
+        return self.profiler.request()
 
     def stop(self):
         with self.lock:
@@ -93,30 +357,62 @@ class Bot:
             self.running = False
             log("===== DETENIENDO BOT (stop signal) =====")
             send_telegram("🛑 Bot detenido manualmente.")
+        self.waker.notify()
+
+    def next_frame(self, timeout=1.0):
+        """
+        Devuelve un frame para detectar. Con el hilo de captura activo toma
+        el primer frame más nuevo que el último procesado (sin capturar aquí);
+        si no, captura de forma síncrona.
+        """
+        if self.capture is None:
+            return self.frame_source.grab(gray=self.capture_gray)
+        self.capture.start() # No-op si ya está capturando
+        frame_id, _, img = self.capture.wait_newer(self.last_frame_id, timeout=timeout)
+        if img is not None:
+            self.last_frame_id = frame_id
+        return img
 
     def run_loop(self):
         log(">>> Bucle principal del Bot INICIADO en segundo plano <<<")
-        scan_start_time = None
+        metrics = self.metrics
+        lap_start = time.perf_counter()
 
         while not self.stopped:
+            self.apply_config_changes()
             log_prefix = f"[Sala Idx:{self.idx}] "
 
-            # ... (Medición de tiempo comentada) ...
-
             if not self.running:
-                time.sleep(0.2)
+                if self.capture is not None: self.capture.pause()
+                if self.alert_watcher is not None: self.alert_watcher.pause()
+                # Bloquea sin despertares hasta Play o Stop
+                self.waker.wait_for(lambda: self.running or self.stopped)
                 continue
 
-            time.sleep(0.05) 
+            if self.profiler.pending or self.profiler.active:
+                self.profiler.tick()
+
+            if self.alert_watcher is not None:
+                self.alert_watcher.start() # No-op si ya está vigilando
+                if self.alert_event.is_set():
+                    with metrics.span("alerts"):
+                        paused = self.handle_alerts(self.alert_watcher.pop_pending(), log_prefix)
+                    if paused:
+                        continue
+
+            if not self.sleep(0.05): continue
+
+            if self.template_refresh_interval > 0 and timing.now() - self.last_template_refresh >= self.template_refresh_interval:
+                self.refresh_templates()
 
             if self.enable_scan_beep:
-                try: winsound.Beep(1000, 100)
-                except Exception: pass
+                play_beep(1000, 100)
 
-            img = get_screenshot()
+            with metrics.span("capture"):
+                img = self.next_frame()
             if img is None:
                  log(f"{log_prefix}Error: Captura fallida. Reintentando...")
-                 time.sleep(1)
+                 self.sleep(1)
                  continue
 
             # *** LÓGICA PARA DECIDIR QUÉ DETECTAR ***
@@ -126,46 +422,52 @@ class Bot:
             templates_to_scan_now = []
             if specific_templates is None:
                 # Caso 1: No hay entrada para este índice. Buscar TODO.
-                templates_to_scan_now = list(RESOURCE_TEMPLATES.keys())
+                templates_to_scan_now = list(REGISTRY.templates)
                 # log(f"{log_prefix}Buscando todos los {len(templates_to_scan_now)} templates.")
             else:
                 # Caso 2: Hay entrada (incluso si está vacía).
                 # Buscar solo los templates específicos + los especiales.
                 templates_to_scan_now = specific_templates + self.special_templates
                 # log(f"{log_prefix}Buscando {len(templates_to_scan_now)} templates específicos/especiales.")
+            if self.watched_alerts:
+                # Las alertas con región fija las vigila su propio hilo
+                templates_to_scan_now = [c for c in templates_to_scan_now if c not in self.watched_alerts]
             # ****************************************
 
             # Detección (pasando la lista filtrada)
-            dets = detect(self.model, img, conf=self.conf_thresh, classes=templates_to_scan_now)
-
-            # --- Lógica de pausa (sin cambios) ---
-            boton = [d for d in dets if d["label"] == "boton_retos"]
-            if boton and self.auto_pause_on_arena:
-                log(f"{log_prefix}Detectado boton_retos (arena). Pausando...")
-                play_alert("boton_retos")
-                send_telegram("⚠️ Bot ha detectado <b>BOTÓN RETOS (Arena)</b> y se ha pausado.")
-                with self.lock: self.running = False
-                continue
+            room_key = SpatialPriors.room_key(self.idx, self.map_path)
+            with metrics.span("detect"):
+                if self.incremental is not None:
+                    self.incremental.new_frame(img)
+                if self.priors is None:
+                    dets = self.detect_in("all", img, templates_to_scan_now)
+                else:
+                    # Recursos solo en las zonas aprendidas de la sala; alertas en todo el frame
+                    special_now = [c for c in templates_to_scan_now if c in self.special_templates]
+                    resources_now = [c for c in templates_to_scan_now if c not in self.special_templates]
+                    regions = self.priors.regions(room_key, img.shape)
+                    dets = self.detect_in("alerts", img, special_now)
+                    dets += self.detect_in("resources", img, resources_now, search_regions=regions)
+            if self.preview_width > 0:
+                self.publish_view(img, dets)
 
-            inv_full = [d for d in dets if d["label"] == "inventario_lleno"]
-            if inv_full:
-                log(f"{log_prefix}Inventario lleno detectado. Pausando...")
-                play_alert("inventario_lleno")
-                pyautogui.press('h')
-                send_telegram("📦 Inventario lleno detectado. Bot pausado automáticamente.")
-                with self.lock: self.running = False
+            # --- Lógica de pausa ---
+            with metrics.span("alerts"):
+                paused = self.handle_alerts({d["label"] for d in dets}, log_prefix)
+            if paused:
                 continue
-            
-            # (Puedes añadir aquí la detección de "subida_oficio" si necesitas que haga algo)
 
             # --- FASE 1: Recolectar recursos ---
             # Filtrar 'dets' para que solo contenga los recursos reales (no los especiales)
             # self.resource_classes ya excluye los especiales
             resources_detected = [d for d in dets if d["label"] in self.resource_classes]
+            if self.priors is not None:
+                self.priors.record(room_key, resources_detected, img.shape)
 
             if resources_detected:
                 # log(f"{log_prefix}Recursos detectados: {[d['label'] for d in resources_detected]}. Recolectando...")
-                collect_one_by_one(self, resources_detected, self.config)
+                with metrics.span("collect"):
+                    collect_one_by_one(self, resources_detected, self.config)
                 # log(f"{log_prefix}Recolección finalizada.")
                 continue
 
@@ -192,14 +494,25 @@ class Bot:
             # log(f"{log_prefix}Haciendo clic en salida índice {current_exit_index}...")
 
             try:
-                self.idx = move_to_next(self, current_map_path, self.idx, self.config)
-                # scan_start_time = time.perf_counter() # Comentado
+                with metrics.span("move"):
+                    self.idx = move_to_next(self, current_map_path, self.idx, self.config)
+                self.character_pos = None
+                if self.incremental is not None:
+                    self.incremental.reset() # Sala nueva: no hay nada que reutilizar
+                if self.idx == 0 and self.priors is not None:
+                    self.priors.save() # Una vez por vuelta
+                if self.idx == 0 and self.transitions is not None:
+                    self.tune_overrides()
+                if self.idx == 0 and metrics.enabled:
+                    metrics.observe("lap", time.perf_counter() - lap_start)
+                    lap_start = time.perf_counter()
+                    self.log_metrics()
             except IndexError:
                  log(f"{log_prefix}Error Crítico: Índice {current_exit_index} fuera de rango. Reiniciando índice a 0.")
-                 self.idx = 0; scan_start_time = None; continue
+                 self.idx = 0; continue
             except Exception as e:
                  log(f"{log_prefix}Error en move_to_next: {e}. Pausando.");
-                 with self.lock: self.running = False; scan_start_time = None; continue
+                 with self.lock: self.running = False; continue
 
             # --- Delay post-move ---
             overrides = self.config.get("post_move_overrides", {})
@@ -217,13 +530,16 @@ class Bot:
                  walk_delay = 0.1
 
             # log(f"{log_prefix}Esperando {walk_delay:.2f}s post-movimiento...")
-            wait_start_perf = time.perf_counter()
-            total_waited = 0.0; interval = 0.1
-            while total_waited < walk_delay:
-                if not self.running: 
-                    scan_start_time = None; break
-                time.sleep(interval); total_waited += interval
-            # if self.running: log(f"{log_prefix}Espera completada en {time.perf_counter() - wait_start_perf:.3f}s.")
+            with metrics.span("post_move_wait", exit=current_exit_index):
+                if self.arrival is not None:
+                    self.wait_arrival(current_exit_index, walk_delay)
+                else:
+                    self.sleep(walk_delay)
 
+        self.metrics.stop() # Último volcado
+        self.profiler.finish() # Perfil a medias si se detiene antes de N iteraciones
+        if self.capture is not None: self.capture.stop()
+        if self.alert_watcher is not None: self.alert_watcher.stop()
+        if self.priors is not None: self.priors.save()
         log(">>> Bucle principal del Bot DETENIDO <<<")
         send_telegram("✅ Bucle principal terminado.")
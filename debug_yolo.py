@@ -1,5 +1,5 @@
 import cv2
-from screencap import get_screenshot
+from screencap import get_frame_source
 from detector import load_model, detect
 
 MODEL_PATH = "../models/best.pt"
@@ -7,7 +7,7 @@ MODEL_PATH = "../models/best.pt"
 
 def main():
     model = load_model(MODEL_PATH)
-    img = get_screenshot()
+    img = get_frame_source().grab()
     
     # detecta TODO (sin filtrar clases)
     detections = detect(model, img, conf=0.3, classes=None)  # baja la conf si quieres
@@ -2,31 +2,325 @@
 import cv2
 import numpy as np
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from template_registry import get_registry
+from metrics import get_metrics
+from peaks import find_peaks, make_detection as _make_detection
+from peaks import nms as _nms, extract_detections as _extract_detections
 
 # --- Templates ---
-RESOURCE_TEMPLATES = {}
-# Asumiendo que TEMPLATE_DIR está en la carpeta raíz, un nivel arriba de 'src'
-# Si detector.py está en 'src', necesitamos subir un nivel
-base_dir = os.path.dirname(os.path.dirname(__file__)) # Carpeta raíz (bot-recolector)
-TEMPLATE_DIR = os.path.join(base_dir, "templates")
-
-# Cargar todos los templates
-if os.path.isdir(TEMPLATE_DIR):
-    for f in os.listdir(TEMPLATE_DIR):
-        if f.lower().endswith((".png", ".jpg", ".jpeg")):
-            name = os.path.splitext(f)[0] # nombre sin extensión
+# Se decodifican una sola vez en el registro compartido (con caché en disco).
+# REGISTRY.templates se sustituye entero en cada alta/baja: leerlo cada vez.
+REGISTRY = get_registry()
+TEMPLATE_DIR = REGISTRY.template_dir
+
+
+# --- Opciones del detector (se pueden sobreescribir desde config.yaml) ---
+DETECT_OPTIONS = {
+    "pyramid_levels": 0,     # 0 = matching a resolución completa
+    "pyramid_margin": 0.15,  # Cuánto se relaja el umbral en el nivel grueso
+    "pyramid_min_size": 8,   # Lado mínimo del template reducido; si no, resolución completa
+    "nms_distance": 20,      # Centros más cerca que esto (px) se consideran el mismo objeto
+    "nms_iou": 0.5,          # O si las cajas se solapan más que esto (IoU)
+    "detect_workers": 0,     # Hilos para matchTemplate (0 = nº de CPUs, 1 = secuencial)
+    "detect_tile_min_rows": 160, # Alto mínimo de cada franja al repartir un template en varias
+    "match_method": "opencv", # "opencv" (cv2.matchTemplate) o "fft" (espectro del frame compartido)
+}
+
+def configure_detector(config):
+    """Actualiza DETECT_OPTIONS con las claves presentes en config (dict)."""
+    if not isinstance(config, dict):
+        return
+    for key, default in DETECT_OPTIONS.items():
+        if config.get(key) is not None:
+            try: DETECT_OPTIONS[key] = type(default)(config[key])
+            except (ValueError, TypeError):
+                print(f"Advertencia: valor inválido para {key} en config: {config[key]!r}")
+
+
+# --- Pool de hilos (cv2.matchTemplate libera el GIL) ---
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+def _worker_count():
+    n = DETECT_OPTIONS["detect_workers"]
+    return n if n > 0 else (os.cpu_count() or 1)
+
+def _get_executor():
+    """Pool compartido, recreado si cambia detect_workers. None si es secuencial."""
+    global _executor, _executor_workers
+    workers = _worker_count()
+    if workers <= 1:
+        return None
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="detect")
+            _executor_workers = workers
+        return _executor
+
+
+# --- Pirámides (coarse-to-fine) ---
+_template_pyramids = {} # id(template) -> (template, [nivel1, nivel2, ...])
+
+def build_pyramid(img, levels):
+    """Devuelve [img, pyrDown(img), ...] con 'levels' niveles reducidos."""
+    pyr = [img]
+    for _ in range(levels):
+        pyr.append(cv2.pyrDown(pyr[-1]))
+    return pyr
+
+def _template_level(tpl_gray, level):
+    """Template reducido al nivel pedido (se cachea por template)."""
+    if level == 0:
+        return tpl_gray
+    # Los templates del registro ya traen la pirámide precalculada
+    reg_entry = REGISTRY.entry_for(tpl_gray)
+    if reg_entry is not None and len(reg_entry.pyramid) >= level:
+        return reg_entry.pyramid[level - 1]
+    entry = _template_pyramids.get(id(tpl_gray))
+    if entry is None or entry[0] is not tpl_gray or len(entry[1]) < level:
+        entry = (tpl_gray, build_pyramid(tpl_gray, level)[1:])
+        _template_pyramids[id(tpl_gray)] = entry
+    return entry[1][level - 1]
+
+def _match_pyramid(img_pyr, tpl_gray, conf, levels):
+    """
+    Matching coarse-to-fine. Busca candidatos con el template reducido sobre
+    el frame reducido (umbral relajado por pyramid_margin) y solo confirma esos
+    candidatos a resolución completa en ventanas pequeñas.
+
+    Devuelve un mapa de resultados del mismo tamaño que el de
+    cv2.matchTemplate a resolución completa: las zonas confirmadas tienen el
+    valor exacto y el resto -1. Así el post-proceso es idéntico al del modo
+    normal y las puntuaciones coinciden con él (salvo redondeo de OpenCV).
+    Devuelve None si este template no se puede reducir tanto; en ese caso
+    hay que hacer el matching normal.
+    """
+    img_gray = img_pyr[0]
+    h, w = tpl_gray.shape[:2]
+    H, W = img_gray.shape[:2]
+    # Bajar niveles hasta que el template reducido siga siendo útil
+    level = levels
+    while level > 0 and min(h, w) >> level < DETECT_OPTIONS["pyramid_min_size"]:
+        level -= 1
+    if level == 0:
+        return None
+
+    tpl_small = _template_level(tpl_gray, level)
+    img_small = img_pyr[level]
+    if tpl_small.shape[0] > img_small.shape[0] or tpl_small.shape[1] > img_small.shape[1]:
+        return None
+    res_small = cv2.matchTemplate(img_small, tpl_small, cv2.TM_CCOEFF_NORMED)
+    mask = (res_small >= conf - DETECT_OPTIONS["pyramid_margin"]).astype(np.uint8)
+
+    res_h, res_w = H - h + 1, W - w + 1
+    res = np.full((res_h, res_w), -1.0, dtype=np.float32)
+    if not mask.any():
+        return res
+    # Demasiados candidatos: la pirámide no ahorra nada, ir a resolución completa
+    if mask.mean() > 0.25:
+        return cv2.matchTemplate(img_gray, tpl_gray, cv2.TM_CCOEFF_NORMED)
+
+    scale = 1 << level
+    pad = scale # Error de posición del nivel grueso (en píxeles de resolución completa)
+    n, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    for x, y, bw, bh, _area in stats[1:]:
+        # Rango de posiciones (esquina sup. izq.) a confirmar en resolución completa
+        rx0 = max(0, x * scale - pad); ry0 = max(0, y * scale - pad)
+        rx1 = min(res_w - 1, (x + bw - 1) * scale + pad); ry1 = min(res_h - 1, (y + bh - 1) * scale + pad)
+        if rx1 < rx0 or ry1 < ry0:
+            continue
+        window = img_gray[ry0:ry1 + h, rx0:rx1 + w]
+        res[ry0:ry1 + 1, rx0:rx1 + 1] = cv2.matchTemplate(window, tpl_gray, cv2.TM_CCOEFF_NORMED)
+    return res
+
+
+# --- Extracción de picos y NMS (en peaks.py; aquí con los umbrales de DETECT_OPTIONS) ---
+def nms(boxes, scores, min_distance=None, iou_thresh=None):
+    """peaks.nms con nms_distance / nms_iou de DETECT_OPTIONS por defecto."""
+    if min_distance is None: min_distance = DETECT_OPTIONS["nms_distance"]
+    if iou_thresh is None: iou_thresh = DETECT_OPTIONS["nms_iou"]
+    return _nms(boxes, scores, min_distance, iou_thresh)
+
+def extract_detections(res, conf, w, h, label):
+    """peaks.extract_detections con los umbrales de NMS de DETECT_OPTIONS."""
+    return _extract_detections(res, conf, w, h, label, DETECT_OPTIONS["nms_distance"], DETECT_OPTIONS["nms_iou"])
+
+
+# --- Matching por FFT con espectro compartido ---
+_template_spectra = {} # id(template) -> (template, tamaño DFT, espectro, 1/||T - media||)
+
+def _template_spectrum(tpl_gray, dft_size):
+    """Espectro del template centrado en su media, rellenado a dft_size (se cachea)."""
+    entry = _template_spectra.get(id(tpl_gray))
+    if entry is None or entry[0] is not tpl_gray or entry[1] != dft_size:
+        h, w = tpl_gray.shape[:2]
+        tpl = tpl_gray.astype(np.float32)
+        tpl -= tpl.mean()
+        norm = float(np.sqrt(np.square(tpl, dtype=np.float64).sum()))
+        padded = np.zeros(dft_size, dtype=np.float32)
+        padded[:h, :w] = tpl
+        entry = (tpl_gray, dft_size, cv2.dft(padded), 1.0 / norm if norm > 0 else 0.0)
+        _template_spectra[id(tpl_gray)] = entry
+    return entry[2], entry[3]
+
+class FrameSpectrum:
+    """
+    Datos del frame que comparten todos los templates en un mismo detect():
+    su DFT y sus imágenes integrales. Con ellos cada template solo cuesta un
+    producto de espectros y una DFT inversa, en vez de un matchTemplate
+    completo que recalcula las estadísticas del frame cada vez.
+
+    match() devuelve el mismo mapa que cv2.matchTemplate(..., TM_CCOEFF_NORMED)
+    (diferencias del orden de 1e-4 por trabajar en float32), con 0 en las
+    ventanas sin varianza como hace OpenCV.
+    """
+
+    def __init__(self, img_gray):
+        self.shape = img_gray.shape[:2]
+        H, W = self.shape
+        # Con tamaño >= H x W la correlación circular no contamina las
+        # posiciones válidas, así que un único espectro sirve para cualquier template.
+        self.dft_size = (cv2.getOptimalDFTSize(H), cv2.getOptimalDFTSize(W))
+        padded = np.zeros(self.dft_size, dtype=np.float32)
+        padded[:H, :W] = img_gray
+        self.spectrum = cv2.dft(padded)
+        self.sum, self.sqsum = cv2.integral2(img_gray, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        self._inv_std = {} # (h, w) -> 1 / sqrt(n * varianza de la ventana)
+
+    def _window_inv_std(self, h, w):
+        """1/sqrt(sum(I^2) - sum(I)^2/n) por ventana; se calcula una vez por tamaño."""
+        key = (h, w)
+        inv = self._inv_std.get(key)
+        if inv is None:
+            # Si dos hilos llegan a la vez con el mismo tamaño se calcula dos veces; no pasa nada
+            S, S2 = self.sum, self.sqsum
+            # Sumas por ventana en float64 (la resta de integrales es la parte delicada)
+            s = cv2.subtract(cv2.add(S[h:, w:], S[:-h, :-w]), cv2.add(S[:-h, w:], S[h:, :-w]))
+            s2 = cv2.subtract(cv2.add(S2[h:, w:], S2[:-h, :-w]), cv2.add(S2[:-h, w:], S2[h:, :-w]))
+            var_n = cv2.subtract(s2, cv2.multiply(s, s, scale=1.0 / (h * w))).astype(np.float32)
+            # Ventanas planas (o ruido numérico) -> 0, igual que OpenCV
+            min_var = 1e-3 * h * w
+            flat = var_n <= min_var
+            np.maximum(var_n, min_var, out=var_n)
+            inv = cv2.pow(var_n, -0.5)
+            inv[flat] = 0.0
+            self._inv_std[key] = inv
+        return inv
+
+    def match(self, tpl_gray):
+        h, w = tpl_gray.shape[:2]
+        H, W = self.shape
+        spectrum, inv_norm = _template_spectrum(tpl_gray, self.dft_size)
+        prod = cv2.mulSpectrums(self.spectrum, spectrum, 0, conjB=True)
+        corr = cv2.idft(prod, flags=cv2.DFT_REAL_OUTPUT | cv2.DFT_SCALE)
+        res = corr[:H - h + 1, :W - w + 1] * self._window_inv_std(h, w)
+        res *= inv_norm
+        np.clip(res, -1.0, 1.0, out=res)
+        return res
+
+
+# --- Motor de matching ---
+def _match_full_band(img_gray, tpl_gray, res, r0, r1):
+    """Rellena las filas [r0, r1) del mapa de resultados de un template."""
+    h = tpl_gray.shape[0]
+    res[r0:r1] = cv2.matchTemplate(img_gray[r0:r1 + h - 1], tpl_gray, cv2.TM_CCOEFF_NORMED)
+
+class _Immediate:
+    """Resultado ya calculado con la misma interfaz que un Future (modo secuencial)."""
+    def __init__(self, value): self._value = value
+    def result(self): return self._value
+
+def _run_match_tasks(img_gray, img_pyr, templates, conf, pyramid_levels):
+    """
+    Calcula el mapa de matchTemplate de cada template de 'templates'
+    (lista de (cls_name, tpl_gray)) repartiendo el trabajo en el pool.
+
+    Si hay más hilos que templates, los templates a resolución completa se
+    parten en franjas horizontales solapadas (tpl_h - 1 filas de solape) para
+    que cada posición del resultado la calcule exactamente una franja: el
+    resultado es el de un único matchTemplate (salvo redondeo en float32).
+    Devuelve una lista de mapas (o None si falló) en el mismo orden.
+    """
+    H, W = img_gray.shape[:2]
+    executor = _get_executor()
+    workers = _worker_count() if executor is not None else 1
+
+    metrics = get_metrics()
+
+    def run(i, func, args):
+        try:
+            with metrics.span("detect_template", template=templates[i][0]):
+                return func(*args)
+        except cv2.error as e:
+            print(f"Error en matchTemplate para {templates[i][0]}: {e}. ¿Template/Imagen inválidos?")
+        except Exception as e:
+            print(f"Error inesperado procesando template {templates[i][0]}: {e}")
+        return False
+
+    def submit(i, func, *args):
+        nonlocal executor
+        while executor is not None:
             try:
-                # Leer directamente en escala de grises es más eficiente
-                img_gray = cv2.imread(os.path.join(TEMPLATE_DIR, f), cv2.IMREAD_GRAYSCALE)
-                if img_gray is not None:
-                    # Guardamos la versión en escala de grises directamente
-                    RESOURCE_TEMPLATES.setdefault(name, []).append(img_gray)
-                else:
-                    print(f"Advertencia: No se pudo cargar template {f}")
-            except Exception as e:
-                print(f"Error cargando template {f}: {e}")
-else:
-    print(f"Advertencia: Directorio de templates '{TEMPLATE_DIR}' no encontrado.")
+                return executor.submit(run, i, func, args)
+            except RuntimeError:
+                # Otro hilo cambió detect_workers y cerró este pool: seguir en el nuevo
+                fresh = _get_executor()
+                executor = fresh if fresh is not executor else None
+        return _Immediate(run(i, func, args))
+
+    results = [False] * len(templates)
+    full_res = [] # Índices que van a resolución completa
+    pyr_futures = []
+    for i, (cls_name, tpl_gray) in enumerate(templates):
+        h, w = tpl_gray.shape[:2]
+        if h > H or w > W:
+            print(f"Advertencia: template de {cls_name} ({w}x{h}) mayor que la imagen. Se omite.")
+        elif img_pyr is not None:
+            pyr_futures.append((i, submit(i, _match_pyramid, img_pyr, tpl_gray, conf, pyramid_levels)))
+        else:
+            full_res.append(i)
+    for i, fut in pyr_futures:
+        results[i] = fut.result()
+        if results[i] is None: # Este template no se puede reducir: resolución completa
+            full_res.append(i)
+    full_res.sort()
+
+    if full_res and DETECT_OPTIONS["match_method"] == "fft":
+        # Un espectro del frame para todos los templates; sin franjas
+        spectrum = FrameSpectrum(img_gray)
+        futures = [(i, submit(i, spectrum.match, templates[i][1])) for i in full_res]
+        for i, fut in futures:
+            results[i] = fut.result()
+        return [r if r is not False else None for r in results]
+
+    # Resolución completa, partiendo en franjas si sobran hilos
+    bands_per_tpl = max(1, workers // max(1, len(full_res)))
+    band_futures = []
+    for i in full_res:
+        tpl_gray = templates[i][1]
+        h, w = tpl_gray.shape[:2]
+        res_h = H - h + 1
+        n_bands = max(1, min(bands_per_tpl, res_h // max(1, DETECT_OPTIONS["detect_tile_min_rows"])))
+        if n_bands == 1:
+            band_futures.append((i, None, submit(i, cv2.matchTemplate, img_gray, tpl_gray, cv2.TM_CCOEFF_NORMED)))
+            continue
+        res = np.empty((res_h, W - w + 1), dtype=np.float32)
+        edges = np.linspace(0, res_h, n_bands + 1).astype(int)
+        for r0, r1 in zip(edges[:-1], edges[1:]):
+            band_futures.append((i, res, submit(i, _match_full_band, img_gray, tpl_gray, res, r0, r1)))
+        results[i] = res
+
+    # Esperar en orden de envío: la fusión es determinista
+    for i, res, fut in band_futures:
+        value = fut.result()
+        if res is None or value is False:
+            results[i] = value
+    return [r if r is not False else None for r in results]
 
 
 # --- Función de compatibilidad ---
@@ -38,7 +332,56 @@ def load_model(path):
     return None
 
 # --- Detect ---
-def detect(model, img, conf=0.88, classes=None):
+def to_gray(img):
+    """Convierte la imagen de entrada a escala de grises (None si falla)."""
+    try:
+        # Si ya es gris, no hacer nada. Si tiene 4 canales (BGRA), convertir a BGR primero.
+        if len(img.shape) == 3 and img.shape[2] == 4:
+            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+        # Convertir a escala de grises si tiene 3 canales (BGR)
+        if len(img.shape) == 3:
+            return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return img # Asumir que ya es gris si no tiene 3 canales
+    except cv2.error as e:
+        print(f"Error convirtiendo imagen a escala de grises: {e}")
+        return None
+
+def merge_detections(detections, classes):
+    """
+    Junta detecciones de varias pasadas con el mismo NMS y orden que detect()
+    (clase en el orden de 'classes', luego de arriba a abajo).
+    """
+    if not detections:
+        return []
+    order = {c: i for i, c in enumerate(classes)}
+    boxes = np.array([d["bbox"] for d in detections], dtype=np.float32)
+    scores = np.array([d["conf"] for d in detections], dtype=np.float32)
+    keep = nms(boxes, scores)
+    keep = sorted(keep, key=lambda i: (order.get(detections[i]["label"], len(order)), boxes[i][1], boxes[i][0]))
+    return [detections[i] for i in keep]
+
+def _crop_regions(img_gray, regions, min_h, min_w):
+    """
+    Convierte regiones (x1, y1, x2, y2) en recortes (ox, oy, recorte) del
+    frame. Cada región se agranda si hace falta para que quepa el template
+    más grande y se recorta a los límites de la imagen.
+    """
+    H, W = img_gray.shape[:2]
+    crops = []
+    for x1, y1, x2, y2 in regions:
+        x1, y1 = max(0, int(x1)), max(0, int(y1))
+        x2, y2 = min(W, int(x2)), min(H, int(y2))
+        if x2 - x1 < min_w:
+            cx = (x1 + x2) // 2
+            x1 = max(0, min(W - min_w, cx - min_w // 2)); x2 = min(W, x1 + min_w)
+        if y2 - y1 < min_h:
+            cy = (y1 + y2) // 2
+            y1 = max(0, min(H - min_h, cy - min_h // 2)); y2 = min(H, y1 + min_h)
+        if x2 > x1 and y2 > y1:
+            crops.append((x1, y1, img_gray[y1:y2, x1:x2]))
+    return crops
+
+def detect(model, img, conf=0.88, classes=None, pyramid_levels=None, search_regions=None):
     """
     Detecta objetos en la imagen usando template matching robusto en escala de grises.
 
@@ -47,6 +390,10 @@ def detect(model, img, conf=0.88, classes=None):
         img: imagen a analizar (se convertirá a escala de grises)
         conf: umbral de confianza
         classes: lista de nombres de recursos/templates a detectar
+        pyramid_levels: niveles de pirámide (None = DETECT_OPTIONS). Con 0 se
+            hace el matching a resolución completa de siempre.
+        search_regions: lista de (x1, y1, x2, y2) donde buscar; None = todo el frame.
+            Las coordenadas devueltas siguen siendo las del frame completo.
 
     Returns:
         List[dict]: cada dict tiene 'label', 'conf', 'cx', 'cy', 'bbox'
@@ -56,81 +403,70 @@ def detect(model, img, conf=0.88, classes=None):
          print("Error en detect: Imagen de entrada es None.")
          return detections
 
+    templates_by_class = REGISTRY.templates # Un solo dict para todo este detect()
     if classes is None:
-        classes = RESOURCE_TEMPLATES.keys()
+        classes = templates_by_class.keys()
 
-    # --- Convertir imagen de entrada a escala de grises ---
-    try:
-        # Si ya es gris, no hacer nada. Si tiene 4 canales (BGRA), convertir a BGR primero.
-        if len(img.shape) == 3 and img.shape[2] == 4:
-            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-        # Convertir a escala de grises si tiene 3 canales (BGR)
-        if len(img.shape) == 3:
-            img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        else:
-            img_gray = img # Asumir que ya es gris si no tiene 3 canales
-    except cv2.error as e:
-         print(f"Error convirtiendo imagen a escala de grises: {e}")
-         return detections
-    # -----------------------------------------------------
+    img_gray = to_gray(img)
+    if img_gray is None:
+        return detections
 
-    for cls_name in classes:
-        templates_gray = RESOURCE_TEMPLATES.get(cls_name) # Ya están en escala de grises
-        if not templates_gray:
-            continue
+    if pyramid_levels is None:
+        pyramid_levels = DETECT_OPTIONS["pyramid_levels"]
 
-        for tpl_gray in templates_gray: # Iterar sobre los templates en gris
-            if tpl_gray is None:
-                continue
+    # Candidatos de todos los templates; el NMS se hace al final sobre todos juntos
+    classes = list(classes)
+    cand_boxes, cand_scores, cand_labels = [], [], []
 
-            # --- Ya no se necesita convertir el template aquí ---
-            # tpl = template
-            # if len(tpl.shape) > 2 and tpl.shape[2] == 4: ...
-            # tpl_gray = cv2.cvtColor(tpl, cv2.COLOR_BGR2GRAY)
-            # --------------------------------------------------
+    templates, template_cls = [], []
+    for cls_idx, cls_name in enumerate(classes):
+        for tpl_gray in templates_by_class.get(cls_name) or []: # Ya están en escala de grises
+            if tpl_gray is not None:
+                templates.append((cls_name, tpl_gray))
+                template_cls.append(cls_idx)
 
-            try:
-                # --- Usar las imágenes en escala de grises ---
-                res = cv2.matchTemplate(img_gray, tpl_gray, cv2.TM_CCOEFF_NORMED)
-                # ------------------------------------------
-
-                loc = np.where(res >= conf)
-                # Obtener dimensiones del template en escala de grises
-                h, w = tpl_gray.shape[:2] # h, w para gris
-
-                # Usar lista para filtrar duplicados cercanos (más eficiente que set para pocos puntos)
-                seen_centers = []
-                threshold_distance_sq = 20**2 # Distancia al cuadrado (evita raíz cuadrada)
-
-                for pt in zip(*loc[::-1]): # pt es (x, y) de esquina superior izquierda
-                    cx = pt[0] + w // 2
-                    cy = pt[1] + h // 2
-
-                    # Evitar duplicados cercanos usando distancia euclidiana al cuadrado
-                    is_duplicate = False
-                    for dx, dy in seen_centers:
-                        dist_sq = (cx - dx)**2 + (cy - dy)**2
-                        if dist_sq < threshold_distance_sq:
-                            is_duplicate = True
-                            break
-                    if is_duplicate:
-                        continue
-
-                    seen_centers.append((cx, cy)) # Añadir centro a la lista de vistos
-
-                    detections.append({
-                        "label": cls_name,
-                        "conf": float(res[pt[1], pt[0]]), # Confianza en la esquina detectada
-                        "cx": cx,
-                        "cy": cy,
-                        "bbox": [pt[0], pt[1], pt[0]+w, pt[1]+h] # Bbox basado en w, h del template gris
-                    })
-            except cv2.error as e:
-                print(f"Error en matchTemplate para {cls_name}: {e}. ¿Template/Imagen inválidos?")
-                continue # Saltar al siguiente template si hay error
-            except Exception as e:
-                print(f"Error inesperado procesando template {cls_name}: {e}")
+    # Zonas a analizar: el frame completo o los recortes pedidos (con su offset)
+    if search_regions is None:
+        areas = [(0, 0, img_gray)]
+    elif not templates:
+        areas = []
+    else:
+        max_h = max(t.shape[0] for _, t in templates)
+        max_w = max(t.shape[1] for _, t in templates)
+        areas = _crop_regions(img_gray, search_regions, max_h, max_w)
+
+    for ox, oy, area in areas:
+        if area is img_gray:
+            area_idx = range(len(templates))
+        else: # En un recorte solo los templates que caben
+            area_idx = [i for i, (_, t) in enumerate(templates)
+                        if t.shape[0] <= area.shape[0] and t.shape[1] <= area.shape[1]]
+        area_templates = [templates[i] for i in area_idx]
+        area_pyr = build_pyramid(area, pyramid_levels) if pyramid_levels > 0 else None
+
+        # Matching (en paralelo si hay pool) y extracción de picos en orden fijo
+        results = _run_match_tasks(area, area_pyr, area_templates, conf, pyramid_levels)
+        for i, res in zip(area_idx, results):
+            if res is None:
                 continue
+            h, w = templates[i][1].shape[:2] # h, w para gris
+            xs, ys, scores = find_peaks(res, conf)
+            if len(xs):
+                xs = xs + ox; ys = ys + oy
+                cand_boxes.append(np.stack([xs, ys, xs + w, ys + h], axis=1))
+                cand_scores.append(scores)
+                cand_labels.extend([template_cls[i]] * len(xs))
 
+    if not cand_boxes:
+        return detections
 
+    # --- NMS entre todos los templates y clases: gana la mejor puntuación ---
+    boxes = np.concatenate(cand_boxes)
+    scores = np.concatenate(cand_scores)
+    labels = np.asarray(cand_labels)
+    keep = nms(boxes, scores)
+    # Orden determinista: por clase (orden pedido) y luego de arriba a abajo
+    keep = sorted(keep, key=lambda i: (labels[i], boxes[i][1], boxes[i][0]))
+    for i in keep:
+        detections.append(_make_detection(classes[labels[i]], scores[i], boxes[i]))
     return detections
\ No newline at end of file
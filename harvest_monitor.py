@@ -0,0 +1,98 @@
+# harvest_monitor.py
+# Vigila los recursos en los que se ha hecho clic para saber cuándo se han
+# recolectado todos, en lugar de esperar siempre la estancia calculada.
+
+import timing
+from detector import detect
+from screencap import get_frame_source
+
+
+class HarvestMonitor:
+    """
+    watch(detecciones) fija una ventana pequeña (bbox + 'margin' px) por
+    recurso. poll() busca en cada ventana su propio template, con un umbral
+    algo más bajo ('conf' - 'slack') para que un recurso tapado a medias por
+    el personaje siga contando como presente. Un recurso cuenta como
+    recolectado tras 'misses' comprobaciones seguidas sin encontrarlo Y al
+    menos 'min_absent' s sin verlo (la animación o el personaje pueden taparlo
+    un rato). Hasta done() se siguen comprobando todos: si uno reaparece,
+    vuelve a estar pendiente. done() es True cuando ya no queda ninguno.
+    """
+
+    def __init__(self, source=None, capture=None, conf=0.83, slack=0.05, margin=16,
+                 interval=0.25, misses=2, min_absent=0.75):
+        self.source = source or get_frame_source()
+        self.capture = capture
+        self.conf = max(0.0, float(conf) - float(slack))
+        self.margin = int(margin)
+        self.interval = max(0.05, float(interval))
+        self.misses = max(1, int(misses))
+        self.min_absent = max(0.0, float(min_absent))
+        self._targets = []  # [label, (x1, y1, x2, y2), fallos seguidos, sin verlo desde (None = visto)]
+        self._last_poll = 0.0
+
+    def watch(self, detections):
+        m = self.margin
+        self._targets = []
+        for d in detections:
+            x1, y1, x2, y2 = d["bbox"]
+            self._targets.append([d["label"], (max(0, x1 - m), max(0, y1 - m), x2 + m, y2 + m), 0, None])
+        self._last_poll = 0.0
+
+    def _gone(self, target, now):
+        return target[2] >= self.misses and now - target[3] >= self.min_absent
+
+    @property
+    def pending(self):
+        now = timing.now()
+        return sum(1 for t in self._targets if not self._gone(t, now))
+
+    @staticmethod
+    def _clip(box, width, height):
+        x1, y1, x2, y2 = box
+        return max(0, x1), max(0, y1), min(int(width), x2), min(int(height), y2)
+
+    def _frame(self, box):
+        """
+        Recorte en gris (coordenadas del ROI): del último frame o capturando solo
+        'box'. Las ventanas con margen pueden salirse del ROI, así que 'box' se
+        recorta antes; devuelve (img, x, y) con el origen ya recortado.
+        """
+        if self.capture is not None and self.capture.running:
+            _, _, frame = self.capture.latest(copy=False)
+            if frame is not None:
+                x1, y1, x2, y2 = self._clip(box, frame.shape[1], frame.shape[0])
+                return frame[y1:y2, x1:x2].copy(), x1, y1
+        roi = self.source.resolve_region()
+        x1, y1, x2, y2 = self._clip(box, roi["width"], roi["height"])
+        if x2 <= x1 or y2 <= y1:
+            return None, x1, y1
+        region = {"left": roi["left"] + x1, "top": roi["top"] + y1, "width": x2 - x1, "height": y2 - y1}
+        return self.source.grab(region, gray=True), x1, y1
+
+    def poll(self):
+        """Comprueba todas las ventanas (como mucho cada 'interval' s). Devuelve done()."""
+        now = timing.now()
+        if not self._targets or self.done() or now - self._last_poll < self.interval:
+            return self.done()
+        self._last_poll = now
+        # Una sola captura para todas las ventanas
+        targets = self._targets
+        box = (min(t[1][0] for t in targets), min(t[1][1] for t in targets),
+               max(t[1][2] for t in targets), max(t[1][3] for t in targets))
+        img, ox, oy = self._frame(box)
+        if img is None or img.size == 0:
+            return False
+        for target in targets:
+            label, (x1, y1, x2, y2) = target[0], target[1]
+            crop = img[y1 - oy:y2 - oy, x1 - ox:x2 - ox]
+            if crop.size > 0 and detect(None, crop, conf=self.conf, classes=[label]):
+                target[2], target[3] = 0, None # Sigue ahí (o ha reaparecido)
+            else:
+                target[2] += 1
+                if target[3] is None:
+                    target[3] = now
+        return self.done()
+
+    def done(self):
+        return bool(self._targets) and self.pending == 0
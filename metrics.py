@@ -0,0 +1,207 @@
+# metrics.py
+# Medición de las fases del bucle (captura, detección, alertas, recolección,
+# clicks, movimiento...) en histogramas, con exportación a JSONL y a texto
+# en formato Prometheus (fichero y, opcionalmente, un endpoint HTTP).
+# Desactivado (por defecto) cada span es un objeto vacío compartido.
+
+import os
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Límites de los buckets en segundos (el último, +Inf, se añade al exportar)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _NullSpan:
+    """Span que no hace nada (métricas desactivadas)."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1) # +1: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def add(self, value):
+        i = 0
+        while i < len(BUCKETS) and value > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    span(nombre, **etiquetas) mide un bloque 'with'; observe() registra una
+    duración ya medida. Cada 'interval' s un hilo vuelca los spans nuevos a
+    <dir>/metrics.jsonl y reescribe <dir>/metrics.prom; con 'port' > 0 sirve
+    ese mismo texto en http://127.0.0.1:<port>/metrics.
+    """
+
+    def __init__(self, enabled=False, directory=None, interval=10.0, port=0):
+        self.enabled = bool(enabled)
+        self.directory = directory or os.path.join(BASE_DIR, "metrics")
+        self.interval = max(1.0, float(interval))
+        self.port = int(port)
+        self._hist = {}    # (nombre, etiquetas ordenadas) -> Histogram
+        self._pending = [] # spans aún no escritos en el JSONL
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+
+    def span(self, name, **labels):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, labels)
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._hist.get(key)
+            if hist is None:
+                hist = self._hist[key] = Histogram()
+            hist.add(seconds)
+            self._pending.append({"t": round(time.time(), 3), "span": name, "s": round(seconds, 6), **labels})
+
+    # --- Exportación ---
+    def prometheus_text(self):
+        lines = ["# HELP bot_span_seconds Duración de las fases del bucle del bot.",
+                 "# TYPE bot_span_seconds histogram"]
+        with self._lock:
+            items = [(k, list(h.counts), h.sum, h.count) for k, h in sorted(self._hist.items())]
+        for (name, labels), counts, total, count in items:
+            base = [f'span="{name}"'] + [f'{k}="{str(v)}"' for k, v in labels]
+            cumulative = 0
+            for bound, n in zip(list(BUCKETS) + ["+Inf"], counts):
+                cumulative += n
+                le = ",".join(base + ['le="%s"' % bound])
+                lines.append(f"bot_span_seconds_bucket{{{le}}} {cumulative}")
+            lines.append(f'bot_span_seconds_sum{{{",".join(base)}}} {total:.6f}')
+            lines.append(f'bot_span_seconds_count{{{",".join(base)}}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """Vuelca los spans pendientes al JSONL y reescribe el .prom."""
+        if not self.enabled:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, []
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if pending:
+                with open(os.path.join(self.directory, "metrics.jsonl"), "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(p, ensure_ascii=False) + "\n" for p in pending)
+            prom_path = os.path.join(self.directory, "metrics.prom")
+            with open(prom_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(prom_path + ".tmp", prom_path)
+        except Exception as e:
+            print(f"Advertencia: no se pudieron exportar las métricas: {e}")
+
+    def summary(self):
+        """{nombre: (nº, media s)} sumando etiquetas, para el log."""
+        out = {}
+        with self._lock:
+            for (name, _), h in self._hist.items():
+                n, s = out.get(name, (0, 0.0))
+                out[name] = (n + h.count, s + h.sum)
+        return {k: (n, s / n if n else 0.0) for k, (n, s) in out.items()}
+
+    def start(self):
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="MetricsExporter", daemon=True)
+        self._thread.start()
+        if self.port > 0 and self._server is None:
+            self._start_server()
+
+    def stop(self):
+        self._stop.set()
+        self.export()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def _start_server(self):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        except OSError as e:
+            print(f"Advertencia: no se pudo abrir el puerto de métricas {self.port}: {e}")
+            return
+        threading.Thread(target=self._server.serve_forever, name="MetricsHTTP", daemon=True).start()
+
+
+# --- Métricas compartidas ---
+_metrics = Metrics()
+
+def get_metrics():
+    return _metrics
+
+def configure_metrics(config):
+    """Reemplaza las métricas compartidas según la config (metrics, metrics_dir, ...)."""
+    global _metrics
+    _metrics.stop()
+    directory = config.get("metrics_dir") or None
+    if directory and not os.path.isabs(directory):
+        directory = os.path.join(BASE_DIR, directory)
+    _metrics = Metrics(enabled=config.get("metrics"), directory=directory,
+                       interval=config.get("metrics_interval", 10.0), port=config.get("metrics_port", 0))
+    _metrics.start()
+    return _metrics
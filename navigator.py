@@ -2,7 +2,7 @@
 # Funciones para moverse entre salidas según un patrón (map_path)
 
 from utils import click_at, random_point_near, human_delay, log
-import time
+from timing import interruptible_sleep
 
 def move_to_next(bot, map_path, idx, config):
     """
@@ -12,11 +12,20 @@ def move_to_next(bot, map_path, idx, config):
     Respeta pausa del bot y espera post-click.
     """
 
+    # Detección de llegada: nada de la transición anterior vale para esta
+    arrival = getattr(bot, "arrival", None) if bot else None
+    if arrival is not None:
+        arrival.reset()
+
     # Verificar si el bot está pausado antes de moverse
-    if bot and not bot.running:
-        log("Bot pausado antes de moverse. Abortando movimiento.")
+    if bot and bot.interrupted():
+        log("Bot pausado (o alerta pendiente) antes de moverse. Abortando movimiento.")
         return idx
 
+    # Referencia de la sala actual antes del click (arrival.started = hubo click)
+    if arrival is not None:
+        arrival.begin()
+
     # Coordenadas de la salida actual
     x, y = map_path[idx]
     rx, ry = random_point_near(x, y, radius=4)
@@ -25,16 +34,16 @@ def move_to_next(bot, map_path, idx, config):
 
     # Delay post-click respetando pausa
     wait = float(config.get("post_move_wait", 2.0))
-    total_waited = 0.0
-    interval = 0.2
-    randomize = config.get("randomize_delays", True)
-
-    while total_waited < wait:
-        if bot and not bot.running:
-            log("Bot pausado durante espera de movimiento. Abortando espera.")
+    if arrival is not None:
+        # post_move_wait queda como máximo: se corta al detectar la sala nueva
+        if not arrival.wait(wait, bot.interrupted) and bot.interrupted():
+            log("Bot pausado (o alerta pendiente) durante espera de movimiento. Abortando espera.")
             return idx
-        time.sleep(interval)
-        total_waited += interval
+        return (idx + 1) % len(map_path)
+
+    if not interruptible_sleep(bot, wait):
+        log("Bot pausado (o alerta pendiente) durante espera de movimiento. Abortando espera.")
+        return idx
 
     # Calcular siguiente índice cíclico
     new_idx = (idx + 1) % len(map_path)
@@ -0,0 +1,81 @@
+# peaks.py
+# Extracción de picos y NMS sobre mapas de cv2.matchTemplate. Sin efectos al
+# importar (no carga templates ni config): lo usan detector.py y los procesos
+# del pool de batch_eval.py, que en Windows arrancan de cero.
+
+import cv2
+import numpy as np
+
+NMS_DISTANCE = 20 # Centros más cerca que esto (px) se consideran el mismo objeto
+NMS_IOU = 0.5     # O si las cajas se solapan más que esto (IoU)
+
+_PEAK_KERNEL = np.ones((3, 3), np.uint8)
+
+def find_peaks(res, conf):
+    """
+    Máximos locales de un mapa de cv2.matchTemplate por encima de 'conf'.
+    Usa dilatación + comparación en lugar de recorrer en Python cada píxel
+    que supera el umbral.
+    Devuelve (xs, ys, scores) como arrays de numpy (esquina sup. izq.).
+    """
+    mask = res >= conf
+    if not mask.any():
+        empty = np.empty(0, dtype=np.int32)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    mask &= res >= cv2.dilate(res, _PEAK_KERNEL)
+    ys, xs = np.nonzero(mask)
+    return xs, ys, res[ys, xs]
+
+def nms(boxes, scores, min_distance=NMS_DISTANCE, iou_thresh=NMS_IOU):
+    """
+    Non-maximum suppression voraz y vectorizado.
+    boxes: array (N, 4) con [x1, y1, x2, y2]; scores: array (N,).
+    Una caja se descarta si otra con más puntuación tiene el centro a menos de
+    'min_distance' px o un IoU mayor que 'iou_thresh'. Así en cada grupo se
+    queda la detección con mejor puntuación, no la primera escaneada.
+    Devuelve los índices conservados, ordenados por puntuación descendente.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32)
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.intp)
+
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    cx = (x1 + x2) / 2; cy = (y1 + y2) / 2
+    min_dist_sq = float(min_distance) ** 2
+    # Orden estable: a igualdad de puntuación gana la primera encontrada
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = np.maximum(0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        ih = np.maximum(0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = iw * ih
+        union = areas[i] + areas[rest] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+        dist_sq = (cx[rest] - cx[i]) ** 2 + (cy[rest] - cy[i]) ** 2
+        order = rest[(iou <= iou_thresh) & (dist_sq >= min_dist_sq)]
+    return np.array(keep, dtype=np.intp)
+
+def extract_detections(res, conf, w, h, label, min_distance=NMS_DISTANCE, iou_thresh=NMS_IOU):
+    """
+    Convierte un mapa de matchTemplate en detecciones ya filtradas
+    (picos locales + NMS). Útil para herramientas que hacen su propio
+    matchTemplate (UI de test, scripts de debug).
+    """
+    xs, ys, scores = find_peaks(res, conf)
+    boxes = np.stack([xs, ys, xs + w, ys + h], axis=1)
+    return [make_detection(label, scores[i], boxes[i]) for i in nms(boxes, scores, min_distance, iou_thresh)]
+
+def make_detection(label, score, box):
+    x1, y1, x2, y2 = (int(v) for v in box)
+    return {
+        "label": label,
+        "conf": float(score),
+        "cx": x1 + (x2 - x1) // 2,
+        "cy": y1 + (y2 - y1) // 2,
+        "bbox": [x1, y1, x2, y2],
+    }
@@ -0,0 +1,202 @@
+# profiler.py
+# Perfilado bajo demanda del bucle del bot: al pulsar profile_key se perfilan
+# las N iteraciones siguientes de run_loop y se escribe un informe con fecha
+# más un fichero de pilas "folded" (flamegraph.pl / speedscope / inferno).
+#   - sample:   hilo muestreador con sys._current_frames() (todos los hilos,
+#               poco coste: la UI, la captura, las alertas... también salen)
+#   - cprofile: cProfile determinista del hilo del bucle (más preciso, más lento)
+# Sin perfilado pedido no hay hilo ni hooks: el bucle solo lee un booleano.
+
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from io import StringIO
+from collections import Counter
+from utils import log
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_MODES = ("off", "sample", "cprofile")
+
+
+def _frame_name(code):
+    return f"{os.path.splitext(os.path.basename(code.co_filename))[0]}:{code.co_name}"
+
+
+class StackSampler:
+    """Cada 'interval' s apunta la pila de cada hilo (menos la suya) en un Counter de pilas folded."""
+
+    def __init__(self, interval=0.005):
+        self.interval = max(0.001, float(interval))
+        self.stacks = Counter() # "hilo;mod:func;mod:func" -> nº de muestras
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="StackSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"hilo-{ident}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def report(self, top=40):
+        """Texto con las funciones con más muestras propias (hoja) e inclusivas, por hilo."""
+        own, inclusive, threads = Counter(), Counter(), Counter()
+        for stack, n in self.stacks.items():
+            parts = stack.split(";")
+            threads[parts[0]] += n
+            own[(parts[0], parts[-1])] += n
+            for func in set(parts[1:]):
+                inclusive[(parts[0], func)] += n
+        lines = [f"Muestras: {self.samples} (cada {self.interval * 1000:.1f} ms)", "", "Hilos:"]
+        lines += [f"  {n:7d}  {name}" for name, n in threads.most_common()]
+        for title, counter in (("Tiempo propio (hoja de la pila)", own), ("Tiempo inclusivo", inclusive)):
+            lines += ["", f"{title}:"]
+            for (thread, func), n in counter.most_common(top):
+                pct = 100.0 * n / threads[thread] if threads[thread] else 0.0
+                lines.append(f"  {n:7d}  {pct:5.1f}%  [{thread}] {func}")
+        return "\n".join(lines) + "\n"
+
+    def folded(self):
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(self.stacks.items()))
+
+
+class LoopProfiler:
+    """
+    request() (desde el hilo de las hotkeys) pide un perfil; tick() se llama
+    al principio de cada iteración de run_loop: arranca el perfil, cuenta
+    iteraciones y al llegar a 'iterations' (o a 'max_seconds') lo cierra y
+    escribe en 'directory':
+        perfil_AAAAMMDD_HHMMSS_<modo>.txt     informe legible
+        perfil_AAAAMMDD_HHMMSS_<modo>.folded  pilas para flamegraph (modo sample)
+        perfil_AAAAMMDD_HHMMSS_<modo>.prof    pstats (modo cprofile; snakeviz, flameprof)
+    """
+
+    def __init__(self, mode="sample", iterations=50, interval=0.005, directory=None, max_seconds=120.0):
+        self.configure(mode, iterations, interval, directory, max_seconds)
+        self.pending = False # Lo único que mira el bucle cuando no se perfila
+        self.active = False
+        self._lock = threading.Lock()
+        self._profile = None
+        self._sampler = None
+        self._count = 0
+        self._started = 0.0
+
+    def configure(self, mode="sample", iterations=50, interval=0.005, directory=None, max_seconds=120.0):
+        mode = str(mode).lower()
+        if mode not in PROFILE_MODES:
+            print(f"Advertencia: profile_mode '{mode}' no válido. Usando 'sample'.")
+            mode = "sample"
+        self.mode = mode
+        self.iterations = max(1, int(iterations))
+        self.interval = float(interval)
+        directory = directory or "profiles"
+        self.directory = directory if os.path.isabs(directory) else os.path.join(BASE_DIR, directory)
+        self.max_seconds = float(max_seconds)
+
+    def request(self):
+        """Pide perfilar las próximas iteraciones. False si está desactivado o ya en curso."""
+        if self.mode == "off":
+            log("Perfilado desactivado (profile_mode: off).")
+            return False
+        with self._lock:
+            if self.pending or self.active:
+                log("Ya hay un perfilado en curso.")
+                return False
+            self.pending = True
+        log(f"Perfilado ({self.mode}) de las próximas {self.iterations} iteraciones solicitado.")
+        return True
+
+    def tick(self):
+        """Una iteración de run_loop (llamar solo si pending o active)."""
+        with self._lock:
+            if self.pending:
+                self.pending = False
+                self._begin()
+                return
+            if not self.active:
+                return
+            self._count += 1
+            if self._count < self.iterations and time.perf_counter() - self._started < self.max_seconds:
+                return
+        self.finish()
+
+    def _begin(self):
+        self.active = True
+        self._count = 0
+        self._started = time.perf_counter()
+        if self.mode == "cprofile":
+            # Solo perfila el hilo que llama a tick(): el del bucle
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = StackSampler(self.interval)
+            self._sampler.start()
+
+    def finish(self):
+        """Cierra el perfil en curso (si hay) y escribe los ficheros. Devuelve la ruta del informe."""
+        with self._lock:
+            if not self.active:
+                self.pending = False
+                return None
+            self.active = False
+            profile, self._profile = self._profile, None
+            sampler, self._sampler = self._sampler, None
+        if profile is not None:
+            profile.disable()
+        if sampler is not None:
+            sampler.stop()
+        seconds = time.perf_counter() - self._started
+
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        base = os.path.join(self.directory, f"perfil_{stamp}_{self.mode}")
+        header = f"Perfil {self.mode} | {time.strftime('%Y-%m-%d %H:%M:%S')} | {self._count} iteraciones en {seconds:.2f} s\n\n"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if profile is not None:
+                out = StringIO()
+                stats = pstats.Stats(profile, stream=out)
+                stats.sort_stats("cumulative").print_stats(60)
+                stats.sort_stats("tottime").print_stats(30)
+                stats.dump_stats(base + ".prof")
+                text = out.getvalue()
+            else:
+                text = sampler.report()
+                with open(base + ".folded", "w", encoding="utf-8") as f:
+                    f.write(sampler.folded())
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                f.write(header + text)
+        except Exception as e:
+            log(f"Error guardando el perfil: {e}")
+            return None
+        log(f"Perfil guardado: {base}.txt ({self._count} iteraciones, {seconds:.1f} s)")
+        return base + ".txt"
+
+
+def profiler_from_config(config):
+    return LoopProfiler(mode=config.get("profile_mode", "sample"),
+                        iterations=config.get("profile_iterations", 50),
+                        interval=config.get("profile_interval", 0.005),
+                        directory=config.get("profile_dir"),
+                        max_seconds=config.get("profile_max_seconds", 120.0))
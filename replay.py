@@ -0,0 +1,366 @@
+# replay.py
+# Grabación y reproducción de sesiones del bot.
+#
+#   python replay.py record <carpeta> [--duration S]   (Windows, con el juego)
+#   python replay.py play <carpeta> [--seed N]         (sin escritorio, p.ej. Linux)
+#
+# La grabación guarda en <carpeta>:
+#   events.jsonl  - una línea JSON por evento: frames, clicks, teclas y sonidos,
+#                   con 't' en segundos desde el inicio
+#   frames.bin    - los frames codificados en PNG uno detrás de otro (cada
+#                   evento 'frame' indica offset y tamaño). Los frames idénticos
+#                   al anterior no se guardan.
+#   config.yaml   - la config con la que se grabó
+# La reproducción ejecuta Bot.run_loop con captura, entrada y sonido falsos y
+# un reloj virtual (timing.FakeClock), así que va más rápido que el tiempo
+# real y, con la misma semilla, hace siempre lo mismo: el propio reloj detiene
+# el bot al llegar al final de la grabación. Sus acciones se guardan en
+# <carpeta>/replay_events.jsonl para compararlas.
+
+import os
+import sys
+import json
+import time
+import random
+import bisect
+import argparse
+import threading
+import cv2
+import numpy as np
+import yaml
+import timing
+from screencap import get_frame_source, set_frame_source
+from utils import get_input, set_input_backend, get_audio, log
+
+EVENTS_NAME = "events.jsonl"
+FRAMES_NAME = "frames.bin"
+CONFIG_NAME = "config.yaml"
+REPLAY_EVENTS_NAME = "replay_events.jsonl"
+
+# Cambios de config al reproducir: sin hilos con tiempo real, sin avisos reales
+REPLAY_OVERRIDES = {
+    "capture_thread": False, "alert_watcher": False, "audio_backend": "null",
+    "bot_token": "", "chat_id": "", "template_refresh_interval": 0,
+}
+
+
+# --- Escritura ---
+class EventWriter:
+    """Escribe events.jsonl (y frames.bin si se le pasan frames)."""
+
+    def __init__(self, path, events_name=EVENTS_NAME, frames=True):
+        os.makedirs(path, exist_ok=True)
+        self.t0 = timing.now()
+        self._events = open(os.path.join(path, events_name), "w", encoding="utf-8")
+        self._frames = open(os.path.join(path, FRAMES_NAME), "wb") if frames else None
+        self._offset = 0
+        self._prev = None
+        self._lock = threading.Lock()
+
+    def event(self, kind, **data):
+        with self._lock:
+            data = dict(t=round(timing.now() - self.t0, 4), type=kind, **data)
+            self._events.write(json.dumps(data) + "\n")
+
+    def frame(self, img):
+        with self._lock:
+            if self._prev is not None and self._prev.shape == img.shape and np.array_equal(self._prev, img):
+                return
+            self._prev = img.copy()
+            ok, buf = cv2.imencode(".png", img)
+            if not ok:
+                return
+            data = buf.tobytes()
+            self._frames.write(data)
+            entry = {"t": round(timing.now() - self.t0, 4), "type": "frame",
+                     "offset": self._offset, "size": len(data)}
+            self._events.write(json.dumps(entry) + "\n")
+            self._offset += len(data)
+
+    def close(self):
+        with self._lock:
+            self._events.close()
+            if self._frames is not None:
+                self._frames.close()
+
+
+class RecordingSource:
+    """Envuelve una FrameSource: graba cada captura del ROI completo."""
+
+    def __init__(self, inner, writer):
+        self.inner = inner
+        self.writer = writer
+        self._meta_written = False
+
+    def grab(self, region=None, gray=False):
+        img = self.inner.grab(region, gray=gray)
+        if region is None and img is not None:
+            if not self._meta_written:
+                self.writer.event("meta", roi=self.inner.resolve_region())
+                self._meta_written = True
+            self.writer.frame(img)
+        return img
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+class RecordingInput:
+    """Envuelve la entrada real: graba cada acción y la ejecuta."""
+
+    def __init__(self, inner, writer):
+        self.inner = inner
+        self.writer = writer
+
+    def move(self, x, y, duration):
+        self.writer.event("move", x=int(x), y=int(y), duration=round(duration, 4))
+        self.inner.move(x, y, duration)
+
+    def click(self, x, y, button):
+        self.writer.event("click", x=int(x), y=int(y), button=button)
+        self.inner.click(x, y, button)
+
+    def press(self, key):
+        self.writer.event("press", key=key)
+        self.inner.press(key)
+
+
+class RecordingAudio:
+    """Envuelve el backend de audio: graba los sonidos y los reproduce."""
+
+    def __init__(self, inner, writer):
+        self.inner = inner
+        self.writer = writer
+        self.name = inner.name
+
+    def preload(self, path):
+        return self.inner.preload(path)
+
+    def play(self, sound):
+        self.writer.event("sound", sound=os.path.basename(sound) if isinstance(sound, str) else "<wav>")
+        self.inner.play(sound)
+
+    def beep(self, freq, ms):
+        self.writer.event("beep", freq=freq, ms=ms)
+        self.inner.beep(freq, ms)
+
+
+# --- Lectura / reproducción ---
+class Recording:
+    """Grabación cargada: eventos + acceso a los frames por tiempo."""
+
+    def __init__(self, path):
+        self.path = path
+        self.events = []
+        with open(os.path.join(path, EVENTS_NAME), "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self.events.append(json.loads(line))
+        self.frames = [e for e in self.events if e["type"] == "frame"]
+        self.frame_times = [e["t"] for e in self.frames]
+        meta = next((e for e in self.events if e["type"] == "meta"), {})
+        self.roi = meta.get("roi")
+        self.duration = self.events[-1]["t"] if self.events else 0.0
+        self._blob = None
+
+    def actions(self, kinds=("click", "press", "sound", "beep")):
+        return [e for e in self.events if e["type"] in kinds]
+
+    def frame_at(self, t):
+        """Índice del último frame grabado en o antes de 't' (-1 si ninguno)."""
+        return bisect.bisect_right(self.frame_times, t) - 1
+
+    def decode(self, index):
+        if self._blob is None:
+            with open(os.path.join(self.path, FRAMES_NAME), "rb") as f:
+                self._blob = np.frombuffer(f.read(), dtype=np.uint8)
+        e = self.frames[index]
+        return cv2.imdecode(self._blob[e["offset"]:e["offset"] + e["size"]], cv2.IMREAD_UNCHANGED)
+
+
+class ReplaySource:
+    """FrameSource falsa: devuelve el frame grabado que toca según el reloj."""
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.t0 = timing.now()
+        self._index = None
+        self._img = None
+        self._latest = None
+        roi = recording.roi or {}
+        self.roi = {"left": roi.get("left", 0), "top": roi.get("top", 0),
+                    "width": roi.get("width", 0), "height": roi.get("height", 0)}
+
+    def _current(self):
+        index = self.recording.frame_at(timing.now() - self.t0)
+        if index < 0:
+            index = 0 if self.recording.frames else -1
+        if index < 0:
+            return None
+        if index != self._index:
+            self._index, self._img = index, self.recording.decode(index)
+        return self._img
+
+    def resolve_region(self, region=None):
+        return self.roi if region is None else region
+
+    def refresh_roi(self):
+        pass
+
+    def grab(self, region=None, gray=False):
+        img = self._current()
+        if img is None:
+            return None
+        if region is not None and region is not False:
+            x, y = region["left"] - self.roi["left"], region["top"] - self.roi["top"]
+            img = img[max(0, y):y + region["height"], max(0, x):x + region["width"]]
+        if gray and img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        elif not gray and img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        else:
+            img = img.copy()
+        if region is None:
+            self._latest = img
+        return img
+
+    def latest(self):
+        return self._latest
+
+    def close(self):
+        pass
+
+
+class FakeInput:
+    """Entrada falsa: no toca el ratón; el movimiento cuesta su duración en el reloj virtual."""
+
+    def __init__(self, writer=None):
+        self.writer = writer
+
+    def _log(self, kind, **data):
+        if self.writer is not None:
+            self.writer.event(kind, **data)
+
+    def move(self, x, y, duration):
+        self._log("move", x=int(x), y=int(y), duration=round(duration, 4))
+        timing.sleep(duration)
+
+    def click(self, x, y, button):
+        self._log("click", x=int(x), y=int(y), button=button)
+
+    def press(self, key):
+        self._log("press", key=key)
+
+
+# --- Modos ---
+def record(path, config_path, duration=None):
+    """Ejecuta el bot real grabando captura, entrada y sonido hasta Ctrl+C o 'duration'."""
+    from controller import Bot
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, CONFIG_NAME), "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, sort_keys=False, allow_unicode=True)
+
+    writer = EventWriter(path)
+    set_frame_source(RecordingSource(get_frame_source(), writer))
+    set_input_backend(RecordingInput(get_input(), writer))
+    bot = Bot(config_path)
+    audio = get_audio()
+    audio.backend = RecordingAudio(audio.backend, writer) if audio.backend is not None else None
+
+    thread = threading.Thread(target=bot.run_loop, daemon=True)
+    thread.start()
+    bot.toggle_running()
+    log(f"Grabando en {path}. Ctrl+C para terminar.")
+    try:
+        started = time.monotonic()
+        while duration is None or time.monotonic() - started < duration:
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        pass
+    bot.stop()
+    thread.join(timeout=2.0)
+    writer.close()
+    log("Grabación terminada.")
+
+
+def replay(path, seed=0, wall_timeout=600.0):
+    """
+    Reproduce una grabación sin escritorio y devuelve un resumen (dict).
+    El bot corre con reloj virtual hasta el final de la grabación (el reloj
+    llama a bot.stop() en el hilo del bucle al llegar) o hasta que se pause
+    solo, p.ej. por una alerta.
+    """
+    recording = Recording(path)
+    with open(os.path.join(path, CONFIG_NAME), "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+    config.update(REPLAY_OVERRIDES)
+    config_path = os.path.join(path, "replay_config.yaml")
+    with open(config_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, sort_keys=False, allow_unicode=True)
+
+    random.seed(seed)
+    clock = timing.FakeClock()
+    timing.set_clock(clock)
+    writer = EventWriter(path, REPLAY_EVENTS_NAME, frames=False)
+    set_frame_source(ReplaySource(recording))
+    set_input_backend(FakeInput(writer))
+    from controller import Bot # Después de cambiar los backends
+    bot = Bot(config_path)
+    bot.running = True
+    clock.set_deadline(writer.t0 + recording.duration, bot.stop)
+
+    thread = threading.Thread(target=bot.run_loop, daemon=True)
+    started = time.perf_counter()
+    thread.start()
+    reason = "fin de la grabación"
+    while thread.is_alive():
+        # Pausado, el bucle se bloquea sin adelantar el reloj: da igual cuándo se vea
+        if not bot.running and not clock.expired:
+            reason = "el bot se pausó"
+            break
+        if time.perf_counter() - started > wall_timeout:
+            reason = "tiempo real agotado"
+            break
+        thread.join(0.005)
+    bot.stop()
+    thread.join(timeout=5.0)
+    wall = time.perf_counter() - started
+    sim = timing.now() - writer.t0
+    writer.close()
+
+    with open(os.path.join(path, REPLAY_EVENTS_NAME), "r", encoding="utf-8") as f:
+        replay_events = [json.loads(line) for line in f if line.strip()]
+    count = lambda events, kind: sum(1 for e in events if e["type"] == kind)
+    return {
+        "motivo": reason,
+        "segundos_simulados": round(sim, 2),
+        "segundos_reales": round(wall, 2),
+        "velocidad": round(sim / wall, 2) if wall > 0 else None,
+        "frames_grabados": len(recording.frames),
+        "clicks": {"grabados": count(recording.events, "click"), "reproducidos": count(replay_events, "click")},
+        "teclas": {"grabadas": count(recording.events, "press"), "reproducidas": count(replay_events, "press")},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grabar / reproducir sesiones del bot.")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    rec = sub.add_parser("record", help="Graba una sesión real.")
+    rec.add_argument("path")
+    rec.add_argument("--config", default=os.path.join(os.path.dirname(__file__), "config.yaml"))
+    rec.add_argument("--duration", type=float, default=None, help="Segundos (por defecto hasta Ctrl+C).")
+    play = sub.add_parser("play", help="Reproduce una grabación sin escritorio.")
+    play.add_argument("path")
+    play.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.mode == "record":
+        record(args.path, args.config, args.duration)
+    else:
+        print(json.dumps(replay(args.path, args.seed), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,13 @@
 # run_bot.py
 # Archivo que ejecutas: python src/run_bot.py
-# Registra la tecla F8 para play/pause y ESC para salir
+# Registra la tecla F8 para play/pause, ESC para salir y F9 para perfilar
 
 import os
 import threading
 import time
 from controller import Bot
 from utils import log
+from telegram_notifier import flush_telegram
 
 try:
     import keyboard
@@ -26,11 +27,13 @@ def main():
     # hotkeys (F8 para play/pause, ESC para stop)
     toggle_key = bot.config.get("toggle_key", "f8")
     exit_key = bot.config.get("exit_key", "esc")
+    profile_key = bot.config.get("profile_key", "f9")
 
     if keyboard:
-        log(f"Hotkeys: {toggle_key.upper()} = Play/Pause, {exit_key.upper()} = Stop/Exit")
+        log(f"Hotkeys: {toggle_key.upper()} = Play/Pause, {exit_key.upper()} = Stop/Exit, {profile_key.upper()} = Perfilar")
         keyboard.add_hotkey(toggle_key, bot.toggle_running)
         keyboard.add_hotkey(exit_key, bot.stop)
+        keyboard.add_hotkey(profile_key, bot.request_profile)
         # bloquear aquí hasta que se pulse exit_key
         try:
             keyboard.wait(exit_key)
@@ -38,14 +41,16 @@ def main():
             pass
     else:
         # fallback sin hotkeys: usar entrada por consola
-        log("keyboard no disponible. Usar consola: escribe 'start' luego ENTER, 'stop' para terminar.")
+        log("keyboard no disponible. Usar consola: escribe 'start' luego ENTER, 'stop' para terminar, 'profile' para perfilar.")
         while not bot.stopped:
-            cmd = input("Comando (start/stop/toggle): ").strip().lower()
+            cmd = input("Comando (start/stop/toggle/profile): ").strip().lower()
             if cmd in ("start", "s"):
                 if not bot.running:
                     bot.toggle_running()
             elif cmd in ("toggle", "t"):
                 bot.toggle_running()
+            elif cmd in ("profile", "p"):
+                bot.request_profile()
             elif cmd in ("stop", "exit", "q"):
                 bot.stop()
                 break
@@ -54,6 +59,7 @@ def main():
 
     # esperar que el hilo termine
     t.join(timeout=1.0)
+    flush_telegram()
     log("Proceso finalizado.")
 
 if __name__ == "__main__":
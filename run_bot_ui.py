@@ -1,9 +1,14 @@
 # run_bot_ui.py
 import os
 import tkinter as tk
-from bot_ui import BotUI  # tu interfaz que ya integra config y botones
 
 if __name__ == "__main__":
+    # Importar aquí: los procesos del pool de batch_eval re-importan este fichero
+    # y no deben cargar la UI, el bot ni los templates
+    from bot_ui import BotUI  # tu interfaz que ya integra config y botones
+    from telegram_notifier import flush_telegram
     root = tk.Tk()
     app = BotUI(root)
+    root.protocol("WM_DELETE_WINDOW", app.stop_and_quit)
     root.mainloop()
+    flush_telegram() # Que salgan los últimos avisos (p.ej. "Bot detenido") antes de cerrar
@@ -4,68 +4,187 @@
 import mss
 import numpy as np
 import cv2
-import yaml # <--- Añadido
-import os   # <--- Añadido
+import threading
+import time
+from config_store import get_config_store, CONFIG_PATH
 
-# --- Ruta al config.yaml (asumiendo que está en la misma carpeta) ---
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.yaml")
-
-# --- Variable global para guardar el ROI y no leer el archivo cada vez ---
-_cached_roi = None
-_config_mtime = 0 # Para detectar cambios en el config
 
 def load_roi_from_config():
     """
-    Carga el ROI desde config.yaml y lo convierte al formato de mss.
-    Cachea el resultado para no leer el archivo en cada captura.
+    ROI de la config compartida en formato de mss, o "pantalla_completa" si
+    no es válido. La config ya está en memoria (ConfigStore): no lee el archivo.
     """
-    global _cached_roi, _config_mtime
-    
+    roi_config = get_config_store().config.get("ROI")
     try:
-        # Comprobar si el archivo ha sido modificado
-        current_mtime = os.path.getmtime(CONFIG_PATH)
-        if current_mtime == _config_mtime and _cached_roi is not None:
-            return _cached_roi # Devolver el ROI cacheado
-
-        # Si no hay cache o el archivo cambió, leerlo
-        if os.path.exists(CONFIG_PATH):
-            with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-                config = yaml.safe_load(f)
-                if isinstance(config, dict):
-                    roi_config = config.get("ROI")
-                    # Validar que ROI es un diccionario y tiene las claves
-                    if isinstance(roi_config, dict) and all(k in roi_config for k in ('x', 'y', 'w', 'h')):
-                        # Convertir a formato mss {'left', 'top', 'width', 'height'}
-                        roi_mss = {
-                            'left': int(roi_config['x']),
-                            'top': int(roi_config['y']),
-                            'width': int(roi_config['w']),
-                            'height': int(roi_config['h'])
-                        }
-                        # Validar dimensiones
-                        if roi_mss['width'] > 0 and roi_mss['height'] > 0:
-                            _cached_roi = roi_mss # Guardar en cache
-                            _config_mtime = current_mtime # Actualizar tiempo de modificación
-                            # print(f"[DEBUG screencap] ROI cargado desde config: {roi_mss}") # Log de debug opcional
-                            return roi_mss
-                        else:
-                            print(f"Advertencia: ROI en {CONFIG_PATH} tiene dimensiones inválidas (w={roi_mss['width']}, h={roi_mss['height']}). Usando pantalla completa.")
-                    else:
-                         print(f"Advertencia: ROI no está definido correctamente en {CONFIG_PATH}. Usando pantalla completa.")
-                else:
-                     print(f"Advertencia: {CONFIG_PATH} está vacío o corrupto. Usando pantalla completa.")
-        else:
-            print(f"Advertencia: No se encontró {CONFIG_PATH}. Usando pantalla completa.")
-    
-    except Exception as e:
-        print(f"Error al leer ROI desde config.yaml: {e}. Usando pantalla completa.")
-
-    # Fallback si todo falla: cachear "pantalla_completa" para no reintentar
-    _cached_roi = "pantalla_completa" 
-    _config_mtime = 0 # Resetear mtime para que intente recargar si el archivo aparece
+        # Convertir a formato mss {'left', 'top', 'width', 'height'}
+        roi_mss = {
+            'left': int(roi_config['x']),
+            'top': int(roi_config['y']),
+            'width': int(roi_config['w']),
+            'height': int(roi_config['h'])
+        }
+    except (KeyError, TypeError, ValueError):
+        print(f"Advertencia: ROI no está definido correctamente en {CONFIG_PATH}. Usando pantalla completa.")
+        return "pantalla_completa"
+    # Validar dimensiones
+    if roi_mss['width'] > 0 and roi_mss['height'] > 0:
+        return roi_mss
+    print(f"Advertencia: ROI en {CONFIG_PATH} tiene dimensiones inválidas (w={roi_mss['width']}, h={roi_mss['height']}). Usando pantalla completa.")
     return "pantalla_completa"
 
 
+def _resolve_region(region, sct):
+    """
+    Traduce el argumento 'region' al dict que espera mss.
+        - None: ROI de config.yaml (o monitor principal si no hay ROI válido).
+        - dict: región específica.
+        - False: pantalla completa.
+    """
+    if region is None:
+        roi_from_config = load_roi_from_config()
+        if roi_from_config != "pantalla_completa":
+            return roi_from_config
+        return sct.monitors[1]
+    if isinstance(region, dict):
+        return region
+    # region is False (o cualquier otro valor): monitor principal
+    return sct.monitors[1]
+
+
+class FrameSource:
+    """
+    Fuente de capturas persistente.
+
+    Mantiene un handle de mss por hilo (mss no es seguro entre hilos en Windows)
+    y resuelve el ROI una sola vez; lo vuelve a resolver cuando cambia el ROI
+    de la config compartida o cuando se llama a refresh_roi().
+    grab() captura un frame nuevo y latest() devuelve el último capturado
+    sin tocar la pantalla.
+    """
+
+    def __init__(self, region=None):
+        self.region = region
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._handles = []
+        self._roi = None
+        self._latest = None
+        if region is None:
+            get_config_store().subscribe(self._on_config_change)
+
+    def _sct(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = mss.mss()
+            self._local.sct = sct
+            with self._lock:
+                self._handles.append(sct)
+        return sct
+
+    def refresh_roi(self):
+        """Fuerza a releer el ROI en la próxima captura."""
+        self._roi = None
+
+    def _on_config_change(self, config, changed):
+        if "ROI" in changed:
+            self.refresh_roi()
+
+    def _default_region(self, sct):
+        roi = self._roi
+        if roi is None:
+            roi = self._roi = _resolve_region(self.region, sct)
+        return roi
+
+    def resolve_region(self, region=None):
+        """Región mss (dict con left/top/width/height) que usaría grab(region)."""
+        sct = self._sct()
+        if region is None:
+            return self._default_region(sct)
+        return _resolve_region(region, sct)
+
+    def _gray_buffer(self, h, w):
+        """Buffer gris reutilizable por hilo (se reasigna solo si cambia el tamaño)."""
+        buf = getattr(self._local, "gray_buf", None)
+        if buf is None or buf.shape != (h, w):
+            buf = np.empty((h, w), dtype=np.uint8)
+            self._local.gray_buf = buf
+        return buf
+
+    def grab(self, region=None, gray=False):
+        """
+        Captura un frame.
+        region: igual que en get_screenshot(). None usa la región de la fuente.
+        gray: si es True devuelve directamente la imagen en escala de grises,
+              sin pasar por BGR. El resultado se escribe en un buffer que se
+              reutiliza en la siguiente captura gris del mismo hilo: copiarlo
+              si hay que conservarlo.
+        devuelve: imagen BGR (o gris) como numpy ndarray, o None si hay error
+        """
+        region_to_grab = None
+        try:
+            sct = self._sct()
+            if region is None:
+                region_to_grab = self._default_region(sct)
+            else:
+                region_to_grab = _resolve_region(region, sct)
+            sct_im = sct.grab(region_to_grab)
+            # Vista directa sobre el buffer BGRA de mss (sin copia)
+            h, w = sct_im.height, sct_im.width
+            bgra = np.frombuffer(sct_im.raw, dtype=np.uint8).reshape(h, w, 4)
+            if gray:
+                img = cv2.cvtColor(bgra, cv2.COLOR_BGRA2GRAY, dst=self._gray_buffer(h, w))
+            else:
+                # convertir BGRA -> BGR
+                img = cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR)
+            if region is None:
+                # El gris vive en el buffer del hilo, que la siguiente captura sobrescribe
+                self._latest = img.copy() if gray else img
+            return img
+
+        except mss.ScreenShotError as e:
+            print(f"Error de captura de pantalla (MSS): {e}")
+            print(f"  Región intentada: {region_to_grab}")
+            print("  Asegúrate de que las coordenadas del ROI estén dentro de la pantalla.")
+            self._roi = None # Reintentar resolver el ROI en la próxima captura
+            return None
+        except Exception as e:
+            print(f"Error inesperado en FrameSource.grab: {e}")
+            return None
+
+    def latest(self):
+        """Devuelve el último frame capturado con grab() (o None si aún no hay)."""
+        return self._latest
+
+    def close(self):
+        """Cierra los handles de mss abiertos por esta fuente."""
+        with self._lock:
+            handles, self._handles = self._handles, []
+        for sct in handles:
+            try: sct.close()
+            except Exception: pass
+        self._local = threading.local()
+
+
+# --- Fuente compartida por el bot y las herramientas de debug ---
+_default_source = None
+_default_source_lock = threading.Lock()
+
+def get_frame_source():
+    """Devuelve la FrameSource compartida (se crea la primera vez)."""
+    global _default_source
+    if _default_source is None:
+        with _default_source_lock:
+            if _default_source is None:
+                _default_source = FrameSource()
+    return _default_source
+
+def set_frame_source(source):
+    """Sustituye la FrameSource compartida (grabación / reproducción en replay.py)."""
+    global _default_source
+    with _default_source_lock:
+        _default_source = source
+
+
 def get_screenshot(region=None):
     """
     region: 
@@ -73,47 +192,143 @@ def get_screenshot(region=None):
         - dict: Usa la región específica pasada (ej. {'left':x,'top':y,'width':w,'height':h}).
         - False: Fuerza la captura de pantalla completa.
     devuelve: imagen BGR (numpy ndarray) o None si hay error
+
+    Se mantiene por compatibilidad; usa la FrameSource compartida.
     """
-    
-    region_to_grab = None
+    return get_frame_source().grab(region)
 
-    if region is None:
-        # --- Lógica principal: Usar ROI de config.yaml ---
-        roi_from_config = load_roi_from_config()
-        if roi_from_config == "pantalla_completa":
-            region_to_grab = None # Mss usará el monitor principal
-        else:
-            region_to_grab = roi_from_config # Usar el dict del ROI
-
-    elif isinstance(region, dict):
-        # --- Usar región específica pasada como argumento ---
-        region_to_grab = region
-    
-    elif region is False:
-        # --- Forzar pantalla completa ---
-        region_to_grab = None
-        
-    
-    try:
-        with mss.mss() as sct:
-            if region_to_grab is None:
-                # Capturar monitor principal
-                monitor = sct.monitors[1] 
-                sct_im = sct.grab(monitor)
-            else:
-                # Capturar la región específica (del ROI o argumento)
-                sct_im = sct.grab(region_to_grab)
-                
-            img = np.array(sct_im)  # BGRA
-            # convertir BGRA -> BGR
-            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-            return img
-            
-    except mss.ScreenShotError as e:
-        print(f"Error de captura de pantalla (MSS): {e}")
-        print(f"  Región intentada: {region_to_grab}")
-        print("  Asegúrate de que las coordenadas del ROI estén dentro de la pantalla.")
-        return None
-    except Exception as e:
-        print(f"Error inesperado en get_screenshot: {e}")
-        return None
+
+class CaptureThread:
+    """
+    Hilo productor que captura frames continuamente en un ring buffer
+    preasignado. Cada frame lleva un id creciente y un timestamp
+    (time.monotonic), así el detector puede tomar siempre el más reciente
+    o pedir uno más nuevo que el último que procesó.
+    """
+
+    def __init__(self, source=None, fps=30.0, size=3, gray=False):
+        self.source = source or get_frame_source()
+        self.gray = gray
+        self.min_interval = 1.0 / fps if fps and fps > 0 else 0.0
+        self.size = max(2, int(size))
+        self._frames = None            # ndarray (size, h, w[, c]) preasignado
+        self._ids = [0] * self.size
+        self._stamps = [0.0] * self.size
+        self._last_id = 0
+        self._floor_id = 0 # Frames con id <= este son de antes de la última pausa: no se entregan
+        self._resumed_at = 0.0 # Un grab empezado antes de esto (en plena pausa) se descarta
+        self._cond = threading.Condition()
+        self._active = threading.Event()  # Captura activa (se limpia al pausar)
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- Control del hilo ---
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            self.resume()
+            return
+        self._stop.clear()
+        self._mark_resume()
+        self._active.set()
+        self._thread = threading.Thread(target=self._run, name="CaptureThread", daemon=True)
+        self._thread.start()
+
+    def pause(self):
+        """Deja de capturar sin matar el hilo (p.ej. mientras el bot está pausado)."""
+        self._active.clear()
+
+    def resume(self):
+        if not self._active.is_set():
+            self._mark_resume()
+        self._active.set()
+
+    def _mark_resume(self):
+        """Al salir de pausa, lo que hay en el ring es viejo: solo valen frames posteriores."""
+        with self._cond:
+            self._floor_id = self._last_id
+            self._resumed_at = time.monotonic()
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        self._active.set() # Despertar al hilo si estaba en pausa
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        with self._cond:
+            self._cond.notify_all()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and self._active.is_set()
+
+    def _run(self):
+        next_due = time.monotonic()
+        while not self._stop.is_set():
+            if not self._active.is_set():
+                self._active.wait()
+                next_due = time.monotonic()
+                continue
+            started = time.monotonic()
+            img = self.source.grab(gray=self.gray)
+            if img is None:
+                self._stop.wait(0.5) # Evitar bucle caliente si la captura falla
+                continue
+            self._store(img, time.monotonic(), started)
+            if self.min_interval:
+                next_due += self.min_interval
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    self._stop.wait(delay)
+                else:
+                    next_due = time.monotonic() # Vamos tarde: no acumular retraso
+
+    def _store(self, img, stamp, started=None):
+        with self._cond:
+            if started is not None and started < self._resumed_at:
+                return # Captura empezada antes de la pausa/reanudación: ya es vieja
+            if self._frames is None or self._frames.shape[1:] != img.shape or self._frames.dtype != img.dtype:
+                # Primer frame o cambió el ROI: (re)asignar el buffer
+                self._frames = np.empty((self.size,) + img.shape, dtype=img.dtype)
+            frame_id = self._last_id + 1
+            slot = frame_id % self.size
+            np.copyto(self._frames[slot], img)
+            self._ids[slot] = frame_id
+            self._stamps[slot] = stamp
+            self._last_id = frame_id
+            self._cond.notify_all()
+
+    # --- Lectura ---
+    def _read_slot(self, copy):
+        slot = self._last_id % self.size
+        img = self._frames[slot]
+        return self._ids[slot], self._stamps[slot], (img.copy() if copy else img)
+
+    def latest(self, copy=True):
+        """
+        Devuelve (frame_id, timestamp, img) del frame más reciente sin esperar,
+        o (0, 0.0, None) si todavía no hay ninguno posterior a la última reanudación.
+        Con copy=False se devuelve una vista del ring buffer, válida hasta que
+        el productor dé la vuelta al buffer ('size' frames después).
+        """
+        with self._cond:
+            if self._last_id <= self._floor_id:
+                return 0, 0.0, None
+            return self._read_slot(copy)
+
+    def wait_newer(self, frame_id, timeout=None, copy=True):
+        """
+        Espera un frame con id mayor que 'frame_id' y lo devuelve como
+        (frame_id, timestamp, img). Si ya existe vuelve inmediatamente.
+        Los frames capturados antes de la última pausa nunca cuentan.
+        Devuelve (0, 0.0, None) si vence el timeout o se detiene el hilo.
+        """
+        with self._cond:
+            frame_id = max(frame_id, self._floor_id)
+            ok = self._cond.wait_for(
+                lambda: self._last_id > frame_id or self._stop.is_set(), timeout)
+            if not ok or self._last_id <= frame_id:
+                return 0, 0.0, None
+            return self._read_slot(copy)
+
+    def last_frame_id(self):
+        return self._last_id
@@ -0,0 +1,143 @@
+# spatial_priors.py
+# Mapas de calor por sala de dónde aparecen los recursos, para buscar solo en
+# esas zonas. Se guardan entre sesiones en un .npz junto al config.
+
+import os
+import threading
+import cv2
+import numpy as np
+from utils import log
+
+PRIORS_PATH = os.path.join(os.path.dirname(__file__), "spatial_priors.npz")
+
+
+class SpatialPriors:
+    """
+    Acumula, por sala, un mapa de calor en celdas de 'cell' px con las cajas
+    de las detecciones. regions() devuelve las zonas calientes (agrandadas
+    'margin_cells' celdas) donde buscar, o None para escanear el frame entero:
+    mientras la sala tenga menos de 'min_observations' escaneos con recursos
+    y, como red de seguridad, uno de cada 'full_scan_every' escaneos.
+    """
+
+    def __init__(self, path=PRIORS_PATH, cell=16, min_observations=5, full_scan_every=10, margin_cells=1):
+        self.path = path
+        self.cell = max(1, int(cell))
+        self.min_observations = int(min_observations)
+        self.full_scan_every = int(full_scan_every)
+        self.margin_cells = int(margin_cells)
+        self.heatmaps = {}      # sala -> ndarray float32 (filas, columnas) de celdas
+        self.observations = {}  # sala -> nº de escaneos con detecciones registrados
+        self._scans = {}        # sala -> escaneos desde el último escaneo completo (no se guarda)
+        self._region_cache = {} # sala -> regiones calculadas (se invalida al registrar)
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def room_key(idx, map_path):
+        """Clave de sala: índice + coordenadas de su salida (si se edita el path, se reaprende)."""
+        try:
+            x, y = map_path[idx]
+            return f"{idx}:{x},{y}"
+        except (IndexError, TypeError, ValueError):
+            return str(idx)
+
+    def _grid_shape(self, frame_shape):
+        h, w = frame_shape[:2]
+        return (h + self.cell - 1) // self.cell, (w + self.cell - 1) // self.cell
+
+    def _heatmap(self, room, frame_shape):
+        grid = self._grid_shape(frame_shape)
+        heat = self.heatmaps.get(room)
+        if heat is None or heat.shape != grid:
+            # Sala nueva o cambió el ROI: lo aprendido ya no corresponde
+            heat = np.zeros(grid, dtype=np.float32)
+            self.heatmaps[room] = heat
+            self.observations[room] = 0
+        return heat
+
+    def record(self, room, detections, frame_shape):
+        """Suma al mapa de la sala las cajas de 'detections' (coordenadas del frame)."""
+        if not detections:
+            return
+        with self._lock:
+            heat = self._heatmap(room, frame_shape)
+            c = self.cell
+            for d in detections:
+                x1, y1, x2, y2 = d["bbox"]
+                heat[max(0, y1 // c):(y2 + c - 1) // c, max(0, x1 // c):(x2 + c - 1) // c] += 1.0
+            self.observations[room] = self.observations.get(room, 0) + 1
+            self._region_cache.pop(room, None)
+            self._dirty = True
+
+    def regions(self, room, frame_shape):
+        """Lista de (x1, y1, x2, y2) donde buscar en esta sala, o None = frame completo."""
+        with self._lock:
+            scans = self._scans.get(room, 0) + 1
+            heat = self.heatmaps.get(room)
+            if (heat is None or heat.shape != self._grid_shape(frame_shape)
+                    or self.observations.get(room, 0) < self.min_observations
+                    or (self.full_scan_every > 0 and scans >= self.full_scan_every)):
+                self._scans[room] = 0
+                return None
+            self._scans[room] = scans
+            cached = self._region_cache.get(room)
+            if cached is not None:
+                return cached
+
+            mask = (heat > 0).astype(np.uint8)
+            if self.margin_cells > 0:
+                k = 2 * self.margin_cells + 1
+                mask = cv2.dilate(mask, np.ones((k, k), np.uint8))
+            n, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+            c = self.cell
+            regions = [(int(x) * c, int(y) * c, int(x + w) * c, int(y + h) * c) for x, y, w, h, _ in stats[1:]]
+            self._region_cache[room] = regions
+            return regions
+
+    def coverage(self, room, frame_shape):
+        """Fracción del frame que se analiza en esta sala (1.0 si aún no hay prior)."""
+        with self._lock:
+            heat = self.heatmaps.get(room)
+            if heat is None or self.observations.get(room, 0) < self.min_observations:
+                return 1.0
+            regions = self._region_cache.get(room) or []
+        h, w = frame_shape[:2]
+        area = sum((min(x2, w) - x1) * (min(y2, h) - y1) for x1, y1, x2, y2 in regions)
+        return area / float(h * w) if h and w else 1.0
+
+    # --- Persistencia ---
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                for key in data.files:
+                    if key.startswith("heat|"):
+                        room = key[len("heat|"):]
+                        self.heatmaps[room] = data[key].astype(np.float32)
+                        obs_key = "obs|" + room
+                        self.observations[room] = int(data[obs_key]) if obs_key in data.files else 0
+            log(f"Priors espaciales cargados: {len(self.heatmaps)} salas.")
+        except Exception as e:
+            print(f"Advertencia: no se pudieron cargar los priors espaciales ({e}). Se empieza de cero.")
+            self.heatmaps, self.observations = {}, {}
+        return self
+
+    def save(self):
+        """Guarda a disco si hubo cambios desde el último guardado."""
+        with self._lock:
+            if not self._dirty:
+                return
+            arrays = {}
+            for room, heat in self.heatmaps.items():
+                arrays["heat|" + room] = heat
+                arrays["obs|" + room] = np.array(self.observations.get(room, 0))
+            self._dirty = False
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Advertencia: no se pudieron guardar los priors espaciales: {e}")
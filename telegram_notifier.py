@@ -1,38 +1,179 @@
 # telegram_notifier.py
+# Envío de mensajes a Telegram en segundo plano: send_telegram() solo encola
+# y vuelve al instante; un hilo propio agrupa las ráfagas y las envía con una
+# sesión HTTP persistente, respetando los límites de la API (429 / backoff).
 import requests
-import os
-import yaml
+import time
+import queue
+import threading
+from config_store import get_config_store
 
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.yaml")
+API_BASE = "https://api.telegram.org"
+MAX_MESSAGE_LEN = 4096 # Límite de Telegram por mensaje
 
-def load_telegram_config():
-    """Carga bot_token y chat_id desde config.yaml."""
-    if os.path.exists(CONFIG_PATH):
-        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-            cfg = yaml.safe_load(f)
-            bot_token = cfg.get("bot_token", "")
-            chat_id = cfg.get("chat_id", "")
-            return bot_token, chat_id
-    return "", ""
+def load_telegram_config(store=None):
+    """bot_token y chat_id de la config compartida (ya en memoria)."""
+    cfg = (store or get_config_store()).config
+    return cfg.get("bot_token", "") or "", cfg.get("chat_id", "") or ""
+
+
+class TelegramNotifier:
+    """
+    Cola acotada ('max_queue') + hilo de envío.
+
+    - Las credenciales salen de la config compartida (ConfigStore), que ya
+      está en memoria y se actualiza sola si la UI las cambia.
+    - Los mensajes que llegan dentro de 'coalesce_window' s se juntan en uno
+      solo por destino (separados por saltos de línea).
+    - 429: espera lo que indique 'retry_after'. Errores de red o 5xx:
+      reintentos con espera exponencial (hasta 'max_retries'). Otros 4xx se
+      descartan (reintentar no los arregla).
+    - 'api_base' permite apuntar a un servidor local de pruebas.
+    """
+
+    def __init__(self, api_base=API_BASE, store=None, max_queue=100,
+                 coalesce_window=0.5, timeout=5.0, max_retries=5, backoff=1.0, max_backoff=30.0):
+        self.api_base = api_base.rstrip("/")
+        self.store = store
+        self.coalesce_window = float(coalesce_window)
+        self.timeout = float(timeout)
+        self.max_retries = int(max_retries)
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._session = None
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    # --- Productor ---
+    def send(self, message, bot_token=None, chat_id=None):
+        """Encola un mensaje. Nunca bloquea: si la cola está llena se descarta."""
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((message, bot_token, chat_id))
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def flush(self, timeout=3.0):
+        """Espera (como mucho 'timeout' s) a que se envíe lo pendiente. Para el cierre."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self._queue.unfinished_tasks
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="TelegramNotifier", daemon=True)
+                self._thread.start()
+
+    # --- Hilo de envío ---
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Juntar lo que llegue en la ventana de agrupación
+            deadline = time.monotonic() + self.coalesce_window
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._send_batch(batch)
+            except Exception as e:
+                print(f"[Telegram Error] {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _send_batch(self, batch):
+        with self._lock:
+            dropped, self._dropped = self._dropped, 0
+        token_cfg, chat_cfg = load_telegram_config(self.store)
+        grouped = {} # (token, chat_id) -> [mensajes] (en orden de llegada)
+        for message, bot_token, chat_id in batch:
+            key = (bot_token or token_cfg, chat_id or chat_cfg)
+            grouped.setdefault(key, []).append(message)
+        if dropped:
+            first = next(iter(grouped))
+            grouped[first].append(f"({dropped} mensajes descartados: cola llena)")
+        for (bot_token, chat_id), messages in grouped.items():
+            if not bot_token or not chat_id:
+                print("[Telegram Error] Bot token o Chat ID no configurados")
+                continue
+            for text in self._chunks(messages):
+                self._post(bot_token, chat_id, text)
+
+    @staticmethod
+    def _chunks(messages):
+        """Une los mensajes con saltos de línea sin pasar del límite de Telegram."""
+        chunk = ""
+        for message in messages:
+            message = message[:MAX_MESSAGE_LEN]
+            if chunk and len(chunk) + 1 + len(message) > MAX_MESSAGE_LEN:
+                yield chunk
+                chunk = ""
+            chunk = f"{chunk}\n{message}" if chunk else message
+        if chunk:
+            yield chunk
+
+    def _post(self, bot_token, chat_id, text):
+        if self._session is None:
+            self._session = requests.Session()
+        url = f"{self.api_base}/bot{bot_token}/sendMessage"
+        payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                r = self._session.post(url, data=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                error, wait = str(e), delay
+            else:
+                if r.status_code == 200:
+                    return True
+                if r.status_code == 429:
+                    try: wait = float(r.json().get("parameters", {}).get("retry_after", delay))
+                    except ValueError: wait = delay
+                    error = "429 (límite de mensajes)"
+                elif r.status_code >= 500:
+                    error, wait = f"HTTP {r.status_code}", delay
+                else:
+                    print(f"[Telegram Error] HTTP {r.status_code}: {r.text[:200]}")
+                    return False
+            if attempt < self.max_retries:
+                time.sleep(min(wait, self.max_backoff))
+                delay = min(delay * 2, self.max_backoff)
+        print(f"[Telegram Error] {error}. Mensaje descartado tras {self.max_retries} reintentos.")
+        return False
+
+
+# --- Notificador compartido ---
+_notifier = None
+_notifier_lock = threading.Lock()
+
+def get_notifier():
+    global _notifier
+    if _notifier is None:
+        with _notifier_lock:
+            if _notifier is None:
+                _notifier = TelegramNotifier()
+    return _notifier
+
+def set_telegram_store(store):
+    """Config de la que salen bot_token y chat_id: la del bot en marcha (None = config.yaml)."""
+    get_notifier().store = store
 
 def send_telegram(message: str, bot_token: str = None, chat_id: str = None):
-    """Envía un mensaje de texto a Telegram usando bot_token y chat_id del config si no se pasan."""
-    if bot_token is None or chat_id is None:
-        bot_token_cfg, chat_id_cfg = load_telegram_config()
-        bot_token = bot_token or bot_token_cfg
-        chat_id = chat_id or chat_id_cfg
-
-    if not bot_token or not chat_id:
-        print("[Telegram Error] Bot token o Chat ID no configurados")
-        return
-
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    payload = {
-        "chat_id": chat_id,
-        "text": message,
-        "parse_mode": "HTML"
-    }
-    try:
-        requests.post(url, data=payload, timeout=2)
-    except Exception as e:
-        print(f"[Telegram Error] {e}")
+    """Encola un mensaje para Telegram (bot_token y chat_id del config si no se pasan). No bloquea."""
+    get_notifier().send(message, bot_token, chat_id)
+
+def flush_telegram(timeout=3.0):
+    """Espera a que salgan los mensajes pendientes (al cerrar el programa)."""
+    if _notifier is not None:
+        return _notifier.flush(timeout)
+    return True
@@ -0,0 +1,279 @@
+# template_registry.py
+# Registro único de templates: se decodifican una sola vez, se precalculan sus
+# datos (gris, color, pirámide, media/desviación, máscara) y se guardan en una
+# caché en disco para que el siguiente arranque no tenga que decodificar PNGs.
+
+import os
+import json
+import threading
+import cv2
+import numpy as np
+
+# Misma carpeta que usaban detector.py y bot_ui.py (un nivel arriba del código)
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_DIR = os.path.join(base_dir, "templates")
+CACHE_NAME = ".templates_cache.npz"
+CACHE_VERSION = 2
+IMAGE_EXTS = (".png", ".jpg", ".jpeg")
+
+
+class TemplateEntry:
+    """Datos precalculados de un fichero de template."""
+    __slots__ = ("name", "filename", "key", "gray", "color", "mask", "mean", "std", "pyramid")
+
+    def __init__(self, name, filename, key, gray, color, mask, pyramid):
+        self.name = name          # Clase (nombre del fichero sin extensión)
+        self.filename = filename
+        self.key = key            # (tamaño, mtime_ns): invalida la caché si cambia el fichero
+        self.gray = gray
+        self.color = color        # BGR, para herramientas de debug que comparan en color
+        self.mask = mask          # Canal alfa > 0 (None si el PNG no tiene alfa)
+        self.mean, self.std = (float(v[0][0]) for v in cv2.meanStdDev(gray))
+        self.pyramid = pyramid    # [nivel1, nivel2, ...] (gray reducido con pyrDown)
+
+
+def _decode(path, pyramid_levels):
+    """Lee una imagen y devuelve (gray, color, mask, pyramid) o None si falla."""
+    img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        return None
+    if img.dtype != np.uint8: # PNG de 16 bits: el detector trabaja en 8 bits
+        img = cv2.convertScaleAbs(img, alpha=255.0 / 65535.0)
+    mask = None
+    if img.ndim == 2:
+        gray = img
+        color = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    else:
+        if img.shape[2] == 4:
+            mask = (img[:, :, 3] > 0).astype(np.uint8)
+            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+        color = img
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    pyramid = []
+    level = gray
+    for _ in range(pyramid_levels):
+        if min(level.shape[:2]) < 2:
+            break
+        level = cv2.pyrDown(level)
+        pyramid.append(level)
+    return gray, color, mask, pyramid
+
+
+class TemplateRegistry:
+    """
+    Carga los templates de 'template_dir' y los mantiene al día.
+
+    'templates' es un dict nombre -> [gray, ...] que nunca se modifica: cada
+    alta o baja construye uno nuevo y lo sustituye de una sola asignación
+    (como ConfigStore con la config), así los hilos que lo están recorriendo
+    (detector, vigilante de alertas) siguen con el anterior. Hay que leer
+    registry.templates cada vez, no guardarlo en una variable de módulo.
+    refresh() detecta ficheros nuevos, modificados o borrados comparando
+    tamaño y mtime, y solo decodifica los que cambiaron.
+    """
+
+    def __init__(self, template_dir=TEMPLATE_DIR, cache_path=None, pyramid_levels=3):
+        self.template_dir = template_dir
+        self.cache_path = cache_path or os.path.join(template_dir, CACHE_NAME)
+        self.pyramid_levels = pyramid_levels
+        self.templates = {}
+        self.entries = {}   # filename -> TemplateEntry
+        self._by_id = {}    # id(gray) -> TemplateEntry
+        self.disabled = set() # Clases dadas de baja en caliente (sus ficheros siguen en disco)
+        self._warned_missing = False
+        self._lock = threading.RLock()
+
+    # --- Caché en disco ---
+    # Formato: un .npz sin comprimir con dos miembros, '__index__' (JSON con
+    # forma y offset de cada array) y 'blob' (todos los arrays uint8 seguidos).
+    # Cargarlo son dos lecturas y los arrays son vistas sobre el blob.
+    def _load_cache(self):
+        """Devuelve {filename: TemplateEntry} desde la caché (vacío si no vale)."""
+        if not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with np.load(self.cache_path, allow_pickle=False) as data:
+                index = json.loads(str(data["__index__"]))
+                if index.get("version") != CACHE_VERSION or index.get("pyramid_levels") != self.pyramid_levels:
+                    return {}
+                blob = data["blob"]
+
+            def view(spec):
+                if spec is None:
+                    return None
+                offset, shape = spec
+                return blob[offset:offset + int(np.prod(shape))].reshape(shape)
+
+            cached = {}
+            for meta in index["entries"]:
+                cached[meta["filename"]] = TemplateEntry(
+                    meta["name"], meta["filename"], tuple(meta["key"]),
+                    view(meta["gray"]), view(meta["color"]), view(meta["mask"]),
+                    [view(spec) for spec in meta["pyramid"]])
+            return cached
+        except Exception as e:
+            print(f"Advertencia: caché de templates inválida ({e}). Se regenera.")
+            return {}
+
+    def _save_cache(self):
+        chunks, metas = [], []
+        offset = 0
+
+        def put(arr):
+            nonlocal offset
+            if arr is None:
+                return None
+            spec = [offset, list(arr.shape)]
+            chunks.append(np.ascontiguousarray(arr).ravel())
+            offset += arr.size
+            return spec
+
+        for entry in self.entries.values():
+            metas.append({"name": entry.name, "filename": entry.filename, "key": list(entry.key),
+                          "gray": put(entry.gray), "color": put(entry.color), "mask": put(entry.mask),
+                          "pyramid": [put(level) for level in entry.pyramid]})
+        index = {"version": CACHE_VERSION, "pyramid_levels": self.pyramid_levels, "entries": metas}
+        blob = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.uint8)
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, __index__=np.array(json.dumps(index)), blob=blob)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print(f"Advertencia: no se pudo guardar la caché de templates: {e}")
+
+    # --- Carga / recarga ---
+    def _scan(self):
+        """{filename: (tamaño, mtime_ns)} de las imágenes de la carpeta."""
+        found = {}
+        try:
+            names = sorted(os.listdir(self.template_dir))
+        except OSError:
+            return None
+        for fname in names:
+            if not fname.lower().endswith(IMAGE_EXTS):
+                continue
+            try:
+                st = os.stat(os.path.join(self.template_dir, fname))
+            except OSError:
+                continue
+            found[fname] = (st.st_size, st.st_mtime_ns)
+        return found
+
+    def load(self):
+        """Carga inicial: usa la caché para lo que no haya cambiado."""
+        with self._lock:
+            self.entries = self._load_cache()
+            self.refresh(force_save=not self.entries)
+        return self
+
+    def refresh(self, force_save=False):
+        """
+        Sincroniza con la carpeta. Devuelve (añadidos, eliminados) como listas
+        de nombres de fichero.
+        """
+        with self._lock:
+            found = self._scan()
+            if found is None:
+                if not self._warned_missing:
+                    print(f"Advertencia: Directorio de templates '{self.template_dir}' no encontrado.")
+                    self._warned_missing = True
+                found = {}
+            added, removed = [], []
+            for fname in list(self.entries):
+                if fname not in found:
+                    del self.entries[fname]
+                    removed.append(fname)
+            for fname, key in found.items():
+                entry = self.entries.get(fname)
+                if entry is not None and entry.key == key:
+                    continue
+                if entry is not None:
+                    removed.append(fname)
+                if self._add(fname, key):
+                    added.append(fname)
+            if added or removed or not self._by_id:
+                self._rebuild()
+            if (added or removed or force_save) and os.path.isdir(self.template_dir):
+                self._save_cache()
+            return added, removed
+
+    def _add(self, fname, key):
+        try:
+            decoded = _decode(os.path.join(self.template_dir, fname), self.pyramid_levels)
+        except Exception as e:
+            print(f"Error cargando template {fname}: {e}")
+            decoded = None
+        if decoded is None:
+            print(f"Advertencia: No se pudo cargar template {fname}")
+            self.entries.pop(fname, None)
+            return False
+        name = os.path.splitext(fname)[0] # nombre sin extensión
+        self.entries[fname] = TemplateEntry(name, fname, key, *decoded)
+        return True
+
+    def _rebuild(self):
+        """Construye un 'templates' nuevo y lo publica de una sola asignación."""
+        grouped = {}
+        for entry in self.entries.values():
+            if entry.name not in self.disabled:
+                grouped.setdefault(entry.name, []).append(entry.gray)
+        self._by_id = {id(e.gray): e for e in self.entries.values()}
+        self.templates = grouped
+
+    # --- Alta / baja en caliente ---
+    def add(self, path):
+        """Copia (si hace falta) y registra un template nuevo sin reiniciar."""
+        with self._lock:
+            fname = os.path.basename(path)
+            self.disabled.discard(os.path.splitext(fname)[0])
+            dest = os.path.join(self.template_dir, fname)
+            if os.path.abspath(path) != os.path.abspath(dest):
+                os.makedirs(self.template_dir, exist_ok=True)
+                with open(path, "rb") as src, open(dest, "wb") as dst:
+                    dst.write(src.read())
+            return self.refresh()
+
+    def remove(self, name, delete_files=False):
+        """
+        Da de baja la clase 'name' sin reiniciar. Por defecto solo deja de
+        usarse (los ficheros siguen en disco); con delete_files=True se borran.
+        """
+        with self._lock:
+            if not delete_files:
+                self.disabled.add(name)
+                self._rebuild()
+                return [], []
+            for entry in [e for e in self.entries.values() if e.name == name]:
+                try: os.remove(os.path.join(self.template_dir, entry.filename))
+                except OSError as e: print(f"Advertencia: no se pudo borrar {entry.filename}: {e}")
+            return self.refresh()
+
+    # --- Consultas ---
+    def entry_for(self, tpl_gray):
+        """TemplateEntry al que pertenece un array gris de 'templates' (o None)."""
+        entry = self._by_id.get(id(tpl_gray))
+        return entry if entry is not None and entry.gray is tpl_gray else None
+
+    def color_templates(self):
+        """{nombre: [BGR, ...]} para las herramientas que comparan en color (sin las clases dadas de baja)."""
+        with self._lock:
+            grouped = {}
+            for entry in self.entries.values():
+                if entry.name not in self.disabled:
+                    grouped.setdefault(entry.name, []).append(entry.color)
+            return grouped
+
+
+# --- Registro compartido ---
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """Devuelve el TemplateRegistry compartido (se carga la primera vez)."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = TemplateRegistry().load()
+    return _registry
@@ -1,19 +1,20 @@
 # src/test_templates_debug.py
 import os
 import cv2
-import numpy as np
-from screencap import get_screenshot
+from detector import extract_detections
+from template_registry import get_registry
+from screencap import get_frame_source
 
-# Rutas a templates
-TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "..", "templates")
-template_hierro = cv2.imread(os.path.join(TEMPLATE_DIR, "hierro.png"), cv2.IMREAD_UNCHANGED)
-template_boton = cv2.imread(os.path.join(TEMPLATE_DIR, "boton_retos.png"), cv2.IMREAD_UNCHANGED)
+# Templates en color desde el registro compartido
+COLOR_TEMPLATES = get_registry().color_templates()
+template_hierro = COLOR_TEMPLATES.get("hierro", [None])[0]
+template_boton = COLOR_TEMPLATES.get("boton_retos", [None])[0]
 
 print("Hierro cargado:", template_hierro is not None)
 print("Boton cargado:", template_boton is not None)
 
 # Tomar screenshot
-img = get_screenshot()
+img = get_frame_source().grab()
 
 # Función simple de detección con template matching
 def detect_template(img, template, label, conf_thresh=0.8):
@@ -21,18 +22,13 @@ def detect_template(img, template, label, conf_thresh=0.8):
     if template is None:
         return detections
     res = cv2.matchTemplate(img, template, cv2.TM_CCOEFF_NORMED)
-    loc = np.where(res >= conf_thresh)
     w, h = template.shape[1], template.shape[0]
-    seen = set()
-    for pt in zip(*loc[::-1]):
-        if any(abs(pt[0]-sx)<5 and abs(pt[1]-sy)<5 for sx,sy in seen):
-            continue
-        seen.add(pt)
-        cx = pt[0] + w//2
-        cy = pt[1] + h//2
-        detections.append({"label": label, "cx": cx, "cy": cy, "bbox":[pt[0], pt[1], pt[0]+w, pt[1]+h]})
-        cv2.rectangle(img, (pt[0], pt[1]), (pt[0]+w, pt[1]+h), (0,255,0), 2)
-        cv2.putText(img, label, (pt[0], pt[1]-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 1)
+    # Picos + NMS compartidos con detector.py
+    detections = extract_detections(res, conf_thresh, w, h, label)
+    for d in detections:
+        x1, y1, x2, y2 = d["bbox"]
+        cv2.rectangle(img, (x1, y1), (x2, y2), (0,255,0), 2)
+        cv2.putText(img, label, (x1, y1-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 1)
     return detections
 
 # Detectar ambos templates
@@ -1,23 +1,11 @@
 # src/test_templates_debug.py
 import os
 import cv2
-import numpy as np
+from detector import extract_detections
+from template_registry import get_registry
 
-# --- Carpeta de templates ---
-TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "..", "templates")
-
-# --- Cargar todos los templates de recursos automáticamente ---
-RESOURCE_TEMPLATES = {}
-for fname in os.listdir(TEMPLATE_DIR):
-    name, ext = os.path.splitext(fname)
-    if ext.lower() not in [".png", ".jpg", ".jpeg"]:
-        continue
-    template = cv2.imread(os.path.join(TEMPLATE_DIR, fname), cv2.IMREAD_UNCHANGED)
-    if template is None:
-        continue
-    if template.shape[2] == 4:
-        template = cv2.cvtColor(template, cv2.COLOR_BGRA2BGR)
-    RESOURCE_TEMPLATES.setdefault(name, []).append(template)
+# --- Templates en color desde el registro compartido (sin volver a decodificar PNGs) ---
+RESOURCE_TEMPLATES = get_registry().color_templates()
 
 print(f"Templates cargados: {list(RESOURCE_TEMPLATES.keys())}")
 
@@ -25,19 +13,13 @@ print(f"Templates cargados: {list(RESOURCE_TEMPLATES.keys())}")
 def detect_template(img, template, label, conf_thresh=0.8):
     h, w = template.shape[:2]
     res = cv2.matchTemplate(img, template, cv2.TM_CCOEFF_NORMED)
-    loc = np.where(res >= conf_thresh)
-    detections = []
-    seen = set()
-    for pt in zip(*loc[::-1]):  # x,y
-        if any(abs(pt[0]-sx)<5 and abs(pt[1]-sy)<5 for sx,sy in seen):
-            continue
-        seen.add(pt)
-        cx = pt[0] + w//2
-        cy = pt[1] + h//2
-        detections.append({"label": label, "cx": cx, "cy": cy, "bbox":[pt[0], pt[1], pt[0]+w, pt[1]+h]})
+    # Picos + NMS compartidos con detector.py
+    detections = extract_detections(res, conf_thresh, w, h, label)
+    for d in detections:
+        x1, y1, x2, y2 = d["bbox"]
         # dibujar rectángulo
-        cv2.rectangle(img, (pt[0], pt[1]), (pt[0]+w, pt[1]+h), (0,255,0), 2)
-        cv2.putText(img, label, (pt[0], pt[1]-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 1)
+        cv2.rectangle(img, (x1, y1), (x2, y2), (0,255,0), 2)
+        cv2.putText(img, label, (x1, y1-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 1)
     return detections
 
 # --- Main ---
@@ -0,0 +1,27 @@
+# tests/test_alert_watcher.py
+import threading
+from alert_watcher import AlertWatcher
+
+REGION = {"x": 0, "y": 0, "w": 10, "h": 10}
+
+
+def test_set_regions_descarta_alertas_que_ya_no_se_vigilan():
+    event = threading.Event()
+    watcher = AlertWatcher({"boton_retos": REGION, "inventario_lleno": REGION}, source=object(), event=event)
+    watcher._pending["boton_retos"] = {"label": "boton_retos"}
+    event.set()
+    # auto_pause_on_arena apagado en caliente: boton_retos deja de cortar esperas
+    watcher.set_regions({"inventario_lleno": REGION})
+    assert watcher.labels == ["inventario_lleno"]
+    assert not event.is_set()
+    assert watcher.pop_pending() == {}
+
+
+def test_set_regions_conserva_las_pendientes_vigiladas():
+    event = threading.Event()
+    watcher = AlertWatcher({"boton_retos": REGION, "inventario_lleno": REGION}, source=object(), event=event)
+    watcher._pending["inventario_lleno"] = {"label": "inventario_lleno"}
+    event.set()
+    watcher.set_regions({"inventario_lleno": REGION})
+    assert event.is_set()
+    assert list(watcher.pop_pending()) == ["inventario_lleno"]
@@ -0,0 +1,19 @@
+# tests/test_detector.py
+import numpy as np
+import detector
+
+
+def test_pool_cerrado_por_otro_hilo_no_rompe_detect(monkeypatch):
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 255, (120, 160), dtype=np.uint8)
+    tpl = img[40:60, 50:80].copy()
+    monkeypatch.setitem(detector.DETECT_OPTIONS, "detect_workers", 2)
+    # Como si otro hilo hubiera cambiado detect_workers entre _get_executor() y submit()
+    old = detector._get_executor()
+    monkeypatch.setitem(detector.DETECT_OPTIONS, "detect_workers", 3)
+    fresh = detector._get_executor()
+    assert fresh is not old
+    calls = iter([old])
+    monkeypatch.setattr(detector, "_get_executor", lambda: next(calls, fresh))
+    results = detector._run_match_tasks(img, None, [("a", tpl), ("b", tpl)], 0.9, 0)
+    assert all(r is not None and r.max() > 0.99 for r in results)
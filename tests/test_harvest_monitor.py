@@ -0,0 +1,44 @@
+# tests/test_harvest_monitor.py
+import numpy as np
+import timing
+from detector import REGISTRY
+from harvest_monitor import HarvestMonitor
+
+ROI = {"left": 100, "top": 50, "width": 200, "height": 150}
+
+
+class ScreenSource:
+    """Pantalla falsa: el ROI está en (100, 50); fuera de él hay otra cosa."""
+
+    def __init__(self, roi_img):
+        self.screen = np.zeros((400, 500), dtype=np.uint8)
+        self.screen[ROI["top"]:ROI["top"] + ROI["height"], ROI["left"]:ROI["left"] + ROI["width"]] = roi_img
+        self.regions = []
+
+    def resolve_region(self, region=None):
+        return ROI if region is None else region
+
+    def grab(self, region=None, gray=False):
+        self.regions.append(region)
+        return self.screen[region["top"]:region["top"] + region["height"],
+                           region["left"]:region["left"] + region["width"]].copy()
+
+
+def test_ventanas_en_el_borde_se_recortan_al_roi(monkeypatch):
+    rng = np.random.default_rng(0)
+    roi_img = rng.integers(0, 255, (ROI["height"], ROI["width"]), dtype=np.uint8)
+    tpl = roi_img[120:144, 170:196].copy() # Pegado a la esquina inferior derecha del ROI
+    monkeypatch.setattr(REGISTRY, "templates", dict(REGISTRY.templates, borde=[tpl]))
+    timing.set_clock(timing.FakeClock())
+    try:
+        source = ScreenSource(roi_img)
+        monitor = HarvestMonitor(source, conf=0.9, margin=16, misses=1, min_absent=0.0)
+        monitor.watch([{"label": "borde", "bbox": [170, 120, 196, 144]}])
+        timing.sleep(1.0)
+        assert monitor.poll() is False
+        region = source.regions[-1]
+        assert region["left"] + region["width"] <= ROI["left"] + ROI["width"]
+        assert region["top"] + region["height"] <= ROI["top"] + ROI["height"]
+        assert monitor.pending == 1 # Sigue viéndose: los recortes cuadran con el origen
+    finally:
+        timing.set_clock(timing.Clock())
@@ -0,0 +1,80 @@
+# tests/test_replay.py
+# Reproducción sin escritorio: misma grabación + misma semilla = mismas acciones.
+import os
+import json
+import cv2
+import numpy as np
+import pytest
+import yaml
+import timing
+import replay
+from screencap import set_frame_source
+from utils import set_input_backend
+from detector import REGISTRY
+
+W, H = 480, 360
+
+
+def _scenes():
+    """(frame con 2 recursos, frame sin recursos, template) sintéticos y fijos."""
+    rng = np.random.default_rng(0)
+    empty = cv2.GaussianBlur(rng.integers(0, 255, (H, W), dtype=np.uint8), (0, 0), 3)
+    tpl = cv2.GaussianBlur(rng.integers(0, 255, (36, 40), dtype=np.uint8), (0, 0), 1.5)
+    full = empty.copy()
+    for x, y in ((60, 80), (300, 220)):
+        full[y:y + tpl.shape[0], x:x + tpl.shape[1]] = tpl
+    return full, empty, tpl
+
+
+@pytest.fixture
+def recording(tmp_path, monkeypatch):
+    full, empty, tpl = _scenes()
+    monkeypatch.setattr(REGISTRY, "templates", dict(REGISTRY.templates, sintetico=[tpl]))
+    timing.set_clock(timing.FakeClock())
+    writer = replay.EventWriter(str(tmp_path))
+    writer.event("meta", roi={"left": 0, "top": 0, "width": W, "height": H})
+    for i in range(20): # 10 s: sala vacía 4 s, luego recursos hasta el final (último frame)
+        writer.frame(empty if i < 8 else full)
+        timing.sleep(0.5)
+    writer.event("end")
+    writer.close()
+    config = {"map_path": [[100, 100], [200, 200]], "resource_classes": ["sintetico"],
+              "map_specific_templates": {}, "ROI": {"x": 0, "y": 0, "w": W, "h": H}}
+    with open(os.path.join(str(tmp_path), replay.CONFIG_NAME), "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f)
+    yield str(tmp_path)
+    timing.set_clock(timing.Clock())
+    set_frame_source(None)
+    set_input_backend(None)
+
+
+def _play(path, seed):
+    summary = replay.replay(path, seed=seed)
+    with open(os.path.join(path, replay.REPLAY_EVENTS_NAME), "r", encoding="utf-8") as f:
+        clicks = [e for e in (json.loads(line) for line in f if line.strip()) if e["type"] == "click"]
+    return summary, clicks
+
+
+def test_replay_es_determinista(recording):
+    first, clicks_a = _play(recording, seed=3)
+    second, clicks_b = _play(recording, seed=3)
+    assert clicks_a, "la reproducción debería hacer algún click"
+    assert clicks_a == clicks_b
+    assert first["segundos_simulados"] == second["segundos_simulados"]
+
+
+def test_replay_no_envia_telegram(recording, monkeypatch):
+    import requests
+    from telegram_notifier import flush_telegram
+    posts = []
+    monkeypatch.setattr(requests.Session, "post", lambda self, url, **kw: posts.append(url))
+    _play(recording, seed=0)
+    flush_telegram()
+    assert posts == []
+
+
+def test_replay_termina_con_la_grabacion(recording):
+    summary, _ = _play(recording, seed=0)
+    assert summary["motivo"] == "fin de la grabación"
+    # El reloj para el bot justo al final, aunque esté en mitad de una espera larga
+    assert summary["segundos_simulados"] == pytest.approx(10.0, abs=0.05)
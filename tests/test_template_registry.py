@@ -0,0 +1,25 @@
+# tests/test_template_registry.py
+import os
+import cv2
+import numpy as np
+from template_registry import TemplateRegistry
+
+
+def _registry(tmp_path, names):
+    rng = np.random.default_rng(0)
+    for name in names:
+        cv2.imwrite(os.path.join(str(tmp_path), f"{name}.png"), rng.integers(0, 255, (20, 24), dtype=np.uint8))
+    return TemplateRegistry(str(tmp_path)).load()
+
+
+def test_altas_y_bajas_no_tocan_el_dict_que_se_esta_recorriendo(tmp_path):
+    registry = _registry(tmp_path, ["hierro", "cobre"])
+    snapshot = registry.templates
+    it = iter(snapshot.items())
+    next(it)
+    registry.remove("hierro") # Otro hilo da de baja una clase a mitad del recorrido
+    cv2.imwrite(os.path.join(str(tmp_path), "plata.png"), np.full((20, 24), 128, np.uint8))
+    registry.refresh()
+    list(it) # Sin "dictionary changed size during iteration"
+    assert sorted(snapshot) == ["cobre", "hierro"]
+    assert sorted(registry.templates) == ["cobre", "plata"]
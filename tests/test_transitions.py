@@ -0,0 +1,61 @@
+# tests/test_transitions.py
+# Tiempos de transición por salida (auto_overrides): solo se miden clicks reales.
+import os
+import numpy as np
+import pytest
+import yaml
+import timing
+from screencap import set_frame_source
+from utils import set_input_backend
+from navigator import move_to_next
+from replay import FakeInput
+
+
+class StillSource:
+    """FrameSource falsa: siempre la misma sala (nunca se detecta la llegada)."""
+
+    def __init__(self):
+        self.img = np.random.default_rng(0).integers(0, 255, (120, 160), dtype=np.uint8)
+
+    def grab(self, region=None, gray=False):
+        return self.img.copy()
+
+    def resolve_region(self, region=None):
+        return {"left": 0, "top": 0, "width": 160, "height": 120}
+
+
+@pytest.fixture
+def bot(tmp_path):
+    config = {"map_path": [[10, 10], [50, 50]], "arrival_detect": True, "auto_overrides": "apply",
+              "audio_backend": "null", "template_refresh_interval": 0, "randomize_delays": False}
+    path = os.path.join(str(tmp_path), "config.yaml")
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f)
+    timing.set_clock(timing.FakeClock())
+    set_frame_source(StillSource())
+    set_input_backend(FakeInput())
+    from controller import Bot
+    bot = Bot(path)
+    bot.running = True
+    yield bot
+    bot.store.stop()
+    timing.set_clock(timing.Clock())
+    set_frame_source(None)
+    set_input_backend(None)
+
+
+def test_pausa_antes_del_click_no_registra(bot):
+    # La transición anterior (salida 0) terminó con llegada detectada
+    bot.arrival.begin()
+    bot.arrival.arrived, bot.arrival.elapsed = True, 1.23
+    bot.running = False # Pausa antes de moverse desde la sala 1
+    assert move_to_next(bot, bot.map_path, 1, bot.config) == 1
+    bot.wait_arrival(1, 2.0)
+    assert bot.transitions.summary(1) is None
+
+
+def test_click_registra_la_transicion(bot):
+    assert move_to_next(bot, bot.map_path, 0, bot.config) == 1
+    bot.wait_arrival(0, 2.0)
+    n, _, _, timeouts = bot.transitions.summary(0)
+    assert (n, timeouts) == (1, 1) # La escena no cambia: se agota la espera
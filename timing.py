@@ -0,0 +1,138 @@
+# timing.py
+# Esperas interrumpibles sin sondeo: en vez de dormir a trozos de 0.1-0.2 s
+# comprobando si el bot se ha pausado, las esperas duermen sobre una
+# condition variable y quien pausa/detiene/avisa de una alerta las despierta.
+
+import threading
+import time
+
+
+# --- Reloj ---
+class Clock:
+    """Reloj real (time.monotonic)."""
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(max(0.0, seconds))
+
+    def wait(self, cond, seconds):
+        """Espera sobre 'cond' (adquirida) como mucho 'seconds' de este reloj."""
+        cond.wait(seconds)
+
+
+class FakeClock(Clock):
+    """
+    Reloj virtual para la reproducción (replay.py): dormir no espera, solo
+    adelanta el reloj. Así el bucle corre tan rápido como la CPU permita y
+    siempre ve la misma secuencia de tiempos.
+    set_deadline(t, callback) llama a callback() una sola vez, en el hilo que
+    adelanta el reloj, cuando este llega a 't' (p.ej. bot.stop al final de la
+    grabación): el final no depende de cuándo mire otro hilo. La espera que
+    cruza 't' se corta ahí, así que tampoco se pasa del final.
+    """
+
+    def __init__(self, start=0.0):
+        self._now = float(start)
+        self._lock = threading.Lock()
+        self._deadline = None
+        self._on_deadline = None
+        self.expired = False
+
+    def now(self):
+        with self._lock:
+            return self._now
+
+    def set_deadline(self, deadline, callback):
+        with self._lock:
+            self._deadline = float(deadline)
+            self._on_deadline = callback
+            self.expired = False
+
+    def advance(self, seconds):
+        with self._lock:
+            self._now += max(0.0, seconds)
+            callback = None
+            if self._on_deadline is not None and self._now >= self._deadline:
+                self._now = self._deadline
+                callback, self._on_deadline = self._on_deadline, None
+                self.expired = True
+        if callback is not None:
+            callback()
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def wait(self, cond, seconds):
+        self.advance(seconds)
+
+
+clock = Clock()
+
+def set_clock(new_clock):
+    """Cambia el reloj de todo el bucle (Clock() real o FakeClock())."""
+    global clock
+    clock = new_clock
+
+def now():
+    return clock.now()
+
+def sleep(seconds):
+    clock.sleep(seconds)
+
+
+class Waker:
+    """
+    Punto de encuentro entre quien espera y quien cambia el estado del bot.
+    Quien cambie algo que pueda cortar una espera (running, stopped, alertas)
+    debe llamar a notify() DESPUÉS de cambiarlo.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+
+    def notify(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait_for(self, predicate, timeout=None):
+        """Bloquea hasta que predicate() sea True (sin despertares periódicos)."""
+        with self._cond:
+            return self._cond.wait_for(predicate, timeout)
+
+    def sleep(self, seconds, interrupted=None):
+        """
+        Duerme 'seconds' contra un deadline fijo (sin deriva acumulada).
+        Devuelve True si se cumplió el tiempo y False si interrupted() se
+        hizo True antes.
+        """
+        deadline = clock.now() + max(0.0, float(seconds))
+        with self._cond:
+            while True:
+                if interrupted is not None and interrupted():
+                    return False
+                remaining = deadline - clock.now()
+                if remaining <= 0:
+                    return True
+                clock.wait(self._cond, remaining)
+
+
+class WakingEvent(threading.Event):
+    """threading.Event que además despierta al Waker al activarse (alertas)."""
+
+    def __init__(self, waker):
+        super().__init__()
+        self.waker = waker
+
+    def set(self):
+        super().set()
+        self.waker.notify()
+
+
+def interruptible_sleep(bot, seconds):
+    """bot.sleep(seconds) si hay bot; si no, un time.sleep normal. True si no se interrumpió."""
+    if bot is None:
+        clock.sleep(seconds)
+        return True
+    return bot.sleep(seconds)
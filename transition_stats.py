@@ -0,0 +1,78 @@
+# transition_stats.py
+# Tiempos reales de cambio de sala por índice de salida (click -> escena nueva
+# estable, medidos por ArrivalDetector) y ajuste automático de
+# post_move_overrides a partir de ellos.
+
+import threading
+from collections import deque
+import numpy as np
+
+TUNE_MODES = ("off", "propose", "apply")
+
+
+class TransitionStats:
+    """
+    Guarda las últimas 'window' transiciones de cada índice. proposals()
+    calcula, para cada índice con al menos 'min_samples' muestras, el
+    override que cubre el percentil 'percentile' más 'margin' segundos.
+
+    Las transiciones en las que no se detectó la llegada antes de agotar la
+    espera se guardan como 'timeout' con el tiempo esperado: si son más de
+    las que el percentil admite, se propone subir el override en 'growth'
+    (la sala es más lenta que su cota actual).
+    """
+
+    def __init__(self, window=20, min_samples=5, percentile=90.0, margin=0.3,
+                 growth=1.25, min_override=0.1, max_override=10.0):
+        self.window = max(1, int(window))
+        self.min_samples = max(1, int(min_samples))
+        self.percentile = float(percentile)
+        self.margin = float(margin)
+        self.growth = float(growth)
+        self.min_override = float(min_override)
+        self.max_override = float(max_override)
+        self._samples = {} # índice (str) -> deque[(segundos, timeout)]
+        self._lock = threading.Lock()
+
+    def record(self, idx, seconds, timed_out=False):
+        with self._lock:
+            samples = self._samples.setdefault(str(idx), deque(maxlen=self.window))
+            samples.append((float(seconds), bool(timed_out)))
+
+    def summary(self, idx):
+        """(nº muestras, p50, pXX, nº timeouts) del índice, o None si no hay datos."""
+        with self._lock:
+            samples = list(self._samples.get(str(idx), ()))
+        if not samples:
+            return None
+        times = np.array([s for s, _ in samples])
+        return (len(samples), float(np.percentile(times, 50)), float(np.percentile(times, self.percentile)),
+                sum(1 for _, t in samples if t))
+
+    def proposals(self, post_move_wait, overrides):
+        """
+        {índice: override propuesto} para los índices cuyo valor debería cambiar.
+        El override es la espera que va después de post_move_wait, así que se
+        descuenta de la cota total.
+        """
+        proposed = {}
+        with self._lock:
+            indices = list(self._samples)
+        for idx in indices:
+            stats = self.summary(idx)
+            if stats is None or stats[0] < self.min_samples:
+                continue
+            count, _, high, timeouts = stats
+            try:
+                current = float(overrides.get(idx)) if overrides.get(idx) is not None else float(post_move_wait)
+            except (TypeError, ValueError):
+                current = float(post_move_wait)
+            if timeouts > count * (100.0 - self.percentile) / 100.0:
+                value = current * self.growth
+            else:
+                value = high + self.margin - float(post_move_wait)
+            value = round(min(self.max_override, max(self.min_override, value)), 2)
+            if abs(value - current) >= 0.05:
+                proposed[idx] = value
+        return proposed
+
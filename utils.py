@@ -1,8 +1,40 @@
 import time
 import random
-import pyautogui
-import os
-from playsound import playsound  # Librería para reproducir sonidos
+from audio import AudioPlayer, make_backend
+from metrics import get_metrics
+
+# --- Entrada (ratón / teclado) intercambiable ---
+class PyAutoGUIInput:
+    """Entrada real. pyautogui se importa al crearla (no existe sin escritorio)."""
+
+    def __init__(self):
+        import pyautogui
+        self._gui = pyautogui
+
+    def move(self, x, y, duration):
+        self._gui.moveTo(x, y, duration=duration, _pause=False)
+
+    def click(self, x, y, button):
+        self._gui.click(x=x, y=y, button=button)
+
+    def press(self, key):
+        self._gui.press(key)
+
+_input = None
+
+def get_input():
+    global _input
+    if _input is None:
+        _input = PyAutoGUIInput()
+    return _input
+
+def set_input_backend(backend):
+    """Sustituye la entrada (p.ej. la de replay.py); None vuelve a pyautogui."""
+    global _input
+    _input = backend
+
+def press_key(key):
+    get_input().press(key)
 
 # --- Funciones de delays humanos ---
 def human_delay(base, randomize=True, jitter=0.4):
@@ -20,18 +52,19 @@ def random_point_near(x, y, radius=6):
 def move_mouse_smooth(x, y, duration_min=0.05, duration_max=0.25):
     """Mueve el mouse con una duración aleatoria para parecer humano."""
     dur = random.uniform(duration_min, duration_max)
-    pyautogui.moveTo(x, y, duration=dur, _pause=False)
+    get_input().move(x, y, dur)
 
 def click_at(x, y, button='left', move_first=True, humanize=True):
     """
     Mueve y hace click en (x,y). 
     Si humanize=True, se mueve suavemente y añade pequeñas variaciones.
     """
-    if humanize:
-        x, y = random_point_near(x, y)
-        if move_first:
-            move_mouse_smooth(x, y)
-    pyautogui.click(x=x, y=y, button=button)
+    with get_metrics().span("click"):
+        if humanize:
+            x, y = random_point_near(x, y)
+            if move_first:
+                move_mouse_smooth(x, y)
+        get_input().click(x, y, button)
 
 def log(msg):
     print(f"[{time.strftime('%H:%M:%S')}] {msg}")
@@ -43,19 +76,27 @@ ALERT_SOUNDS = {
     "inventario_lleno": "sounds/inventario_lleno.mp3"
 }
 
+_audio = None
+
+def get_audio():
+    """Reproductor de sonidos compartido (hilo propio, sonidos precargados)."""
+    global _audio
+    if _audio is None:
+        _audio = AudioPlayer(ALERT_SOUNDS)
+    return _audio
+
+def set_audio_backend(name):
+    """Elige el backend ('auto', 'null', 'playsound', 'winsound') antes del primer sonido."""
+    get_audio().backend = make_backend(name)
+
 def play_alert(alert_name):
     """
-    Reproduce un sonido de alerta según el nombre del evento.
+    Reproduce un sonido de alerta según el nombre del evento, sin bloquear
+    (se encola para el hilo de audio).
     alert_name: clave en ALERT_SOUNDS ("boton_retos", "inventario_lleno", etc.)
     """
-    path = ALERT_SOUNDS.get(alert_name)
-    if path is None:
-        log(f"No hay sonido definido para '{alert_name}'")
-        return
-    if not os.path.exists(path):
-        log(f"Alerta de sonido: archivo no encontrado -> {path}")
-        return
-    try:
-        playsound(path)
-    except Exception as e:
-        log(f"Error reproduciendo sonido {path}: {e}")
+    get_audio().play(alert_name)
+
+def play_beep(freq=1000, ms=100):
+    """Pitido corto (aviso de escaneo), también en el hilo de audio."""
+    get_audio().beep(freq, ms)